@@ -0,0 +1,206 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from data_cleaning import clean_data
+from eve_reader import load_eve_events
+from event_cache import EventCache
+from flow_table import build_flow_table
+from instrumentation import peak_rss, read_proc_status, reset_peak_rss
+from iat_calculations import calculate_iat_statistics
+from packet_stats import calculate_packet_stats
+from parallel_pipeline import parallel_preprocess
+from packet_stats_calculations import ensure_and_calculate_packet_stats
+from processData import (PIPELINE_INPUT_COLUMNS, categorical_features_updated, numeric_features_updated,
+                         preprocesar_datos, preprocesar_datos_y_ajustar_columnas)
+from synthetic_eve import write_eve_json
+from tcp_advanced_stats import TCP_ADVANCED_COLUMNS, calculate_tcp_advanced_stats
+from tcp_flags_count import count_tcp_flags_vectorized
+
+SIZES = {'10k': 10_000, '1M': 1_000_000, '10M': 10_000_000}
+
+# Eventos por flujo de los datos sintéticos (rango uniforme)
+EVENTS_PER_FLOW = (1, 8)
+
+PACKET_LENGTH_COLUMNS = ['total_bytes', 'total_packets', 'packet_length', 'mean_packet_length', 'max_packet_length',
+                         'min_packet_length', 'std_packet_length', 'var_packet_length']
+
+
+def measure_stage(stage, func, args, rows_in):
+    """
+    Ejecuta una etapa y mide tiempo de pared, RSS pico, variación de memoria y filas por segundo.
+    """
+    peak_resettable = reset_peak_rss()
+    rss_before = read_proc_status('VmRSS')
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss()
+
+    rows_out = len(result) if hasattr(result, '__len__') and not isinstance(result, str) else None
+    to_mb = lambda value: round(value / 2**20, 2) if value is not None else None
+    return {
+        'stage': stage,
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+        'wall_s': round(elapsed, 6),
+        'rows_per_s': round(rows_in / elapsed, 1) if elapsed > 0 else None,
+        'peak_rss_mb': to_mb(peak),
+        'peak_delta_mb': to_mb(peak - rss_before) if peak_resettable and peak is not None and rss_before is not None else None,
+    }
+
+
+def ensure_dataset(n_events, data_dir, seed):
+    """Genera (o reutiliza) un eve.json sintético con exactamente 'n_events' eventos."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'eve_{n_events}_{seed}.json')
+    if not os.path.exists(path):
+        n_flows = n_events // (sum(EVENTS_PER_FLOW) / 2) + 1
+        write_eve_json(path, n_flows=int(n_flows) * 2, events_per_flow=EVENTS_PER_FLOW, seed=seed, max_events=n_events)
+    return path
+
+
+def build_stages(path):
+    """
+    Devuelve la lista de etapas como (nombre, función, preparación); la preparación construye la entrada
+    de cada etapa fuera de la medición a partir del DataFrame crudo y del preprocesado.
+    """
+    def raw(context):
+        return context['raw'].copy()
+
+    def with_flags(context):
+        df = context['raw'].copy()
+        df['tcp.flags'] = df.get('tcp.flags', pd.Series([None] * df.shape[0]))
+        return df
+
+    def without(columns):
+        return lambda context: context['preprocessed'].drop(columns=columns, errors='ignore')
+
+    def cached_segment(context):
+        # El caché se construye fuera de la medición; la etapa mide solo la lectura proyectada del Parquet
+        cache = EventCache(os.path.join(os.path.dirname(path), 'cache'))
+        return cache, cache.add_segment(path)
+
+    def load_cached(cache, keys):
+        return cache.load_events(columns=PIPELINE_INPUT_COLUMNS, segments=keys)
+
+    return [
+        ('ingest', load_eve_events, lambda context: (path,)),
+        ('ingest_projected', lambda path: load_eve_events(path, columns=PIPELINE_INPUT_COLUMNS), lambda context: (path,)),
+        ('ingest_parquet', load_cached, cached_segment),
+        ('ingest_flow_table', build_flow_table, lambda context: (path,)),
+        ('calculate_iat_statistics', calculate_iat_statistics, lambda context: (raw(context),)),
+        ('count_tcp_flags_vectorized', count_tcp_flags_vectorized, lambda context: (with_flags(context),)),
+        ('ensure_and_calculate_packet_stats', ensure_and_calculate_packet_stats,
+         lambda context: (without(PACKET_LENGTH_COLUMNS)(context),)),
+        ('calculate_tcp_advanced_stats', calculate_tcp_advanced_stats,
+         lambda context: (without(TCP_ADVANCED_COLUMNS)(context),)),
+        ('calculate_packet_stats', calculate_packet_stats,
+         lambda context: (context['preprocessed'][['flow_id', 'packet_length', 'direction']].copy(),)),
+        ('clean_data', clean_data,
+         lambda context: (context['preprocessed'].copy(), numeric_features_updated, categorical_features_updated)),
+        ('preprocesar_datos_y_ajustar_columnas', preprocesar_datos_y_ajustar_columnas,
+         lambda context: (context['cleaned'].copy(), numeric_features_updated, categorical_features_updated)),
+        ('preprocesar_datos_y_ajustar_columnas_dispersa',
+         lambda df, numeric, categorical: preprocesar_datos_y_ajustar_columnas(df, numeric, categorical, salida='dispersa'),
+         lambda context: (context['cleaned'].copy(), numeric_features_updated, categorical_features_updated)),
+        ('preprocesar_datos', preprocesar_datos, lambda context: (with_flags(context),)),
+        # Solo las banderas TCP: el registro omite la pasada por flujo
+        ('preprocesar_datos_banderas',
+         lambda df: preprocesar_datos(df, caracteristicas=['tcp_flag_SYN_count', 'fwd_psh_flags', 'direction']),
+         lambda context: (with_flags(context),)),
+        ('parallel_preprocess', parallel_preprocess, lambda context: (with_flags(context),)),
+    ]
+
+
+def run_benchmark(n_events, data_dir='bench_data', seed=0, stages=None):
+    """
+    Mide cada etapa del pipeline sobre un eve.json sintético de 'n_events' eventos.
+
+    Retorna:
+    - Una lista de diccionarios, uno por etapa, con las métricas de 'measure_stage'.
+    """
+    path = ensure_dataset(n_events, data_dir, seed)
+    context = {'raw': load_eve_events(path)}
+    context['preprocessed'] = preprocesar_datos(context['raw'].copy())
+    context['cleaned'] = context['preprocessed'].copy()
+    clean_data(context['cleaned'], numeric_features_updated, categorical_features_updated)
+
+    results = []
+    for name, func, prepare in build_stages(path):
+        if stages and name not in stages:
+            continue
+        args = prepare(context)
+        rows_in = n_events if name.startswith('ingest') else len(args[0])
+        result = measure_stage(name, func, args, rows_in)
+        result['events'] = n_events
+        results.append(result)
+        logging.warning("%s @ %d eventos: %.3f s, %s filas/s", name, n_events, result['wall_s'], result['rows_per_s'])
+        del args
+    return results
+
+
+def compare_results(current, baseline, tolerance=0.2):
+    """
+    Compara tiempos con una ejecución anterior y devuelve las etapas que empeoraron más de 'tolerance'.
+    """
+    previous = {(entry['events'], entry['stage']): entry for entry in baseline}
+    regressions = []
+    for entry in current:
+        reference = previous.get((entry['events'], entry['stage']))
+        if reference and reference['wall_s'] > 0 and entry['wall_s'] > reference['wall_s'] * (1 + tolerance):
+            regressions.append({'events': entry['events'], 'stage': entry['stage'], 'baseline_s': reference['wall_s'],
+                                'current_s': entry['wall_s'], 'ratio': round(entry['wall_s'] / reference['wall_s'], 3)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por etapa del pipeline de características.")
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    parser.add_argument('--stages', nargs='+', default=None, help="Etapas a medir (por defecto todas).")
+    parser.add_argument('--data-dir', default='bench_data')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', default=None, help="Resultados previos para detectar regresiones.")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    # Nivel de log que no ensucie las mediciones
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    results = []
+    for size in args.sizes:
+        results.extend(run_benchmark(SIZES[size], data_dir=args.data_dir, seed=args.seed, stages=args.stages))
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f"Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_results(results, json.load(baseline_file)['results'], args.tolerance)
+        for regression in regressions:
+            print(f"Regresión: {regression['stage']} @ {regression['events']} eventos "
+                  f"{regression['baseline_s']} s -> {regression['current_s']} s (x{regression['ratio']})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,166 @@
+import json
+import math
+import os
+import warnings
+
 import pandas as pd
 import numpy as np
-from scipy.stats import zscore
+
+from flow_state import RunningStats
+from kernels import as_float_array
+
+# Versión del formato del estado serializado de 'StreamingCleaner'
+CLEANER_FORMAT_VERSION = 1
+
+# Columnas por bloque en '_clean_numeric' (acota la memoria temporal de la limpieza)
+NUMERIC_COLUMN_GROUP = 8
 
 def replace_inf_with_nan(df):
     """
     Reemplaza valores infinitos con NaN en un DataFrame.
+
+    Solo se recorren las columnas que pueden contener infinitos: flotantes, de objeto y categóricas con una
+    categoría infinita. Las enteras, booleanas y de fecha se omiten sin leerlas.
+    """
+    infinities = [np.inf, -np.inf]
+    for column in df.columns:
+        dtype = df[column].dtype
+        if isinstance(dtype, np.dtype) and dtype.kind == 'f':
+            values = df[column].to_numpy()
+            infinite = np.isinf(values)
+            if infinite.any():
+                df[column] = np.where(infinite, np.nan, values)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            if dtype.categories.isin(infinities).any():
+                df[column] = df[column].replace(infinities, np.nan)
+        elif dtype == object or pd.api.types.is_float_dtype(dtype):
+            if df[column].isin(infinities).any():
+                df[column] = df[column].replace(infinities, np.nan)
+
+def _present_columns(df, columns, message):
+    present = []
+    for column in columns:
+        if column in df.columns:
+            present.append(column)
+        else:
+            print(message.format(column=column))
+    return present
+
+
+def _clean_numeric(df, columns, impute=True, clip=True, threshold=3):
     """
-    df.replace([np.inf, -np.inf], np.nan, inplace=True)
+    Imputación con la mediana y reemplazo de atípicos (|z-score| > 'threshold') por bloques de columnas.
+
+    Cada grupo de 'NUMERIC_COLUMN_GROUP' columnas se copia en un bloque 2-D float64 en orden Fortran (cada
+    columna contigua, de modo que las reducciones por eje 0 suman igual que sobre cada Series); medianas,
+    medias y desviaciones se calculan por eje 0, las sustituciones se hacen en el lugar con máscaras y solo
+    se reescriben en 'df' las columnas que cambian. Trabajar por grupos acota la memoria temporal a unas
+    pocas columnas en lugar de duplicar todas las características.
+
+    Cada columna se reescribe con el tipo que le dejaba la versión por columna ('_restore_dtype').
+    """
+    for start in range(0, len(columns), NUMERIC_COLUMN_GROUP):
+        group = columns[start:start + NUMERIC_COLUMN_GROUP]
+        block = np.empty((df.shape[0], len(group)), dtype='float64', order='F')
+        for position, column in enumerate(group):
+            block[:, position] = as_float_array(df[column])
+        changed, rescored = _clean_block(block, impute, clip, threshold)
+        for position in np.flatnonzero(changed):
+            column = group[position]
+            df[column] = _restore_dtype(block[:, position], df[column].dtype, rescored[position])
+
+
+def _restore_dtype(values, dtype, rescored):
+    """
+    Tipo con que se reescribe una columna limpiada, el mismo que con 'fillna' y 'np.where' por columna.
+
+    - Flotantes de numpy: conservan su ancho (float32 sigue en float32).
+    - Tipos con nulos de pandas (UInt16, Int64...): conservan el tipo si solo se imputaron ('fillna'); si
+      pasaron por el z-score ('rescored'), 'np.where' los dejaba en float64.
+    - Enteros de numpy: float64.
+    """
+    if isinstance(dtype, np.dtype):
+        return values.astype(dtype, copy=False) if dtype.kind == 'f' else values
+    if not rescored:
+        try:
+            return pd.array(values, dtype='float64').astype(dtype)
+        except (TypeError, ValueError):
+            # La mediana no cabe en el tipo (p. ej. 2.5 en un entero): se queda en float64
+            pass
+    return values
+
+
+def _clean_block(block, impute, clip, threshold):
+    """
+    Limpia un bloque en el lugar.
+
+    Retorna:
+    - Una tupla (máscara de columnas que deben reescribirse, máscara de las que pasaron por el z-score).
+    """
+    missing = np.isnan(block)
+    has_missing = missing.any(axis=0)
+    # Las medianas se calculan solo donde hacen falta: columnas con nulos y columnas con atípicos.
+    # Rellenar con la mediana no la cambia, así que la de imputación sirve también para los atípicos.
+    medians = np.full(block.shape[1], np.nan)
+    if has_missing.any():
+        with warnings.catch_warnings():
+            # Columnas sin ningún valor: la mediana es NaN y quedan como están, igual que con 'Series.median'
+            warnings.simplefilter('ignore', RuntimeWarning)
+            medians[has_missing] = np.nanmedian(block[:, has_missing], axis=0)
+    # Columnas que se reescriben; las enteras con nulos pasan a float64 como en la versión por columna
+    changed = has_missing.copy()
+    missing_median = has_missing.copy()
+    rescored = np.zeros(block.shape[1], dtype=bool)
+
+    if impute and has_missing.any():
+        np.copyto(block, medians, where=missing)
+        has_missing = np.isnan(medians)
+    del missing
+
+    if clip:
+        # Media y desviación poblacional como 'scipy.stats.zscore' (mismas operaciones que 'np.std', pero
+        # reutilizando las desviaciones para el z-score); un NaN restante anula el z-score de su columna
+        deviations = block - block.mean(axis=0)
+        std = np.sqrt(np.add.reduce(deviations * deviations, axis=0) / block.shape[0])
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            active = std > 0
+            if has_missing.any():
+                active[has_missing] = np.nanstd(block[:, has_missing], axis=0) > 0
+            np.abs(deviations, out=deviations)
+            deviations /= std
+            outliers = deviations > threshold
+        del deviations
+        outliers &= active
+        pending = outliers.any(axis=0) & ~missing_median
+        if pending.any():
+            medians[pending] = np.median(block[:, pending], axis=0, overwrite_input=True)
+        np.copyto(block, medians, where=outliers)
+        changed |= active
+        rescored = active
+    return changed, rescored
+
 
 def fill_na(df, numeric_features, categorical_features):
     """
     Llena los valores NaN en características numéricas con la mediana y en características categóricas con la moda.
     """
-    for column in numeric_features:
-        if column in df.columns:
-            df[column] = df[column].fillna(df[column].median())
-        else:
-            print(f"Advertencia: La columna numérica '{column}' no existe en el DataFrame.")
+    numeric_present = _present_columns(df, numeric_features, "Advertencia: La columna numérica '{column}' no existe en el DataFrame.")
+    _clean_numeric(df, numeric_present, clip=False)
+    fill_categorical(df, categorical_features)
+
+def fill_categorical(df, categorical_features):
+    """
+    Llena los valores NaN en características categóricas con la moda (o 'Unknown' si no hay ningún valor).
+    """
     for column in categorical_features:
         if column in df.columns:
             mode_value = df[column].mode()
             if not mode_value.empty:
                 df[column] = df[column].fillna(mode_value[0])
             else:
+                if isinstance(df[column].dtype, pd.CategoricalDtype) and "Unknown" not in df[column].cat.categories:
+                    df[column] = df[column].cat.add_categories("Unknown")
                 df[column] = df[column].fillna("Unknown")
         else:
             print(f"Advertencia: La columna categórica '{column}' no existe en el DataFrame.")
@@ -31,25 +169,265 @@ def remove_outliers(df, numeric_features):
     """
     Identifica y trata valores atípicos en características numéricas utilizando el método Z-Score.
     """
-    for column in numeric_features:
-        if column in df.columns:
-            # Evita calcular el z-score para columnas con un único valor único (std=0)
-            if df[column].std() > 0:
-                df[column] = np.where(np.abs(zscore(df[column])) > 3, df[column].median(), df[column])
-        else:
-            print(f"Advertencia: La columna numérica '{column}' para la eliminación de atípicos no existe en el DataFrame.")
+    numeric_present = _present_columns(df, numeric_features, "Advertencia: La columna numérica '{column}' para la eliminación de atípicos no existe en el DataFrame.")
+    _clean_numeric(df, numeric_present, impute=False)
 
 def clean_data(df, numeric_features, categorical_features):
     """
     Función agregadora que aplica todas las funciones de limpieza.
+
+    La imputación y el tratamiento de atípicos de las características numéricas se hacen sobre un único
+    bloque, con el mismo resultado que 'fill_na' seguido de 'remove_outliers'.
     """
     if df.empty:
         print("Error: El DataFrame de entrada está vacío. La limpieza de datos no puede proceder.")
         return
     
     replace_inf_with_nan(df)
-    fill_na(df, numeric_features, categorical_features)
-    remove_outliers(df, numeric_features)
+    numeric_present = _present_columns(df, numeric_features, "Advertencia: La columna numérica '{column}' no existe en el DataFrame.")
+    for column in numeric_features:
+        if column not in df.columns:
+            print(f"Advertencia: La columna numérica '{column}' para la eliminación de atípicos no existe en el DataFrame.")
+    _clean_numeric(df, numeric_present)
+    fill_categorical(df, categorical_features)
+
+def _native(value):
+    """Convierte escalares de numpy a tipos nativos para guardarlos en JSON."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class QuantileSketch:
+    """
+    Resumen de cuantiles combinable (t-digest con función de escala k1) de tamaño acotado.
+
+    Guarda como mucho unos 'compression / 2' centroides (media y peso), más pequeños en las colas, así que
+    la memoria no depende del número de valores vistos. El error de rango de la mediana es del orden de
+    1.5 / compression.
+    """
+
+    def __init__(self, compression=200, means=(), weights=(), minimum=math.nan, maximum=math.nan):
+        self.compression = compression
+        self.means = np.asarray(means, dtype='float64')
+        self.weights = np.asarray(weights, dtype='float64')
+        self.min = minimum
+        self.max = maximum
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def _compress(self, means, weights):
+        order = np.argsort(means)
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        quantiles = (cumulative - weights / 2) / cumulative[-1]
+        # Centroides consecutivos con el mismo índice k se fusionan; k es monótono en q, así que son contiguos
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * quantiles - 1))
+        starts = np.flatnonzero(np.concatenate(([True], k[1:] != k[:-1])))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def _merge_extremes(self, minimum, maximum):
+        self.min = minimum if self.min != self.min else min(self.min, minimum)
+        self.max = maximum if self.max != self.max else max(self.max, maximum)
+
+    def update(self, values):
+        """Agrega valores; se ignoran NaN e infinitos."""
+        values = np.asarray(values, dtype='float64')
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self._compress(np.concatenate((self.means, values)), np.concatenate((self.weights, np.ones(len(values)))))
+        self._merge_extremes(float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        if not len(other.means):
+            return
+        self._compress(np.concatenate((self.means, other.means)), np.concatenate((self.weights, other.weights)))
+        self._merge_extremes(other.min, other.max)
+
+    def quantile(self, q):
+        """Cuantil aproximado 'q' (entre 0 y 1); NaN si no se ha visto ningún valor."""
+        if not len(self.means):
+            return math.nan
+        cumulative = np.cumsum(self.weights)
+        positions = np.concatenate(([0.0], cumulative - self.weights / 2, [cumulative[-1]]))
+        values = np.concatenate(([self.min], self.means, [self.max]))
+        return float(np.interp(q * cumulative[-1], positions, values))
+
+    def to_dict(self):
+        return {'compression': self.compression, 'means': self.means.tolist(), 'weights': self.weights.tolist(),
+                'min': None if self.min != self.min else self.min, 'max': None if self.max != self.max else self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        none_to_nan = lambda value: math.nan if value is None else value
+        return cls(data['compression'], data['means'], data['weights'], none_to_nan(data['min']),
+                   none_to_nan(data['max']))
+
+
+class FrequencySketch:
+    """
+    Valores más frecuentes de una columna categórica (algoritmo Misra-Gries) con 'capacity' contadores.
+
+    Todo valor con frecuencia mayor que 1 / (capacity + 1) del total está garantizado en el resumen, de modo
+    que la moda de una columna dominada por un valor se conserva con memoria acotada.
+    """
+
+    def __init__(self, capacity=64, counts=None):
+        self.capacity = capacity
+        self.counts = dict(counts or {})
+
+    def _prune(self):
+        if len(self.counts) > self.capacity:
+            threshold = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {value: count - threshold for value, count in self.counts.items() if count > threshold}
+
+    def update(self, values):
+        """Agrega los valores de una serie; se ignoran los nulos."""
+        counts = pd.Series(values).value_counts(sort=False)
+        for value, count in counts[counts > 0].items():
+            value = _native(value)
+            self.counts[value] = self.counts.get(value, 0) + int(count)
+        self._prune()
+
+    def merge(self, other):
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        self._prune()
+
+    def mode(self):
+        """Valor más frecuente, o None si no se ha visto ninguno."""
+        return max(self.counts, key=self.counts.get) if self.counts else None
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'counts': [[value, count] for value, count in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['capacity'], {value: count for value, count in data['counts']})
+
+
+class StreamingCleaner:
+    """
+    Versión con estado de 'clean_data' para datos por lotes o en streaming.
+
+    En lugar de la mediana, la moda y el z-score de cada lote completo, mantiene por característica numérica
+    la media y varianza acumuladas (Welford) y un 'QuantileSketch', y por característica categórica un
+    'FrequencySketch'. Cada lote se imputa y se le recortan los atípicos con ese estado, con memoria
+    constante por característica. El estado se guarda en JSON para conservar la calibración entre reinicios.
+    """
+
+    def __init__(self, numeric_features, categorical_features, compression=200, capacity=64, threshold=3.0):
+        self.numeric_features = list(numeric_features)
+        self.categorical_features = list(categorical_features)
+        self.threshold = threshold
+        self.moments = {column: RunningStats() for column in self.numeric_features}
+        self.quantiles = {column: QuantileSketch(compression) for column in self.numeric_features}
+        self.frequencies = {column: FrequencySketch(capacity) for column in self.categorical_features}
+
+    def update(self, df):
+        """Incorpora al estado los valores observados (no nulos y finitos) de un lote."""
+        for column in self.numeric_features:
+            if column not in df.columns:
+                continue
+            values = as_float_array(df[column])
+            values = values[np.isfinite(values)]
+            if len(values):
+                mean = values.mean()
+                self.moments[column].merge_moments(len(values), values.sum(), mean, ((values - mean) ** 2).sum(),
+                                                   values.min(), values.max())
+                self.quantiles[column].update(values)
+        for column in self.categorical_features:
+            if column in df.columns:
+                self.frequencies[column].update(df[column])
+
+    def clean(self, df, update=True):
+        """
+        Limpia un lote en el lugar con el estado acumulado, como 'clean_data' sobre el lote completo.
+
+        Parámetros:
+        - df (pandas.DataFrame): Lote a limpiar.
+        - update (bool): Si es True, el lote se incorpora al estado antes de limpiarlo.
+        """
+        if df.empty:
+            return
+        if update:
+            self.update(df)
+
+        for column in self.numeric_features:
+            if column not in df.columns:
+                continue
+            # Infinitos a NaN solo en las características (no en todo el DataFrame como 'replace_inf_with_nan')
+            if pd.api.types.is_float_dtype(df[column]):
+                values = df[column].to_numpy()
+                infinite = np.isinf(values)
+                if infinite.any():
+                    df[column] = np.where(infinite, np.nan, values)
+            median = self.quantiles[column].quantile(0.5)
+            if df[column].isna().any():
+                if pd.api.types.is_integer_dtype(df[column]):
+                    df[column] = df[column].astype('float64')
+                df[column] = df[column].fillna(median)
+            # Z-score con la media y la desviación poblacional acumuladas, como 'scipy.stats.zscore'
+            stats = self.moments[column]
+            std = stats.std(ddof=0) if stats.count else math.nan
+            if std > 0:
+                values = as_float_array(df[column])
+                outliers = np.abs(values - stats.mean) / std > self.threshold
+                if outliers.any():
+                    df[column] = np.where(outliers, median, values)
+
+        for column in self.categorical_features:
+            if column not in df.columns or not df[column].isna().any():
+                continue
+            fill_value = self.frequencies[column].mode()
+            fill_value = "Unknown" if fill_value is None else fill_value
+            if isinstance(df[column].dtype, pd.CategoricalDtype) and fill_value not in df[column].cat.categories:
+                df[column] = df[column].cat.add_categories(fill_value)
+            df[column] = df[column].fillna(fill_value)
+
+    def to_dict(self):
+        return {
+            'format_version': CLEANER_FORMAT_VERSION,
+            'numeric_features': self.numeric_features,
+            'categorical_features': self.categorical_features,
+            'threshold': self.threshold,
+            'moments': {column: [stats.count, stats.total, stats.mean, stats.m2,
+                                 None if stats.min != stats.min else stats.min,
+                                 None if stats.max != stats.max else stats.max]
+                        for column, stats in self.moments.items()},
+            'quantiles': {column: sketch.to_dict() for column, sketch in self.quantiles.items()},
+            'frequencies': {column: sketch.to_dict() for column, sketch in self.frequencies.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format_version') != CLEANER_FORMAT_VERSION:
+            raise ValueError(f"Formato de estado de limpieza no soportado: {data.get('format_version')}")
+        cleaner = cls(data['numeric_features'], data['categorical_features'], threshold=data['threshold'])
+        for column, (count, total, mean, m2, minimum, maximum) in data['moments'].items():
+            if count:
+                cleaner.moments[column].merge_moments(count, total, mean, m2, minimum, maximum)
+        cleaner.quantiles = {column: QuantileSketch.from_dict(sketch) for column, sketch in data['quantiles'].items()}
+        cleaner.frequencies = {column: FrequencySketch.from_dict(sketch)
+                               for column, sketch in data['frequencies'].items()}
+        return cleaner
+
+    def save(self, path):
+        """Guarda el estado en JSON de forma atómica."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.to_dict(), file)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
 
 # Ejemplo de uso
 # Asegúrate de definir 'df', 'numeric_features' y 'categorical_features' antes de llamar a clean_data.
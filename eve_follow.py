@@ -0,0 +1,390 @@
+import argparse
+import contextlib
+import itertools
+import logging
+import os
+import time
+
+from data_cleaning import StreamingCleaner
+from event_cache import write_parquet
+from eve_reader import DEFAULT_EVENT_TYPES, decode_eve_lines, normalize_events
+from flow_state import BoundedFlowStateTable, FlowStateTable
+from flow_windows import WindowedFlowAggregator
+from instrumentation import run_report
+from processData import categorical_features_updated, numeric_features_updated, preprocesar_datos
+from schema import EVENT_SCHEMA
+from scoring_service import ScoringClient
+
+# Bytes leídos como máximo por llamada, para que un atraso grande no bloquee la emisión de lotes
+READ_CHUNK_BYTES = 1 << 20
+
+
+class EveFollower:
+    """
+    Sigue un eve.json como 'tail -F': lee solo las líneas nuevas y sobrevive a la rotación del archivo.
+
+    - Rotación por renombrado (logrotate por defecto): cambia el inodo de la ruta; se terminan de leer
+      las líneas pendientes del archivo anterior y se abre el nuevo desde el principio.
+    - Truncado en el lugar ('copytruncate'): el tamaño queda por debajo de la posición leída; se vuelve
+      a leer desde el principio.
+    - Archivo ausente (entre la rotación y la creación del nuevo): se reintenta en la siguiente lectura.
+    """
+
+    def __init__(self, path, from_start=False):
+        self.path = path
+        self.from_start = from_start
+        self.rotations = 0
+        self.truncations = 0
+        self._file = None
+        self._inode = None
+        self._position = 0
+        self._pending = b''
+
+    def _open(self, from_start):
+        try:
+            file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        if not from_start:
+            file.seek(0, os.SEEK_END)
+        self._file = file
+        self._inode = os.fstat(file.fileno()).st_ino
+        self._position = file.tell()
+        self._pending = b''
+        return True
+
+    def _read_available(self, max_bytes):
+        """Líneas completas nuevas del archivo abierto; una línea a medio escribir queda pendiente."""
+        data = self._file.read(max_bytes)
+        if not data:
+            return []
+        self._position += len(data)
+        lines = (self._pending + data).split(b'\n')
+        self._pending = lines.pop()
+        return [line for line in lines if line]
+
+    def _flush_pending(self):
+        lines = [self._pending] if self._pending.strip() else []
+        self._pending = b''
+        return lines
+
+    def read_lines(self, max_bytes=READ_CHUNK_BYTES):
+        """
+        Devuelve las líneas completas escritas desde la última llamada (lista vacía si no hay nuevas).
+        """
+        if self._file is None:
+            # La primera apertura respeta 'from_start'; tras una rotación el archivo nuevo se lee entero
+            if not self._open(self.from_start or self.rotations > 0):
+                return []
+
+        lines = self._read_available(max_bytes)
+        if lines:
+            return lines
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+
+        if stat is None or stat.st_ino != self._inode:
+            # Rotado: se vacía lo que quede del archivo anterior antes de cambiar al nuevo
+            lines = self._flush_pending()
+            self._file.close()
+            self._file = None
+            self.rotations += 1
+            logging.info("Rotación detectada en %s.", self.path)
+            if self._open(from_start=True):
+                lines.extend(self._read_available(max_bytes))
+        elif stat.st_size < self._position:
+            logging.info("Truncado detectado en %s; se lee desde el principio.", self.path)
+            self.truncations += 1
+            self._file.seek(0)
+            self._position = 0
+            self._pending = b''
+            lines = self._read_available(max_bytes)
+        return lines
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FollowMetrics:
+    """
+    Métricas del modo en vivo: eventos y lotes procesados, throughput y retrasos.
+
+    - lag_s: retraso del último lote respecto al reloj (ahora menos la marca de tiempo más reciente del lote).
+    - latency_s: tiempo desde que se leyó la primera línea de un lote hasta que se emitieron sus características.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.events = 0
+        self.batches = 0
+        self.rows_out = 0
+        self.last_lag_s = None
+        self.last_latency_s = None
+        self.max_latency_s = 0.0
+
+    def record_batch(self, events, rows_out, newest_timestamp_us, read_started):
+        now = time.time()
+        self.events += events
+        self.batches += 1
+        self.rows_out += rows_out
+        self.last_latency_s = now - read_started
+        self.max_latency_s = max(self.max_latency_s, self.last_latency_s)
+        if newest_timestamp_us is not None:
+            self.last_lag_s = now - newest_timestamp_us / 1e6
+
+    def snapshot(self):
+        elapsed = time.time() - self.started
+        return {
+            'events': self.events,
+            'batches': self.batches,
+            'rows_out': self.rows_out,
+            'events_per_s': round(self.events / elapsed, 1) if elapsed > 0 else None,
+            'lag_s': round(self.last_lag_s, 3) if self.last_lag_s is not None else None,
+            'latency_s': round(self.last_latency_s, 3) if self.last_latency_s is not None else None,
+            'max_latency_s': round(self.max_latency_s, 3),
+        }
+
+
+def follow_eve(path, batch_size=5000, max_latency=1.0, poll_interval=0.2, from_start=False,
+               event_types=DEFAULT_EVENT_TYPES, schema=EVENT_SCHEMA, follower=None, stop=None):
+    """
+    Genera micro-lotes de eventos nuevos de eve.json a medida que Suricata los escribe.
+
+    Un lote se emite al reunir 'batch_size' eventos o cuando su primer evento lleva 'max_latency'
+    segundos esperando, lo que ocurra antes.
+
+    Parámetros:
+    - path (str): Ruta al archivo eve.json.
+    - batch_size (int): Eventos máximos por micro-lote.
+    - max_latency (float): Segundos máximos que un evento espera antes de emitirse su lote.
+    - poll_interval (float): Espera entre lecturas cuando no hay líneas nuevas.
+    - from_start (bool): Si es True, procesa también el contenido actual del archivo.
+    - event_types (iterable): Tipos de evento a conservar.
+    - schema (dict): Esquema de tipos aplicado a cada lote.
+    - follower (EveFollower, opcional): Lector a usar (permite consultar sus contadores de rotación).
+    - stop (callable, opcional): Se consulta cuando no hay líneas nuevas; si devuelve True se emite el
+      lote pendiente y termina.
+
+    Con Ctrl-C (KeyboardInterrupt) se emite también el lote pendiente y la interrupción se propaga al
+    pedir el siguiente.
+
+    Retorna:
+    - Un generador de tuplas (DataFrame, momento en que se leyó la primera línea del lote).
+    """
+    follower = follower or EveFollower(path, from_start=from_start)
+    events = []
+    read_started = None
+    try:
+        while True:
+            lines = follower.read_lines()
+            stopping = not lines and stop is not None and stop()
+            if lines:
+                if read_started is None:
+                    read_started = time.time()
+                events.extend(decode_eve_lines(lines, event_types=event_types, source=path))
+
+            while len(events) >= batch_size:
+                yield normalize_events(events[:batch_size], schema), read_started
+                events = events[batch_size:]
+                read_started = time.time() if events else None
+            # Tras los lotes completos: lo que queda empezó a esperar al emitirse el último
+            waited = read_started is not None and time.time() - read_started >= max_latency
+            if events and (waited or stopping):
+                yield normalize_events(events, schema), read_started
+                events = []
+                read_started = None
+            elif not events:
+                read_started = None
+
+            if stopping:
+                return
+            if not lines:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        # Ctrl-C mientras se lee o se espera: los eventos ya decodificados salen como último lote
+        if events:
+            yield normalize_events(events, schema), read_started
+        raise
+    finally:
+        follower.close()
+
+
+def run_live(path, on_features, batch_size=5000, max_latency=1.0, poll_interval=0.2, from_start=False,
+             metrics_interval=30.0, report_path=None, stop=None, cleaner=None, cleaner_path=None, windows=None,
+             state=None, trace_allocations=False):
+    """
+    Modo continuo: sigue eve.json, calcula las características de cada micro-lote con 'preprocesar_datos'
+    y las entrega a 'on_features'.
+
+    Las estadísticas por flujo se acumulan entre lotes en una 'FlowStateTable', así que cada fila emitida
+    lleva las características de todo lo visto de su flujo hasta ese momento. Con 'windows' se emiten en
+    cambio las características de cada ventana de tiempo de evento al cerrarse.
+
+    Parámetros:
+    - path (str): Ruta al archivo eve.json.
+    - on_features (callable): Recibe el DataFrame de características de cada micro-lote.
+    - metrics_interval (float): Segundos entre registros de métricas en el log.
+    - report_path (str, opcional): Archivo JSONL para el reporte de tiempos por etapa de cada lote.
+    - trace_allocations (bool): Añade al reporte el pico de asignaciones de cada etapa (tracemalloc).
+    - stop (callable, opcional): Condición de parada (ver 'follow_eve').
+    - cleaner (data_cleaning.StreamingCleaner, opcional): Si se indica, cada micro-lote se limpia con su
+      estado acumulado antes de entregarlo.
+    - cleaner_path (str, opcional): Archivo donde guardar el estado de 'cleaner' en cada registro de
+      métricas y al terminar.
+    - windows (flow_windows.WindowedFlowAggregator, opcional): Agregación por ventanas; las ventanas que
+      siguen abiertas al terminar se emiten al final.
+    - state (flow_state.FlowStateTable, opcional): Tabla de estado de flujos; con una
+      'BoundedFlowStateTable' la memoria queda acotada y los flujos que siguen en ella se expulsan al terminar.
+    - Los demás parámetros se pasan a 'follow_eve'.
+
+    Retorna:
+    - Las métricas finales ('FollowMetrics').
+    """
+    state = state if state is not None else FlowStateTable()
+    metrics = FollowMetrics()
+    follower = EveFollower(path, from_start=from_start)
+    last_log = time.time()
+
+    for batch, read_started in follow_eve(path, batch_size=batch_size, max_latency=max_latency,
+                                          poll_interval=poll_interval, from_start=from_start,
+                                          follower=follower, stop=stop):
+        newest = int(batch['timestamp'].max()) if 'timestamp' in batch.columns and len(batch) else None
+        report = (run_report(batch_id=f'live-{metrics.batches}', path=report_path, trace_allocations=trace_allocations)
+                  if report_path else contextlib.nullcontext())
+        with report:
+            if windows is None:
+                features = preprocesar_datos(batch, estado_flujos=state)
+            else:
+                features = windows.update(batch)
+            if features is not None and cleaner is not None:
+                cleaner.clean(features)
+        if features is not None:
+            on_features(features)
+        metrics.record_batch(len(batch), len(features) if features is not None else 0, newest, read_started)
+
+        if time.time() - last_log >= metrics_interval:
+            snapshot = metrics.snapshot()
+            snapshot.update(rotations=follower.rotations, truncations=follower.truncations)
+            snapshot.update(state.snapshot())
+            if windows is not None:
+                snapshot.update(windows.snapshot())
+            logging.info("Métricas en vivo: %s", snapshot)
+            if cleaner is not None and cleaner_path:
+                cleaner.save(cleaner_path)
+            last_log = time.time()
+
+    if windows is not None:
+        features = windows.flush()
+        if features is not None:
+            if cleaner is not None:
+                cleaner.clean(features)
+            on_features(features)
+            metrics.rows_out += len(features)
+    if isinstance(state, BoundedFlowStateTable):
+        state.flush()
+    if cleaner is not None and cleaner_path:
+        cleaner.save(cleaner_path)
+    return metrics
+
+
+def add_flow_table_arguments(parser):
+    """Opciones de línea de comandos de la tabla de flujos acotada (eve_follow y eve_receiver)."""
+    parser.add_argument('--inactividad', type=float, default=None,
+                        help="Segundos de tiempo de evento sin actividad tras los que un flujo se expulsa y se emite.")
+    parser.add_argument('--flujos-max', type=int, default=None, help="Flujos máximos en memoria (expulsión LRU).")
+    parser.add_argument('--memoria-flujos-mb', type=float, default=None,
+                        help="Memoria estimada máxima del estado de flujos en MB (expulsión LRU).")
+
+
+def flow_table_from_arguments(args, output_dir=None):
+    """
+    'BoundedFlowStateTable' según las opciones de 'add_flow_table_arguments', o None si no se usó ninguna.
+
+    Las características finales de cada flujo expulsado se guardan en Parquet en 'output_dir' o se registran.
+    """
+    if args.inactividad is None and args.flujos_max is None and args.memoria_flujos_mb is None:
+        return None
+    sequence = itertools.count()
+
+    def emit_evicted(rows, reason):
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            write_parquet(rows, os.path.join(output_dir, f'flows-{int(time.time())}-{next(sequence):08d}.parquet'))
+        else:
+            logging.info("%d flujos expulsados (%s).", len(rows), reason)
+
+    max_bytes = args.memoria_flujos_mb * 2**20 if args.memoria_flujos_mb is not None else None
+    return BoundedFlowStateTable(idle_timeout=args.inactividad, max_flows=args.flujos_max, max_bytes=max_bytes,
+                                 on_evict=emit_evicted)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Sigue eve.json en vivo y calcula características por micro-lote.")
+    parser.add_argument('eve', help="Ruta del eve.json.")
+    parser.add_argument('--lote', type=int, default=5000, help="Eventos máximos por micro-lote.")
+    parser.add_argument('--latencia', type=float, default=1.0, help="Segundos máximos de espera de un evento.")
+    parser.add_argument('--desde-inicio', action='store_true', help="Procesa también el contenido actual.")
+    parser.add_argument('--salida', default=None, help="Directorio donde guardar cada micro-lote en Parquet.")
+    parser.add_argument('--reporte', default=None, help="Archivo JSONL con el reporte de tiempos por lote.")
+    parser.add_argument('--trazar-memoria', action='store_true',
+                        help="Con --reporte, añade el pico de asignaciones de cada etapa medido con tracemalloc (más lento).")
+    parser.add_argument('--ventana', type=float, default=None,
+                        help="Segundos de cada ventana de tiempo de evento; sin esta opción se acumula por flujo.")
+    parser.add_argument('--deslizamiento', type=float, default=None,
+                        help="Segundos entre inicios de ventana (ventanas deslizantes); por defecto igual a --ventana.")
+    parser.add_argument('--retraso', type=float, default=0.0,
+                        help="Segundos de retraso tolerado antes de cerrar una ventana (marca de agua).")
+    parser.add_argument('--limpiador', default=None,
+                        help="Estado JSON de la limpieza en línea: se carga si existe y se guarda periódicamente.")
+    parser.add_argument('--puntuar', default=None,
+                        help="Dirección del servicio de puntuación (http://host:puerto o socket unix) al que enviar cada micro-lote; "
+                             "su modelo debe estar entrenado con las columnas de 'preprocesar_datos'.")
+    add_flow_table_arguments(parser)
+    args = parser.parse_args()
+
+    windows = WindowedFlowAggregator(args.ventana, args.deslizamiento, args.retraso) if args.ventana else None
+
+    cleaner = None
+    if args.limpiador:
+        if os.path.exists(args.limpiador):
+            cleaner = StreamingCleaner.load(args.limpiador)
+        else:
+            cleaner = StreamingCleaner(numeric_features_updated, categorical_features_updated)
+
+    sequence = itertools.count()
+    client = ScoringClient(args.puntuar) if args.puntuar else None
+
+    def emit(features):
+        if client is not None:
+            scores = client.score(features)
+            logging.info("Micro-lote puntuado: %s", scores['label'].value_counts().to_dict())
+        if args.salida:
+            os.makedirs(args.salida, exist_ok=True)
+            write_parquet(features, os.path.join(args.salida, f'features-{int(time.time())}-{next(sequence):08d}.parquet'))
+        else:
+            logging.info("Micro-lote: %d filas de características.", len(features))
+
+    state = flow_table_from_arguments(args, args.salida)
+    try:
+        run_live(args.eve, emit, batch_size=args.lote, max_latency=args.latencia, from_start=args.desde_inicio,
+                 report_path=args.reporte, cleaner=cleaner, cleaner_path=args.limpiador, windows=windows, state=state,
+                 trace_allocations=args.trazar_memoria)
+    except KeyboardInterrupt:
+        # Ctrl-C es la forma de detener el modo en vivo: las ventanas abiertas se emiten como al terminar run_live
+        if windows is not None:
+            features = windows.flush()
+            if features is not None:
+                if cleaner is not None:
+                    cleaner.clean(features)
+                emit(features)
+        if state is not None:
+            state.flush()
+        if cleaner is not None:
+            cleaner.save(args.limpiador)
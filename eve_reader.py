@@ -0,0 +1,245 @@
+import json
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+from schema import EVENT_SCHEMA, apply_schema
+
+# Tipos de evento de Suricata que usa el pipeline de características
+DEFAULT_EVENT_TYPES = ('flow', 'http', 'dns', 'tls')
+
+
+def build_event_type_filter(event_types):
+    """
+    Construye una expresión regular de bytes que reconoce la clave 'event_type' de los tipos indicados.
+
+    Suricata escribe cada evento como '"event_type":"flow"', por lo que basta buscar esa secuencia
+    sobre la línea cruda para descartar eventos no deseados sin decodificar el JSON.
+    """
+    alternatives = b'|'.join(re.escape(event_type.encode('utf-8')) for event_type in event_types)
+    return re.compile(rb'"event_type"\s*:\s*"(?:' + alternatives + rb')"')
+
+
+def decode_eve_lines(lines, event_types=DEFAULT_EVENT_TYPES, skip_invalid=True, source='eve.json', invalid=None):
+    """
+    Decodifica líneas crudas (bytes) de eve.json y devuelve los eventos de los tipos indicados.
+
+    Una línea inválida (JSON mal formado, bytes que no son UTF-8 o un valor JSON que no es un objeto) solo
+    afecta a esa línea.
+
+    Parámetros:
+    - lines (iterable de bytes): Líneas del archivo, con o sin salto de línea final.
+    - event_types (iterable): Tipos de evento a conservar.
+    - skip_invalid (bool): Si es True, las líneas inválidas se registran y se omiten; si es False, lanzan ValueError.
+    - source (str): Nombre del origen para los mensajes de log.
+    - invalid (collections.Counter, opcional): Si se indica, suma en 'invalid[source]' las líneas omitidas.
+
+    Retorna:
+    - Un generador de diccionarios, uno por evento conservado.
+    """
+    event_types = frozenset(event_types)
+    event_filter = build_event_type_filter(event_types)
+    invalid_lines = 0
+
+    for line in lines:
+        # Filtro barato a nivel de bytes antes de decodificar
+        if not event_filter.search(line):
+            continue
+        try:
+            # UnicodeDecodeError (bytes que no son UTF-8) y JSONDecodeError son ValueError
+            event = json.loads(line)
+            if not isinstance(event, dict):
+                raise ValueError(f"Se esperaba un objeto JSON y se obtuvo {type(event).__name__}.")
+        except ValueError:
+            if not skip_invalid:
+                raise
+            invalid_lines += 1
+            continue
+        # La clave podría aparecer anidada; se confirma sobre el evento ya decodificado
+        if event.get('event_type') in event_types:
+            yield event
+
+    if invalid_lines:
+        logging.warning("Se omitieron %d líneas inválidas en %s.", invalid_lines, source)
+        if invalid is not None:
+            invalid[source] += invalid_lines
+
+
+def _byte_range_lines(file, start, end):
+    """Líneas de 'file' desde el byte 'start' hasta el byte 'end' (None: hasta el final)."""
+    file.seek(start)
+    position = start
+    for line in file:
+        if end is not None and position >= end:
+            return
+        position += len(line)
+        yield line
+
+
+def iter_eve_events(path, event_types=DEFAULT_EVENT_TYPES, skip_invalid=True, start=0, end=None):
+    """
+    Recorre el archivo eve.json línea a línea y devuelve los eventos decodificados de los tipos indicados.
+
+    Parámetros:
+    - path (str): Ruta al archivo eve.json.
+    - event_types (iterable): Tipos de evento a conservar.
+    - skip_invalid (bool): Si es True, las líneas inválidas se registran y se omiten.
+    - start, end (int): Rango de bytes a leer; deben caer en inicios de línea. 'end' None lee hasta el final.
+
+    Retorna:
+    - Un generador de diccionarios, uno por evento conservado.
+    """
+    with open(path, 'rb') as file:
+        lines = _byte_range_lines(file, start, end) if start or end is not None else file
+        yield from decode_eve_lines(lines, event_types=event_types, skip_invalid=skip_invalid, source=path)
+
+
+def normalize_events(events, schema=EVENT_SCHEMA):
+    """Aplana una lista de eventos en un DataFrame y aplica los tipos de 'schema' (None los conserva)."""
+    df = pd.json_normalize(events)
+    return apply_schema(df, schema) if schema else df
+
+
+def compile_field_paths(columns, schema=EVENT_SCHEMA):
+    """
+    Traduce nombres de columna con la notación de json_normalize ('flow.pkts_toserver', 'tcp.flags', ...)
+    a la ruta de claves dentro del evento y al tipo declarado en 'schema'.
+
+    Retorna:
+    - Una lista de tuplas (columna, ruta, tipo); el tipo es None si la columna no está en 'schema'.
+    """
+    schema = schema or {}
+    return [(column, tuple(column.split('.')), schema.get(column)) for column in dict.fromkeys(columns)]
+
+
+def _extract_values(events, path, cache):
+    """
+    Valor de la ruta 'path' en cada evento, o None si el evento no la tiene.
+
+    'cache' guarda los valores de cada prefijo ya recorrido en el lote, para que los campos de un mismo
+    objeto ('flow.pkts_toserver', 'flow.bytes_toserver', ...) solo busquen 'flow' una vez.
+    """
+    prefix = path[:-1]
+    if not prefix:
+        return [event.get(path[0]) for event in events]
+    if prefix not in cache:
+        parents = _extract_values(events, prefix, cache)
+        cache[prefix] = [value if isinstance(value, dict) else None for value in parents]
+    key = path[-1]
+    return [value.get(key) if value is not None else None for value in cache[prefix]]
+
+
+def _typed_column(values, dtype):
+    """
+    Construye la columna en su tipo final directamente desde los valores extraídos.
+
+    Los enteros se copian a un arreglo numpy del ancho declarado con su máscara de nulos, sin pasar por
+    float64 ni por objetos; las categorías se codifican de una vez. Lo que no encaja en estas vías rápidas
+    (texto en columnas enteras, como 'timestamp' o 'tcp.flags') se devuelve sin convertir para 'apply_schema'.
+    """
+    if dtype == 'category':
+        return pd.Categorical(values)
+    if dtype in ('int64', 'UInt8', 'UInt16', 'UInt32', 'UInt64'):
+        if None in values:
+            mask = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+            data = np.array([0 if value is None else value for value in values])
+        else:
+            mask = np.zeros(len(values), dtype=bool)
+            data = np.array(values)
+        if data.dtype.kind in 'iu':
+            numpy_dtype = np.dtype(dtype.lower())
+            limits = np.iinfo(numpy_dtype)
+            if not len(data) or (data.min() >= limits.min and data.max() <= limits.max):
+                data = data.astype(numpy_dtype, copy=False)
+                if dtype == 'int64' and not mask.any():
+                    return data
+                return pd.arrays.IntegerArray(data, mask)
+    return pd.Series(values)
+
+
+def extract_fields(events, fields, schema=EVENT_SCHEMA):
+    """
+    Alternativa a 'normalize_events' que lee de cada evento solo los campos pedidos.
+
+    No aplana el evento completo ni crea columnas que luego se descartan: cada campo se recorre una vez
+    sobre el lote y se guarda ya con su tipo de 'schema'. Como en json_normalize, los campos que no
+    aparecen en ningún evento del lote no generan columna.
+
+    Parámetros:
+    - events (list de dict): Eventos decodificados.
+    - fields (list): Columnas a extraer, o la salida de 'compile_field_paths'.
+    - schema (dict): Tipos por columna; None deja que pandas infiera el tipo.
+
+    Retorna:
+    - Un pandas.DataFrame con las columnas en el orden de 'fields'.
+    """
+    if fields and isinstance(fields[0], str):
+        fields = compile_field_paths(fields, schema)
+    data = {}
+    cache = {}
+    for column, path, dtype in fields:
+        values = _extract_values(events, path, cache)
+        if values.count(None) == len(values):
+            continue
+        data[column] = _typed_column(values, dtype if schema else None)
+    df = pd.DataFrame(data, index=pd.RangeIndex(len(events)))
+    return apply_schema(df, schema) if schema else df
+
+
+def iter_eve_batches(path, batch_size=50000, event_types=DEFAULT_EVENT_TYPES, skip_invalid=True, schema=EVENT_SCHEMA,
+                     columns=None, start=0, end=None):
+    """
+    Lee eve.json en lotes de tamaño fijo y devuelve un DataFrame normalizado por lote, con los tipos
+    compactos de 'schema' ya aplicados.
+
+    La memoria máxima depende de 'batch_size' y no del tamaño del archivo. Con 'columns' solo se extraen
+    esos campos de cada evento ('extract_fields'); sin él se aplana el evento completo con json_normalize.
+
+    Parámetros:
+    - path (str): Ruta al archivo eve.json.
+    - batch_size (int): Número máximo de eventos por lote.
+    - event_types (iterable): Tipos de evento a conservar.
+    - skip_invalid (bool): Si es True, las líneas inválidas se omiten.
+    - schema (dict): Tipos por columna (ver 'schema.EVENT_SCHEMA'); None conserva los de json_normalize.
+    - columns (list, opcional): Campos a extraer con la notación de json_normalize ('flow.pkts_toserver').
+    - start, end (int): Rango de bytes a leer (ver 'iter_eve_events').
+
+    Retorna:
+    - Un generador de pandas.DataFrame con a lo sumo 'batch_size' filas cada uno.
+    """
+    if batch_size <= 0:
+        raise ValueError("'batch_size' debe ser un entero positivo.")
+
+    if columns is None:
+        to_frame = lambda batch: normalize_events(batch, schema)
+    else:
+        # Las rutas se compilan una sola vez para todos los lotes
+        fields = compile_field_paths(columns, schema)
+        to_frame = lambda batch: extract_fields(batch, fields, schema)
+
+    batch = []
+    for event in iter_eve_events(path, event_types=event_types, skip_invalid=skip_invalid, start=start, end=end):
+        batch.append(event)
+        if len(batch) >= batch_size:
+            yield to_frame(batch)
+            batch = []
+    if batch:
+        yield to_frame(batch)
+
+
+def load_eve_events(path, batch_size=50000, event_types=DEFAULT_EVENT_TYPES, skip_invalid=True, schema=EVENT_SCHEMA,
+                    columns=None):
+    """
+    Carga en un único DataFrame todos los eventos de los tipos indicados, leyendo el archivo por lotes.
+
+    Con 'columns' solo se extraen esos campos (ver 'iter_eve_batches').
+    """
+    batches = list(iter_eve_batches(path, batch_size=batch_size, event_types=event_types,
+                                    skip_invalid=skip_invalid, schema=schema, columns=columns))
+    if not batches:
+        return pd.DataFrame()
+    df = pd.concat(batches, ignore_index=True, sort=False)
+    # Las categorías de cada lote pueden diferir y concat las devuelve como texto; se vuelven a aplicar
+    return apply_schema(df, schema) if schema else df
@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import logging
+import os
+import signal
+import time
+
+from event_cache import write_parquet
+from eve_follow import READ_CHUNK_BYTES, FollowMetrics, add_flow_table_arguments, flow_table_from_arguments
+from eve_reader import DEFAULT_EVENT_TYPES, compile_field_paths, decode_eve_lines, extract_fields, normalize_events
+from flow_state import BoundedFlowStateTable, FlowStateTable
+from processData import PIPELINE_INPUT_COLUMNS, preprocesar_datos
+from schema import EVENT_SCHEMA
+from scoring_service import ScoringClient
+
+# Longitud máxima de una línea sin salto; una más larga se registra como inválida en lugar de acumularse
+MAX_LINE_BYTES = 16 << 20
+
+
+class ConnectionMetrics:
+    """
+    Contadores de una conexión de sensor.
+
+    - blocked_s: tiempo que la conexión estuvo sin leer esperando sitio en la cola (contrapresión).
+    - backpressure_waits: veces que encontró la cola llena.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.connected = time.time()
+        self.closed = None
+        self.bytes = 0
+        self.lines = 0
+        self.oversized_lines = 0
+        self.invalid_lines = 0
+        self.batches = 0
+        self.blocked_s = 0.0
+        self.backpressure_waits = 0
+
+    def snapshot(self):
+        elapsed = (self.closed or time.time()) - self.connected
+        return {
+            'connection': self.name,
+            'open': self.closed is None,
+            'lines': self.lines,
+            'bytes': self.bytes,
+            'batches': self.batches,
+            'lines_per_s': round(self.lines / elapsed, 1) if elapsed > 0 else None,
+            'mb_per_s': round(self.bytes / 2**20 / elapsed, 3) if elapsed > 0 else None,
+            'blocked_s': round(self.blocked_s, 3),
+            'backpressure_waits': self.backpressure_waits,
+            'oversized_lines': self.oversized_lines,
+            'invalid_lines': self.invalid_lines,
+        }
+
+
+class EveReceiver:
+    """
+    Recibe la salida eve de Suricata por sockets (unix_stream o TCP) en lugar de leer eve.json de disco.
+
+    - Varias conexiones de sensores a la vez; cada una separa los eventos por saltos de línea y los agrupa
+      en lotes de hasta 'batch_size' líneas o 'max_latency' segundos, como 'eve_follow.follow_eve'.
+    - Los lotes pasan por una cola acotada de 'queue_batches' lotes a un único consumidor, que los decodifica
+      y calcula sus características con 'preprocesar_datos' en un hilo aparte, acumulando el estado de flujos
+      entre lotes como 'eve_follow.run_live'.
+    - Contrapresión: con la cola llena, la conexión deja de leer hasta que haya sitio; los datos se quedan en
+      el buffer del socket y el sensor termina bloqueado al escribir. No se descarta ningún evento (salvo
+      líneas de más de 'MAX_LINE_BYTES' y líneas inválidas, que se omiten una a una y se cuentan por
+      conexión): la memoria queda acotada por (cola + conexiones) * 'batch_size' líneas. El estado de
+      flujos se acota aparte pasando una 'flow_state.BoundedFlowStateTable' como 'state'.
+    """
+
+    def __init__(self, on_features, batch_size=5000, max_latency=1.0, queue_batches=8,
+                 event_types=DEFAULT_EVENT_TYPES, schema=EVENT_SCHEMA, columns=PIPELINE_INPUT_COLUMNS,
+                 metrics_interval=30.0, state=None):
+        self.on_features = on_features
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.event_types = event_types
+        self.schema = schema
+        # Como en la lectura de 'processData.main', solo se extraen los campos que usa el pipeline (None: todos)
+        self.fields = compile_field_paths(columns, schema) if columns is not None else None
+        self.metrics_interval = metrics_interval
+        self.queue = asyncio.Queue(maxsize=queue_batches)
+        self.state = state if state is not None else FlowStateTable()
+        self.metrics = FollowMetrics()
+        self.connections = {}
+        self.failed_lines = 0
+        self.invalid_lines = 0
+        self._sequence = itertools.count()
+        self._writers = set()
+        # Un solo hilo: los lotes se procesan en orden sobre el mismo estado de flujos
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='eve-receiver')
+
+    def _connection_name(self, writer):
+        peer = writer.get_extra_info('peername')
+        return f'{peer[0]}:{peer[1]}' if isinstance(peer, tuple) else f'unix-{next(self._sequence)}'
+
+    async def _enqueue(self, connection, lines, read_started):
+        waited = time.perf_counter()
+        if self.queue.full():
+            connection.backpressure_waits += 1
+        await self.queue.put((connection.name, lines, read_started))
+        connection.blocked_s += time.perf_counter() - waited
+        connection.batches += 1
+
+    async def handle_connection(self, reader, writer):
+        """Lee una conexión hasta su cierre, encolando sus líneas por lotes."""
+        connection = ConnectionMetrics(self._connection_name(writer))
+        self.connections[connection.name] = connection
+        self._writers.add(writer)
+        logging.info("Conexión de sensor abierta: %s.", connection.name)
+        pending = b''
+        lines = []
+        read_started = None
+        try:
+            while True:
+                timeout = None if read_started is None else max(0.0, read_started + self.max_latency - time.time())
+                try:
+                    data = await asyncio.wait_for(reader.read(READ_CHUNK_BYTES), timeout)
+                except asyncio.TimeoutError:
+                    data = None
+                if data == b'':
+                    break
+                if data:
+                    connection.bytes += len(data)
+                    parts = (pending + data).split(b'\n')
+                    pending = parts.pop()
+                    if len(pending) > MAX_LINE_BYTES:
+                        logging.warning("Línea de más de %d bytes sin salto en %s; se descarta.", MAX_LINE_BYTES, connection.name)
+                        connection.oversized_lines += 1
+                        pending = b''
+                    new = [line for line in parts if line.strip()]
+                    if new and read_started is None:
+                        read_started = time.time()
+                    lines.extend(new)
+                    connection.lines += len(new)
+
+                while len(lines) >= self.batch_size:
+                    await self._enqueue(connection, lines[:self.batch_size], read_started)
+                    lines = lines[self.batch_size:]
+                    read_started = time.time() if lines else None
+                if lines and time.time() - read_started >= self.max_latency:
+                    await self._enqueue(connection, lines, read_started)
+                    lines = []
+                    read_started = None
+        except (ConnectionError, OSError) as error:
+            logging.warning("Conexión %s interrumpida: %s", connection.name, error)
+        finally:
+            # Lo recibido antes del cierre se procesa igual, incluida una última línea sin salto
+            if pending.strip():
+                lines.append(pending)
+                connection.lines += 1
+            if lines:
+                await self._enqueue(connection, lines, read_started or time.time())
+            connection.closed = time.time()
+            self._writers.discard(writer)
+            writer.close()
+            logging.info("Conexión de sensor cerrada: %s", connection.snapshot())
+
+    def _process(self, items):
+        """Decodifica y calcula las características de uno o varios lotes encolados (en el hilo del consumidor)."""
+        read_started = min(started for _, _, started in items)
+        lines = [line for _, batch, _ in items for line in batch]
+        try:
+            # Cada lote se decodifica con el nombre de su conexión: una línea inválida se omite y se cuenta sola
+            events = []
+            invalid = collections.Counter()
+            for name, batch, _ in items:
+                events.extend(decode_eve_lines(batch, event_types=self.event_types, source=name, invalid=invalid))
+            for name, count in invalid.items():
+                self.connections[name].invalid_lines += count
+                self.invalid_lines += count
+            if not events:
+                self.metrics.record_batch(0, 0, None, read_started)
+                return
+            if self.fields is None:
+                batch = normalize_events(events, self.schema)
+            else:
+                batch = extract_fields(events, self.fields, self.schema)
+            features = preprocesar_datos(batch, estado_flujos=self.state)
+            newest = int(batch['timestamp'].max()) if 'timestamp' in batch.columns else None
+            self.on_features(features)
+            self.metrics.record_batch(len(batch), len(features), newest, read_started)
+        except Exception as error:
+            self.failed_lines += len(lines)
+            logging.error("Error al procesar un lote de %d líneas (%s): %s", len(lines),
+                          ', '.join(sorted({name for name, _, _ in items})), error)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        finished = False
+        while not finished:
+            item = await self.queue.get()
+            if item is None:
+                break
+            # Los lotes pequeños ya encolados (de varias conexiones) se procesan juntos
+            items = [item]
+            rows = len(item[1])
+            while rows < self.batch_size and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    finished = True
+                    break
+                items.append(item)
+                rows += len(item[1])
+            await loop.run_in_executor(self._executor, self._process, items)
+
+    def snapshot(self):
+        snapshot = self.metrics.snapshot()
+        snapshot.update(queued_batches=self.queue.qsize(), failed_lines=self.failed_lines, invalid_lines=self.invalid_lines,
+                        connections=[connection.snapshot() for connection in self.connections.values()])
+        snapshot.update(self.state.snapshot())
+        return snapshot
+
+    async def _log_metrics(self):
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            logging.info("Métricas del receptor: %s", self.snapshot())
+
+    async def serve(self, unix_path=None, host='127.0.0.1', port=None, stop=None):
+        """
+        Escucha en un socket unix y/o en 'host:port' hasta que se active 'stop' (asyncio.Event); al parar
+        cierra las conexiones, procesa todo lo ya recibido y retorna las métricas finales.
+        """
+        if unix_path is None and port is None:
+            raise ValueError("Se necesita un socket unix o un puerto TCP.")
+        stop = stop or asyncio.Event()
+        servers = []
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            servers.append(await asyncio.start_unix_server(self.handle_connection, unix_path))
+            logging.info("Receptor eve escuchando en el socket unix %s.", unix_path)
+        if port is not None:
+            servers.append(await asyncio.start_server(self.handle_connection, host, port))
+            logging.info("Receptor eve escuchando en %s:%d.", host, port)
+
+        consumer = asyncio.create_task(self._consume())
+        reporter = asyncio.create_task(self._log_metrics())
+        try:
+            await stop.wait()
+        finally:
+            for server in servers:
+                server.close()
+            for writer in list(self._writers):
+                writer.close()
+            for server in servers:
+                await server.wait_closed()
+            while self._writers:
+                await asyncio.sleep(0.05)
+            await self.queue.put(None)
+            await consumer
+            reporter.cancel()
+            self._executor.shutdown()
+            if isinstance(self.state, BoundedFlowStateTable):
+                self.state.flush()
+        return self.snapshot()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Recibe eventos eve de Suricata por socket y calcula características por micro-lote.")
+    parser.add_argument('--unix', default=None, help="Ruta del socket unix (salida 'unix_stream' de Suricata).")
+    parser.add_argument('--puerto', type=int, default=None, help="Puerto TCP en el que escuchar.")
+    parser.add_argument('--host', default='127.0.0.1', help="Dirección TCP en la que escuchar.")
+    parser.add_argument('--lote', type=int, default=5000, help="Eventos máximos por micro-lote.")
+    parser.add_argument('--latencia', type=float, default=1.0, help="Segundos máximos de espera de un evento.")
+    parser.add_argument('--cola', type=int, default=8, help="Lotes en cola antes de aplicar contrapresión a los sensores.")
+    parser.add_argument('--salida', default=None, help="Directorio donde guardar cada micro-lote en Parquet.")
+    parser.add_argument('--puntuar', default=None,
+                        help="Dirección del servicio de puntuación (http://host:puerto o socket unix) al que enviar cada micro-lote; "
+                             "su modelo debe estar entrenado con las columnas de 'preprocesar_datos'.")
+    parser.add_argument('--metricas', type=float, default=30.0, help="Segundos entre registros de métricas en el log.")
+    add_flow_table_arguments(parser)
+    args = parser.parse_args()
+
+    sequence = itertools.count()
+    client = ScoringClient(args.puntuar) if args.puntuar else None
+
+    def emit(features):
+        if client is not None:
+            scores = client.score(features)
+            logging.info("Micro-lote puntuado: %s", scores['label'].value_counts().to_dict())
+        if args.salida:
+            os.makedirs(args.salida, exist_ok=True)
+            write_parquet(features, os.path.join(args.salida, f'features-{int(time.time())}-{next(sequence):08d}.parquet'))
+        else:
+            logging.info("Micro-lote: %d filas de características.", len(features))
+
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        receiver = EveReceiver(emit, batch_size=args.lote, max_latency=args.latencia, queue_batches=args.cola,
+                               metrics_interval=args.metricas, state=flow_table_from_arguments(args, args.salida))
+        final = await receiver.serve(args.unix, args.host, args.puerto, stop)
+        logging.info("Métricas finales del receptor: %s", final)
+
+    asyncio.run(run())
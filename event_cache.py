@@ -0,0 +1,284 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+
+import pandas as pd
+
+from eve_reader import DEFAULT_EVENT_TYPES, iter_eve_batches
+from schema import EVENT_SCHEMA, apply_schema
+
+# Cambia si se modifica la disposición de los archivos del caché; invalida todo lo guardado antes
+CACHE_FORMAT_VERSION = 2
+
+# Campo de Suricata con el nombre del sensor ('sensor-name' en suricata.yaml)
+SENSOR_COLUMN = 'host'
+
+# Bytes finales de cada segmento cuyo hash se guarda para detectar un archivo reescrito con el mismo inodo
+BOUNDARY_BYTES = 4096
+
+
+def segment_key(path, start, end):
+    """
+    Identificador de un segmento de log: ruta absoluta, inodo y rango de bytes [start, end) del archivo.
+
+    Mientras el archivo solo crece, los rangos ya guardados conservan su clave y solo se lee la cola nueva.
+    """
+    identity = f'{CACHE_FORMAT_VERSION}|{os.path.abspath(path)}|{os.stat(path).st_ino}|{start}|{end}'
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16]
+
+
+def complete_lines_end(path, size):
+    """Posición tras el último salto de línea antes de 'size': la última línea puede estar a medio escribir."""
+    with open(path, 'rb') as file:
+        end = size
+        while end > 0:
+            chunk_start = max(0, end - 65536)
+            file.seek(chunk_start)
+            newline = file.read(end - chunk_start).rfind(b'\n')
+            if newline >= 0:
+                return chunk_start + newline + 1
+            end = chunk_start
+    return 0
+
+
+def _boundary_digest(path, end):
+    """Hash de los últimos 'BOUNDARY_BYTES' bytes antes de 'end'."""
+    with open(path, 'rb') as file:
+        start = max(0, end - BOUNDARY_BYTES)
+        file.seek(start)
+        return hashlib.sha1(file.read(end - start)).hexdigest()
+
+
+def _safe_name(value):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(value)) or 'unknown'
+
+
+def _hour_labels(timestamps_us):
+    """Etiqueta 'AAAAMMDDHH' (UTC) de cada evento; solo se formatea cada hora distinta una vez."""
+    codes, hours = pd.factorize(timestamps_us // 3_600_000_000)
+    labels = pd.to_datetime(hours * 3_600_000_000, unit='us').strftime('%Y%m%d%H').to_numpy()
+    return labels[codes]
+
+
+def write_parquet(df, path):
+    """Escribe de forma atómica; las columnas de texto con tipos mezclados se guardan como texto."""
+    temporary = path + '.tmp'
+    try:
+        df.to_parquet(temporary, index=False)
+    except (TypeError, ValueError):
+        df = df.copy()
+        for column in df.select_dtypes('object').columns:
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+        df.to_parquet(temporary, index=False)
+    os.replace(temporary, path)
+
+
+class EventCache:
+    """
+    Caché local en Parquet de eventos normalizados y de características calculadas.
+
+    Disposición en disco:
+    - events/hour=AAAAMMDDHH/sensor=NOMBRE/<segmento>-<lote>.parquet: eventos con el esquema compacto.
+    - segments/<segmento>.json: manifiesto del segmento (archivo de origen, archivos Parquet y columnas).
+    - features/<versión>/<segmento>.parquet: salida del pipeline para un segmento y una versión del código.
+
+    Un segmento es un rango de bytes de un archivo eve.json (ver 'segment_key'). Cuando el archivo crece
+    se añade un segmento con la cola nueva y los anteriores se reutilizan; si el archivo se trunca, se
+    rota o se reescribe, sus segmentos se reemplazan. El manifiesto se escribe al final, así que un
+    segmento interrumpido a medias se vuelve a procesar completo en la siguiente ejecución.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.events_dir = os.path.join(root, 'events')
+        self.segments_dir = os.path.join(root, 'segments')
+        self.features_dir = os.path.join(root, 'features')
+        for directory in (self.events_dir, self.segments_dir, self.features_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def _manifest_path(self, key):
+        return os.path.join(self.segments_dir, f'{key}.json')
+
+    def manifest(self, key):
+        """Manifiesto del segmento o None si no está en el caché."""
+        try:
+            with open(self._manifest_path(key)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def manifests(self):
+        for name in sorted(os.listdir(self.segments_dir)):
+            if name.endswith('.json'):
+                manifest = self.manifest(name[:-len('.json')])
+                if manifest is not None:
+                    yield manifest
+
+    def drop_segment(self, key):
+        """Elimina los eventos y características guardados de un segmento."""
+        manifest = self.manifest(key)
+        if manifest is None:
+            return
+        os.remove(self._manifest_path(key))
+        for entry in manifest['files']:
+            path = os.path.join(self.root, entry['path'])
+            if os.path.exists(path):
+                os.remove(path)
+        self._drop_features(key)
+
+    def _drop_features(self, key):
+        for version in os.listdir(self.features_dir):
+            path = os.path.join(self.features_dir, version, f'{key}.parquet')
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _valid_segments(self, path, source, inode, end):
+        """
+        Segmentos guardados de 'source' que siguen siendo un prefijo del archivo actual, ordenados por inicio.
+
+        Los de otro inodo (archivo rotado), los que pasan de 'end' (archivo truncado) y toda la cadena si el
+        final del último ya no coincide (archivo reescrito) se eliminan del caché.
+        """
+        segments, stale = [], []
+        for manifest in self.manifests():
+            if manifest['source'] != source:
+                continue
+            if manifest.get('inode') == inode and manifest['end'] <= end:
+                segments.append(manifest)
+            else:
+                stale.append(manifest)
+        segments.sort(key=lambda manifest: manifest['start'])
+        chained = all(previous['end'] == current['start'] for previous, current in zip(segments, segments[1:]))
+        if segments and (not chained or segments[0]['start'] != 0
+                         or _boundary_digest(path, segments[-1]['end']) != segments[-1]['boundary_sha1']):
+            stale, segments = stale + segments, []
+        if stale:
+            logging.info("Reemplazando la versión anterior de %s en el caché.", path)
+            for manifest in stale:
+                self.drop_segment(manifest['segment'])
+        return segments
+
+    def add_segment(self, path, batch_size=50000, event_types=DEFAULT_EVENT_TYPES, sensor=None):
+        """
+        Normaliza un eve.json y guarda sus eventos particionados por hora y sensor.
+
+        Solo se decodifican los bytes que aún no están en el caché: si el archivo creció desde la última
+        vez, se guarda un segmento nuevo con la cola. Si se truncó, se rotó o se reescribió, sus segmentos
+        anteriores se reemplazan. Una última línea sin salto de línea se deja para la siguiente llamada.
+
+        Parámetros:
+        - path (str): Ruta al archivo eve.json.
+        - batch_size (int): Eventos por lote de lectura (y como máximo por archivo Parquet).
+        - event_types (iterable): Tipos de evento a conservar.
+        - sensor (str): Sensor a usar cuando los eventos no traen el campo 'host'.
+
+        Retorna:
+        - Las claves de los segmentos que cubren el archivo, en orden; la última identifica el archivo
+          completo (ver 'store_features').
+        """
+        stat = os.stat(path)
+        source = os.path.abspath(path)
+        end = complete_lines_end(path, stat.st_size)
+        segments = self._valid_segments(path, source, stat.st_ino, end)
+        keys = [manifest['segment'] for manifest in segments]
+        start = segments[-1]['end'] if segments else 0
+        if segments and start == end:
+            logging.info("Segmentos de %s ya en caché (%d).", path, len(keys))
+            return keys
+        # Las características guardadas con el último segmento describen solo un prefijo del archivo
+        if keys:
+            self._drop_features(keys[-1])
+
+        key = segment_key(path, start, end)
+        files = []
+        rows = 0
+        for batch_number, batch in enumerate(iter_eve_batches(path, batch_size=batch_size, event_types=event_types,
+                                                               start=start, end=end)):
+            if SENSOR_COLUMN in batch.columns:
+                sensors = batch[SENSOR_COLUMN].astype(object).fillna(sensor or 'unknown')
+            else:
+                sensors = pd.Series(sensor or 'unknown', index=batch.index)
+            hours = _hour_labels(batch['timestamp'].to_numpy())
+
+            for (hour, sensor_name), part in batch.groupby([hours, sensors.to_numpy()], sort=True, observed=True):
+                relative = os.path.join('events', f'hour={hour}', f'sensor={_safe_name(sensor_name)}',
+                                        f'{key}-{batch_number:05d}.parquet')
+                target = os.path.join(self.root, relative)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                write_parquet(part, target)
+                files.append({'path': relative, 'hour': hour, 'sensor': str(sensor_name), 'rows': int(part.shape[0]),
+                              'columns': part.columns.tolist(), 'start': start})
+                rows += part.shape[0]
+
+        manifest = {'segment': key, 'source': source, 'inode': stat.st_ino, 'start': start, 'end': end,
+                    'boundary_sha1': _boundary_digest(path, end), 'rows': rows, 'files': files}
+        temporary = self._manifest_path(key) + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(manifest, file)
+        os.replace(temporary, self._manifest_path(key))
+        logging.info("Segmento %s guardado en caché: bytes %d-%d, %d eventos en %d archivos.",
+                     key, start, end, rows, len(files))
+        return keys + [key]
+
+    def event_files(self, segments=None, hours=None, sensors=None):
+        """Entradas de los manifiestos que cumplen los filtros de segmento, hora ('AAAAMMDDHH') y sensor."""
+        segments = set(segments) if segments is not None else None
+        hours = set(hours) if hours is not None else None
+        sensors = set(sensors) if sensors is not None else None
+        for manifest in self.manifests():
+            if segments is not None and manifest['segment'] not in segments:
+                continue
+            for entry in manifest['files']:
+                if hours is not None and entry['hour'] not in hours:
+                    continue
+                if sensors is not None and entry['sensor'] not in sensors:
+                    continue
+                yield entry
+
+    def load_events(self, columns=None, segments=None, hours=None, sensors=None, schema=EVENT_SCHEMA):
+        """
+        Lee del caché solo las columnas pedidas de las particiones que cumplen los filtros.
+
+        Parámetros:
+        - columns (list): Columnas a leer; None lee todas. Las que no existan en un archivo se omiten.
+        - segments, hours, sensors (iterable): Filtros opcionales (ver 'event_files').
+        - schema (dict): Esquema a reaplicar tras concatenar (unifica las categorías entre archivos).
+
+        Retorna:
+        - Un DataFrame con los eventos ordenados por hora de partición y, dentro de cada hora, por
+          posición en el archivo.
+        """
+        frames = []
+        entries = sorted(self.event_files(segments=segments, hours=hours, sensors=sensors),
+                         key=lambda entry: (entry['hour'], entry.get('start', 0), entry['path']))
+        for entry in entries:
+            selected = entry['columns'] if columns is None else [column for column in columns if column in entry['columns']]
+            frames.append(pd.read_parquet(os.path.join(self.root, entry['path']), columns=selected))
+        if not frames:
+            return pd.DataFrame(columns=columns) if columns is not None else pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True, sort=False)
+        return apply_schema(df, schema) if schema else df
+
+    def _features_path(self, key, version):
+        return os.path.join(self.features_dir, _safe_name(version), f'{key}.parquet')
+
+    def load_features(self, key, version):
+        """Características guardadas para el segmento y la versión del pipeline, o None si no existen."""
+        path = self._features_path(key, version)
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    def store_features(self, key, version, df):
+        """Guarda las características de un archivo bajo la clave de su último segmento ('add_segment')."""
+        path = self._features_path(key, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_parquet(df, path)
+
+    def clear(self):
+        """Elimina todo el contenido del caché."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.__init__(self.root)
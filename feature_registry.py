@@ -0,0 +1,215 @@
+import logging
+
+import pandas as pd
+
+from activity_stats import calculate_activity_stats
+from flow_aggregation import FLOW_FEATURE_COLUMNS, FLOW_TOTALS, compute_flow_features
+from flow_metrics import FLOW_METRIC_COLUMNS, calculate_all_metrics
+from instrumentation import stage
+from packet_direction import add_packet_direction
+from tcp_advanced_stats import FLAG_COLUMNS, HEADER_LENGTH_COLUMNS, calculate_flags, calculate_header_lengths
+from tcp_flags_count import TCP_FLAGS, count_tcp_flags_vectorized
+
+
+class FeatureStage:
+    """
+    Una función de características con sus columnas de entrada y de salida declaradas.
+
+    - 'func' recibe el DataFrame y devuelve el DataFrame con las columnas de 'outputs' añadidas.
+    - Con 'isolated=True' la función recibe una copia de solo sus columnas de entrada y únicamente se
+      copian de vuelta las de 'outputs': sirve para funciones que además sobrescriben o rellenan otras
+      columnas del DataFrame.
+    - Con 'stateful=True' la función recibe el estado de flujos del modo en línea como 'state'.
+    - Con 'sorts_rows=True' la función devuelve las filas ordenadas por 'flow_id' y 'timestamp' en lugar
+      de en el orden de entrada.
+    """
+
+    def __init__(self, name, func, inputs, outputs, isolated=False, stateful=False, sorts_rows=False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.isolated = isolated
+        self.stateful = stateful
+        self.sorts_rows = sorts_rows
+
+    def __repr__(self):
+        return f"FeatureStage({self.name!r})"
+
+    def run(self, df, state=None):
+        if self.isolated:
+            result = self.func(df[[column for column in self.inputs if column in df.columns]].copy())
+            for column in self.outputs:
+                df[column] = result[column].to_numpy()
+            return df
+        if self.stateful:
+            return self.func(df, state=state)
+        return self.func(df)
+
+
+class FeatureRegistry:
+    """
+    Registro de etapas de características y de la columna que produce cada una.
+
+    Cada columna tiene una sola etapa productora: registrar una segunda etapa que declare una columna ya
+    producida es un error, así no se calcula dos veces. 'resolve' obtiene, para una lista de
+    características, solo las etapas necesarias y las ordena de modo que cada una corra después de las que
+    producen sus entradas.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.producers = {}
+
+    def register(self, feature_stage):
+        duplicated = [column for column in feature_stage.outputs if column in self.producers]
+        if feature_stage.name in self.stages or duplicated:
+            raise ValueError(f"La etapa '{feature_stage.name}' repite un nombre o columnas ya registradas: {duplicated}")
+        self.stages[feature_stage.name] = feature_stage
+        for column in feature_stage.outputs:
+            self.producers[column] = feature_stage.name
+        return feature_stage
+
+    def resolve(self, features, available=()):
+        """
+        Etapas necesarias para producir 'features', en orden topológico.
+
+        Parámetros:
+        - features (iterable): Columnas pedidas.
+        - available (iterable): Columnas ya presentes en el DataFrame; las que ninguna etapa produce se
+          toman tal cual. Las pedidas que no están ni se producen se registran y se omiten.
+
+        Retorna:
+        - Una lista de 'FeatureStage'; ante empates se respeta el orden de registro.
+        """
+        available = set(available)
+        needed = set()
+        pending = list(dict.fromkeys(features))
+        unknown = []
+        while pending:
+            column = pending.pop()
+            name = self.producers.get(column)
+            if name is None:
+                if column not in available:
+                    unknown.append(column)
+                continue
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].inputs)
+        if unknown:
+            logging.info("Características sin etapa que las produzca ni presentes en los datos: %s", unknown)
+
+        # Dependencias entre las etapas necesarias; una etapa puede leer y reescribir la misma columna
+        dependencies = {
+            name: {self.producers[column] for column in self.stages[name].inputs
+                   if column in self.producers and self.producers[column] != name}
+            for name in needed
+        }
+        ordered = []
+        done = set()
+        while len(ordered) < len(needed):
+            ready = [name for name in self.stages if name in needed and name not in done and dependencies[name] <= done]
+            if not ready:
+                raise ValueError(f"Dependencia circular entre las etapas: {sorted(needed - done)}")
+            ordered.append(self.stages[ready[0]])
+            done.add(ready[0])
+        return ordered
+
+    def run(self, df, stages, state=None):
+        """Ejecuta 'stages' (la salida de 'resolve') en orden, registrando cada una en la instrumentación activa."""
+        for feature_stage in stages:
+            logging.debug("Etapa de características: %s", feature_stage.name)
+            with stage(feature_stage.name, df) as recorder:
+                df = feature_stage.run(df, state=state)
+                recorder.set_output(df)
+        return df
+
+    def compute(self, df, features, state=None):
+        """
+        Ejecuta sobre 'df' solo las etapas que necesitan 'features'.
+
+        Retorna:
+        - El DataFrame con las columnas de todas las etapas ejecutadas (las pedidas y las intermedias).
+        """
+        return self.run(df, self.resolve(features, df.columns), state=state)
+
+
+def _count_tcp_flags(df):
+    # Los lotes sin eventos TCP no traen 'tcp.flags'; sin ella todas las banderas cuentan 0
+    df['tcp.flags'] = df.get('tcp.flags', pd.Series([None] * df.shape[0]))
+    return count_tcp_flags_vectorized(df)
+
+
+def _flow_features(df, state=None):
+    return compute_flow_features(df, state=state)
+
+
+FEATURE_REGISTRY = FeatureRegistry()
+
+FEATURE_REGISTRY.register(FeatureStage(
+    'banderas_tcp', _count_tcp_flags,
+    inputs=['tcp.flags'],
+    outputs=['tcp.flags'] + [f'tcp_flag_{flag}_count' for flag in TCP_FLAGS]))
+
+FEATURE_REGISTRY.register(FeatureStage(
+    'direccion_paquetes', add_packet_direction,
+    inputs=['dest_port'],
+    outputs=['direction']))
+
+# Única pasada por flujo: IAT, totales, longitudes (también las '*_packet_length_stats'), tasas y actividad
+FEATURE_REGISTRY.register(FeatureStage(
+    'estadisticas_flujo', _flow_features,
+    inputs=['flow_id', 'timestamp', 'direction'] + list(FLOW_TOTALS.values()),
+    outputs=FLOW_FEATURE_COLUMNS,
+    stateful=True,
+    sorts_rows=True))
+
+FEATURE_REGISTRY.register(FeatureStage(
+    'cabeceras', calculate_header_lengths,
+    inputs=['total_fwd_packets', 'total_bwd_packets'],
+    outputs=HEADER_LENGTH_COLUMNS))
+
+FEATURE_REGISTRY.register(FeatureStage(
+    'banderas_direccion', calculate_flags,
+    inputs=['tcp.flags'],
+    outputs=FLAG_COLUMNS))
+
+FEATURE_REGISTRY.register(FeatureStage(
+    'metricas_flujo', calculate_all_metrics,
+    inputs=['total_fwd_packets', 'total_bwd_packets', 'total_bytes_toserver', 'total_bytes_toclient',
+            'flow.bytes_toserver', 'flow.bytes_toclient', 'flow_duration', 'tcp_flag_PSH_count', 'min_packet_length'],
+    outputs=FLOW_METRIC_COLUMNS))
+
+# Las 'active_*' de 'calculate_activity_stats' son aproximaciones por IAT y ya las calcula
+# 'estadisticas_flujo' a partir de las pausas reales; de esta función solo se toman las 'idle_*'
+FEATURE_REGISTRY.register(FeatureStage(
+    'actividad', calculate_activity_stats,
+    inputs=['flow_iat_mean', 'flow_iat_std', 'flow_iat_max', 'flow_iat_min'],
+    outputs=['idle_mean', 'idle_std', 'idle_max', 'idle_min'],
+    isolated=True))
+
+
+def produced_columns(stages):
+    """Columnas que declaran como salida las etapas indicadas, sin repetir."""
+    return list(dict.fromkeys(column for feature_stage in stages for column in feature_stage.outputs))
+
+
+def sorts_rows(stages):
+    """True si alguna de las etapas reordena las filas por flujo (ver 'FeatureStage')."""
+    return any(feature_stage.sorts_rows for feature_stage in stages)
+
+
+def compute_features(df, features, state=None, registry=FEATURE_REGISTRY):
+    """
+    Calcula sobre 'df' las características pedidas ejecutando solo las etapas que necesitan.
+
+    Parámetros:
+    - df (pandas.DataFrame): Eventos con el esquema de 'schema.EVENT_SCHEMA'.
+    - features (iterable): Columnas de salida deseadas.
+    - state (flow_state.FlowStateTable, opcional): Estado acumulado del modo en línea.
+    - registry (FeatureRegistry): Registro de etapas a usar.
+
+    Retorna:
+    - El DataFrame con las columnas calculadas.
+    """
+    return registry.compute(df, features, state=state)
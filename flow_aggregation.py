@@ -0,0 +1,236 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from kernels import as_float_array, safe_divide
+from schema import to_epoch_us
+
+# Totales por flujo y la columna de Suricata de la que se obtienen
+FLOW_TOTALS = {
+    'total_fwd_packets': 'flow.pkts_toserver',
+    'total_bwd_packets': 'flow.pkts_toclient',
+    'total_bytes_toserver': 'flow.bytes_toserver',
+    'total_bytes_toclient': 'flow.bytes_toclient',
+}
+
+DIRECTIONS = ('forward', 'backward')
+
+# Columnas que añade 'compute_flow_features' con las direcciones por defecto, en el orden en que se añaden
+FLOW_FEATURE_COLUMNS = (
+    ['total_bytes', 'total_packets', 'packet_length',
+     'flow_iat_mean', 'flow_iat_std', 'flow_iat_max', 'flow_iat_min', 'flow_duration']
+    + list(FLOW_TOTALS)
+    + ['mean_packet_length', 'max_packet_length', 'min_packet_length', 'std_packet_length', 'var_packet_length']
+    + [f'{stat}_packet_length_stats' for stat in ('mean', 'max', 'min', 'std', 'var')]
+    + ['fwd_packets_s', 'bwd_packets_s', 'active_mean', 'active_std', 'active_max', 'active_min', 'idle_total']
+    + [f'{stat}_length_{value}' for value in DIRECTIONS for stat in ('total', 'max', 'min', 'mean', 'std')]
+)
+
+
+def timestamps_to_ns(timestamps):
+    """
+    Convierte una serie de marcas de tiempo (texto, datetime o microsegundos del esquema) a enteros en
+    nanosegundos desde epoch.
+    """
+    return to_epoch_us(timestamps).to_numpy(dtype='int64') * 1000
+
+
+class FlowIndex:
+    """
+    Factoriza 'flow_id' una sola vez y ordena las filas por (flujo, timestamp).
+
+    Los valores que reciben los métodos de reducción deben estar ya en el orden de 'order'; así cada
+    flujo ocupa un bloque contiguo y todas las reducciones se resuelven con 'reduceat' sin agrupar de nuevo.
+    """
+
+    def __init__(self, flow_ids, timestamps_ns):
+        codes, flow_ids = pd.factorize(flow_ids, sort=True)
+        self.flow_ids = np.asarray(flow_ids)
+        self.order = np.lexsort((timestamps_ns, codes))
+        sorted_codes = codes[self.order]
+        boundaries = np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1
+        self.starts = np.concatenate(([0], boundaries)).astype(np.intp)
+        self.counts = np.diff(np.append(self.starts, len(sorted_codes)))
+        self.n_flows = len(self.starts)
+        self.n_rows = len(sorted_codes)
+
+    def broadcast(self, flow_values):
+        """Replica un valor por flujo en todas las filas de ese flujo."""
+        return np.repeat(flow_values, self.counts)
+
+    def first_mask(self):
+        """Máscara booleana de la primera fila de cada flujo."""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.starts] = True
+        return mask
+
+    def diff(self, values):
+        """Diferencia entre filas consecutivas del mismo flujo; NaN en la primera fila de cada flujo."""
+        values = np.asarray(values)
+        result = np.empty(len(values), dtype='float64')
+        result[0] = np.nan
+        # Se resta en el tipo original: marcas en ns como float64 perderían precisión (~256 ns)
+        result[1:] = values[1:] - values[:-1]
+        result[self.starts] = np.nan
+        return result
+
+    def count(self, values):
+        """Número de valores no nulos por flujo."""
+        return np.add.reduceat((~np.isnan(values)).astype('int64'), self.starts)
+
+    def sum(self, values):
+        """Suma por flujo ignorando NaN (0 si el flujo no tiene valores)."""
+        return np.add.reduceat(np.nan_to_num(values, nan=0.0), self.starts)
+
+    def min(self, values):
+        """Mínimo por flujo ignorando NaN."""
+        return np.fmin.reduceat(values, self.starts)
+
+    def max(self, values):
+        """Máximo por flujo ignorando NaN."""
+        return np.fmax.reduceat(values, self.starts)
+
+    def mean_std(self, values, ddof=1):
+        """
+        Media y desviación estándar por flujo ignorando NaN, con el mismo criterio que pandas (ddof=1).
+        """
+        values = np.asarray(values, dtype='float64')
+        counts = self.count(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum(values) / counts
+            deviations = values - self.broadcast(mean)
+            m2 = self.sum(deviations * deviations)
+            std = np.sqrt(m2 / (counts - ddof))
+        std[counts <= ddof] = np.nan
+        return mean, std
+
+    def moments(self, values):
+        """
+        Momentos por flujo (conteo, suma, media, M2, mínimo, máximo) ignorando NaN, en el formato que
+        combinan los acumuladores de 'flow_state'.
+        """
+        values = np.asarray(values, dtype='float64')
+        counts = self.count(values)
+        totals = self.sum(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(counts > 0, totals / counts, 0.0)
+        deviations = np.nan_to_num(values - self.broadcast(mean), nan=0.0)
+        m2 = self.sum(deviations * deviations)
+        return counts, totals, mean, m2, self.min(values), self.max(values)
+
+
+def compute_flow_features(df, idle_threshold=5, directions=DIRECTIONS, state=None):
+    """
+    Calcula en una sola pasada todas las estadísticas por flujo que antes requerían un groupby y un merge
+    por etapa: IAT, duración y totales, longitud de paquete, tasas, tiempos activos/inactivos y
+    estadísticas por dirección.
+
+    Parámetros:
+    - df (pandas.DataFrame): Eventos con 'flow_id', 'timestamp', los contadores 'flow.*' y 'direction'.
+    - idle_threshold (int): Segundos a partir de los cuales una pausa se considera inactividad.
+    - directions (tuple): Valores de 'direction' para los que se calculan estadísticas.
+    - state (flow_state.FlowStateTable, opcional): Estado acumulado de lotes anteriores. Si se indica, se
+      actualiza con 'df' y las columnas por flujo reflejan todos los eventos vistos de cada flujo, no solo
+      los del lote (modo en línea).
+
+    Retorna:
+    - Un DataFrame con una fila por evento, ordenado por (flow_id, timestamp), con 'timestamp' en segundos
+      UNIX (int64) y las columnas de características añadidas.
+    """
+    required_columns = ['flow_id', 'timestamp', 'direction'] + list(FLOW_TOTALS.values())
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Faltan columnas requeridas para calcular las estadísticas de flujo: {missing_columns}")
+
+    missing_flow_id = df['flow_id'].isna()
+    if missing_flow_id.any():
+        logging.warning("Se descartan %d eventos sin 'flow_id'.", int(missing_flow_id.sum()))
+        df = df[~missing_flow_id]
+
+    if df.empty:
+        return df.reset_index(drop=True)
+
+    if state is not None:
+        state.update(df)
+
+    timestamps_ns = timestamps_to_ns(df['timestamp'])
+    index = FlowIndex(df['flow_id'], timestamps_ns)
+
+    # Única reordenación del DataFrame; todo lo demás trabaja sobre arreglos ya ordenados
+    df = df.take(index.order).reset_index(drop=True)
+    timestamps_ns = timestamps_ns[index.order]
+    timestamps_s = timestamps_ns // 10**9
+    df['timestamp'] = timestamps_s
+
+    flow = {}
+    row = {}
+
+    # IAT en segundos con resolución completa; la primera fila de cada flujo cuenta como 0
+    iat = index.diff(timestamps_ns) / 1e9
+    iat[index.starts] = 0.0
+    flow['flow_iat_mean'], flow['flow_iat_std'] = index.mean_std(iat)
+    flow['flow_iat_max'] = index.max(iat)
+    flow['flow_iat_min'] = index.min(iat)
+
+    # Duración y totales del flujo
+    flow['flow_duration'] = (timestamps_s[np.append(index.starts[1:], index.n_rows) - 1] - timestamps_s[index.starts])
+    for total_column, source_column in FLOW_TOTALS.items():
+        flow[total_column] = index.sum(as_float_array(df[source_column]))
+
+    # Longitud de paquete estimada por evento a partir de los totales del flujo
+    total_bytes = as_float_array(df['flow.bytes_toserver']) + as_float_array(df['flow.bytes_toclient'])
+    total_packets = index.broadcast(flow['total_fwd_packets'] + flow['total_bwd_packets'])
+    packet_length = safe_divide(total_bytes, total_packets)
+    row['total_bytes'] = total_bytes
+    row['total_packets'] = total_packets
+    row['packet_length'] = packet_length
+
+    mean_length, std_length = index.mean_std(packet_length)
+    flow['mean_packet_length'] = mean_length
+    flow['max_packet_length'] = index.max(packet_length)
+    flow['min_packet_length'] = index.min(packet_length)
+    flow['std_packet_length'] = std_length
+    flow['var_packet_length'] = std_length ** 2
+    for stat in ('mean', 'max', 'min', 'std', 'var'):
+        flow[f'{stat}_packet_length_stats'] = np.nan_to_num(flow[f'{stat}_packet_length'], nan=0.0)
+
+    # Tasas de paquetes por segundo
+    duration = flow['flow_duration']
+    flow['fwd_packets_s'] = safe_divide(flow['total_fwd_packets'], duration)
+    flow['bwd_packets_s'] = safe_divide(flow['total_bwd_packets'], duration)
+
+    # Tiempos activos e inactivos sobre marcas de tiempo en segundos enteros
+    time_diff = index.diff(timestamps_s)
+    with np.errstate(invalid='ignore'):
+        is_idle = time_diff > idle_threshold
+    active_time = np.where(is_idle, 0.0, time_diff)
+    flow['active_mean'], flow['active_std'] = index.mean_std(active_time)
+    flow['active_max'] = index.max(active_time)
+    flow['active_min'] = index.min(active_time)
+    flow['idle_total'] = index.sum(np.where(is_idle, time_diff, 0.0))
+
+    # Estadísticas de longitud de paquete por dirección
+    for value in directions:
+        in_direction = (df['direction'] == value).to_numpy()
+        directional_length = np.where(in_direction, packet_length, np.nan)
+        directional_mean, directional_std = index.mean_std(directional_length)
+        flow[f'total_length_{value}'] = index.sum(directional_length)
+        flow[f'max_length_{value}'] = index.max(directional_length)
+        flow[f'min_length_{value}'] = index.min(directional_length)
+        flow[f'mean_length_{value}'] = directional_mean
+        flow[f'std_length_{value}'] = np.nan_to_num(directional_std, nan=0.0)
+
+    if state is not None:
+        # Las columnas por flujo y la longitud de paquete de cada evento usan los totales acumulados
+        current = state.to_frame(index.flow_ids.tolist())
+        flow = {column: current[column].to_numpy() for column in flow}
+        row['total_packets'] = index.broadcast(flow['total_fwd_packets'] + flow['total_bwd_packets'])
+        row['packet_length'] = safe_divide(total_bytes, row['total_packets'])
+
+    features = {column: values for column, values in row.items()}
+    features.update({column: index.broadcast(values) for column, values in flow.items()})
+
+    # Se adjuntan todas las columnas de una vez en lugar de un merge por etapa
+    df = df.drop(columns=[col for col in features if col in df.columns])
+    return pd.concat([df, pd.DataFrame(features, index=df.index)], axis=1)
@@ -2,6 +2,16 @@
 
 import pandas as pd
 
+from schema import sanitize_columns
+
+# Columnas nuevas de cada cálculo; 'calculate_all_metrics' limpia NaN e infinitos solo sobre ellas
+RATIO_COLUMNS = ['down_up_ratio', 'average_packet_size', 'fwd_segment_size_avg', 'bwd_segment_size_avg']
+BULK_COLUMNS = ['fwd_bytes_bulk_avg', 'bwd_bytes_bulk_avg', 'fwd_packet_bulk_avg', 'bwd_packet_bulk_avg',
+                'fwd_bulk_rate_avg', 'bwd_bulk_rate_avg', 'subflow_fwd_packets', 'subflow_fwd_bytes',
+                'subflow_bwd_packets', 'subflow_bwd_bytes', 'fwd_init_win_bytes', 'bwd_init_win_bytes',
+                'fwd_act_data_pkts', 'fwd_seg_size_min']
+FLOW_METRIC_COLUMNS = RATIO_COLUMNS + BULK_COLUMNS
+
 def calculate_down_up_ratio(df):
     df['down_up_ratio'] = df['total_bwd_packets'] / df['total_fwd_packets']
     return df
@@ -60,8 +70,7 @@ def calculate_bulk_stats(df):
     # Calcular el tamaño mínimo del segmento en envío como el tamaño mínimo del paquete en flujos con datos enviados
     df['fwd_seg_size_min'] = df['min_packet_length'] * (df['total_fwd_packets'] > 0)
 
-    # Llenar los valores faltantes con 0 para mantener la consistencia
-    df.fillna(0, inplace=True)
+    # Los valores faltantes de 'BULK_COLUMNS' (flujos que no son 'bulk') los rellena con 0 quien llama
 
     return df
 
@@ -74,6 +83,8 @@ def calculate_all_metrics(df):
     # Incluir llamadas a otras funciones de cálculo aquí
     df = calculate_bulk_stats(df)
     # Agregar más llamadas según sea necesario
+    # Una sola limpieza de NaN e infinitos, solo sobre las columnas nuevas
+    sanitize_columns(df, FLOW_METRIC_COLUMNS)
     return df
 
 # Ejemplo de cómo se utilizaría este módulo
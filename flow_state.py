@@ -0,0 +1,710 @@
+import bisect
+import collections
+import heapq
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from flow_aggregation import DIRECTIONS, FLOW_TOTALS, FlowIndex, timestamps_to_ns
+from kernels import as_float_array
+from packet_direction import add_packet_direction
+from tcp_flags_count import TCP_FLAGS, convert_tcp_flags_to_numeric
+
+# Marcas de tiempo más recientes que conserva cada flujo para colocar los eventos que llegan desordenados
+REORDER_BUFFER = 64
+
+
+class RunningStats:
+    """
+    Acumulador en línea de conteo, suma, mínimo, máximo, media y M2 (algoritmo de Welford).
+
+    Dos acumuladores se combinan con la fórmula de Chan, de modo que lotes parciales pueden
+    procesarse por separado y fusionarse después sin volver a recorrer los datos.
+    """
+
+    __slots__ = ('count', 'total', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.nan
+        self.max = math.nan
+
+    def update(self, value):
+        """Agrega un valor; los NaN se ignoran como en las agregaciones de pandas."""
+        if value != value:
+            return
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min != self.min else min(self.min, value)
+        self.max = value if self.max != self.max else max(self.max, value)
+
+    def merge_moments(self, count, total, mean, m2, minimum, maximum):
+        """Combina los momentos de otro conjunto de valores disjunto."""
+        if count == 0:
+            return
+        if self.count == 0:
+            self.count, self.total, self.mean, self.m2 = int(count), float(total), float(mean), float(m2)
+            self.min, self.max = float(minimum), float(maximum)
+            return
+        combined = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / combined
+        self.m2 += m2 + delta * delta * self.count * count / combined
+        self.count = int(combined)
+        self.total += total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def merge(self, other):
+        self.merge_moments(other.count, other.total, other.mean, other.m2, other.min, other.max)
+
+    def copy(self):
+        clone = RunningStats()
+        clone.merge(self)
+        return clone
+
+    def variance(self, ddof=1):
+        if self.count <= ddof:
+            return math.nan
+        return max(self.m2, 0.0) / (self.count - ddof)
+
+    def std(self, ddof=1):
+        return math.sqrt(self.variance(ddof))
+
+
+def _add_gap(iat, active, gap_ns, previous_ts, current_ts, idle_threshold):
+    """Agrega un intervalo entre eventos a los acumuladores de IAT y tiempo activo; retorna sus segundos inactivos."""
+    iat.update(gap_ns / 1e9)
+    time_diff = current_ts // 10**9 - previous_ts // 10**9
+    if time_diff > idle_threshold:
+        active.update(0.0)
+        return time_diff
+    active.update(float(time_diff))
+    return 0
+
+
+class FlowState:
+    """
+    Estado compacto de un flujo: marcas de tiempo extremas, acumuladores de IAT, tiempos activos,
+    bytes por evento (global y por dirección), totales de paquetes/bytes y contadores de banderas TCP.
+
+    Los IAT y tiempos activos solo acumulan los intervalos reales entre eventos; el 0 que las funciones
+    por lotes asignan al primer evento de cada flujo se agrega al emitir las características.
+
+    Suricata escribe el evento 'flow' al terminar el flujo pero con la marca de su inicio, y eve_receiver
+    mezcla lotes de varios sensores, así que en vivo los eventos de un flujo llegan desordenados. Por eso
+    se guardan, ordenadas, solo las últimas 'REORDER_BUFFER' marcas del flujo ('timestamps'): un evento
+    desordenado se coloca en ese buffer en O(REORDER_BUFFER), y los intervalos de las marcas que salen de
+    él se acumulan en 'iat', 'active' e 'idle_total' hasta 'settled_ts', la última marca fuera del buffer.
+
+    El resultado es exacto salvo para un evento que llegue detrás de más de 'REORDER_BUFFER' eventos
+    posteriores de su flujo sin ser anterior a todo el flujo: se coloca como si llegara justo después de
+    'settled_ts' (sus intervalos son aproximados; los totales y contadores siguen siendo exactos). Esos
+    eventos se cuentan en 'late_events': un flujo con 'late_events' en 0 tiene las mismas columnas que
+    'compute_flow_features' sobre todos sus eventos.
+    """
+
+    __slots__ = ('first_ts', 'last_ts', 'events', 'timestamps', 'settled_ts', 'iat', 'active', 'idle_total',
+                 'totals', 'event_bytes', 'direction_bytes', 'direction_events', 'flag_counts', 'late_events')
+
+    def __init__(self, directions=DIRECTIONS):
+        self.first_ts = None
+        self.last_ts = None
+        self.events = 0
+        self.timestamps = []
+        self.settled_ts = None
+        self.iat = RunningStats()
+        self.active = RunningStats()
+        self.idle_total = 0.0
+        self.totals = dict.fromkeys(FLOW_TOTALS, 0.0)
+        self.event_bytes = RunningStats()
+        self.direction_bytes = {direction: RunningStats() for direction in directions}
+        self.direction_events = dict.fromkeys(directions, 0)
+        self.flag_counts = dict.fromkeys(TCP_FLAGS, 0)
+        self.late_events = 0
+
+    def _settle_gap(self, previous_ts, current_ts, idle_threshold):
+        self.idle_total += _add_gap(self.iat, self.active, current_ts - previous_ts, previous_ts, current_ts, idle_threshold)
+
+    def _place(self, timestamps, idle_threshold):
+        """
+        Coloca en la secuencia del flujo marcas ordenadas que no llegan después de todas las anteriores.
+
+        Las anteriores a todo el flujo se anteponen con sus intervalos; las que caen entre marcas que ya
+        salieron del buffer, justo después de la última de ellas (se cuentan en 'late_events'); el resto se
+        intercala en el buffer.
+        """
+        if self.settled_ts is not None:
+            before = bisect.bisect_left(timestamps, self.first_ts)
+            if before:
+                # Anteriores a todo el flujo (el evento 'flow' con la marca de inicio): solo añaden intervalos al principio
+                for previous_ts, current_ts in zip(timestamps[:before], timestamps[1:before] + [self.first_ts]):
+                    self._settle_gap(previous_ts, current_ts, idle_threshold)
+                self.first_ts = timestamps[0]
+            inside = bisect.bisect_left(timestamps, self.settled_ts, before)
+            self.late_events += inside - before
+            timestamps = [self.settled_ts] * (inside - before) + list(timestamps[inside:])
+        self.timestamps = list(heapq.merge(self.timestamps, timestamps))
+        if self.timestamps:
+            self.first_ts = self.timestamps[0] if self.first_ts is None else min(self.first_ts, self.timestamps[0])
+            self.last_ts = self.timestamps[-1] if self.last_ts is None else max(self.last_ts, self.timestamps[-1])
+
+    def _trim(self, idle_threshold):
+        """Saca del buffer las marcas más antiguas que sobran y acumula sus intervalos."""
+        excess = len(self.timestamps) - REORDER_BUFFER
+        if excess <= 0:
+            return
+        for timestamp_ns in self.timestamps[:excess]:
+            if self.settled_ts is not None:
+                self._settle_gap(self.settled_ts, timestamp_ns, idle_threshold)
+            self.settled_ts = timestamp_ns
+        del self.timestamps[:excess]
+
+    def timing(self, idle_threshold=5):
+        """
+        IAT, tiempos activos y segundos inactivos de todo el flujo: los acumulados más los intervalos del buffer.
+
+        Retorna:
+        - Una tupla (RunningStats de IAT, RunningStats de tiempos activos, segundos inactivos).
+        """
+        iat, active, idle_total = self.iat.copy(), self.active.copy(), self.idle_total
+        previous_ts = self.settled_ts
+        for timestamp_ns in self.timestamps:
+            if previous_ts is not None:
+                idle_total += _add_gap(iat, active, timestamp_ns - previous_ts, previous_ts, timestamp_ns, idle_threshold)
+            previous_ts = timestamp_ns
+        return iat, active, idle_total
+
+    def update(self, timestamp_ns, counters, direction, flags=0, idle_threshold=5):
+        """
+        Agrega un evento. Cuesta tiempo constante si llega en orden de timestamp; un evento desordenado se
+        coloca en el buffer de marcas recientes en O(REORDER_BUFFER).
+
+        Parámetros:
+        - timestamp_ns (int): Marca de tiempo del evento en nanosegundos desde epoch.
+        - counters (dict): Valores de 'flow.pkts_toserver', 'flow.pkts_toclient', 'flow.bytes_toserver'
+          y 'flow.bytes_toclient' del evento (NaN o ausentes si el evento no los trae).
+        - direction (str): Dirección del evento ('forward' o 'backward').
+        - flags (int): Banderas TCP del evento como entero.
+        - idle_threshold (int): Segundos a partir de los cuales una pausa se considera inactividad.
+        """
+        if self.first_ts is None or timestamp_ns >= self.last_ts:
+            self.timestamps.append(timestamp_ns)
+            self.first_ts = timestamp_ns if self.first_ts is None else self.first_ts
+            self.last_ts = timestamp_ns
+        else:
+            self._place([timestamp_ns], idle_threshold)
+        self._trim(idle_threshold)
+        self.events += 1
+
+        for total_column, source_column in FLOW_TOTALS.items():
+            value = counters.get(source_column, math.nan)
+            if value == value:
+                self.totals[total_column] += value
+
+        event_bytes = counters.get('flow.bytes_toserver', math.nan) + counters.get('flow.bytes_toclient', math.nan)
+        self.event_bytes.update(event_bytes)
+        if direction in self.direction_bytes:
+            self.direction_bytes[direction].update(event_bytes)
+            self.direction_events[direction] += 1
+
+        for flag, mask in TCP_FLAGS.items():
+            if flags & mask:
+                self.flag_counts[flag] += 1
+
+    def merge(self, other, idle_threshold=5):
+        """
+        Combina el estado de otro lote parcial del mismo flujo.
+
+        Si los lotes no se solapan en el tiempo (lotes sucesivos) el intervalo entre el último evento del
+        lote anterior y el primero del siguiente se agrega como un IAT más. Si se solapan, las marcas del
+        otro estado se colocan en la secuencia como en 'update' ('FlowStateTable.partial_states' conserva
+        todas las de un lote que se solapa con su flujo); si el otro ya había sacado marcas de su buffer,
+        sus intervalos acumulados se suman tal cual y solo se colocan las de su buffer (aproximado: esos
+        eventos se cuentan en 'late_events').
+        """
+        if other.events == 0:
+            return
+        if self.events == 0:
+            for slot in self.__slots__:
+                value = getattr(other, slot)
+                if isinstance(value, RunningStats):
+                    value = value.copy()
+                elif isinstance(value, dict):
+                    value = {key: item.copy() if isinstance(item, RunningStats) else item for key, item in value.items()}
+                elif isinstance(value, list):
+                    value = list(value)
+                setattr(self, slot, value)
+            self._trim(idle_threshold)
+            return
+
+        earlier, later = (self, other) if self.first_ts <= other.first_ts else (other, self)
+        if later.first_ts >= earlier.last_ts:
+            if later.settled_ts is None:
+                # Todo el posterior cabe en el buffer: se concatena y lo que sobre sale del buffer
+                iat, active, idle_total = earlier.iat.copy(), earlier.active.copy(), earlier.idle_total
+                settled_ts = earlier.settled_ts
+                timestamps = earlier.timestamps + later.timestamps
+            else:
+                iat, active, idle_total = earlier.timing(idle_threshold)
+                idle_total += _add_gap(iat, active, later.first_ts - earlier.last_ts, earlier.last_ts,
+                                       later.first_ts, idle_threshold)
+                iat.merge(later.iat)
+                active.merge(later.active)
+                idle_total += later.idle_total
+                settled_ts = later.settled_ts
+                timestamps = list(later.timestamps)
+            self.iat, self.active, self.idle_total = iat, active, idle_total
+            self.settled_ts, self.timestamps = settled_ts, timestamps
+        else:
+            incoming = other.timestamps
+            settled = 0
+            if other.settled_ts is not None:
+                settled = other.events - len(other.timestamps)
+                self.iat.merge(other.iat)
+                self.active.merge(other.active)
+                self.idle_total += other.idle_total
+                incoming = [other.settled_ts] + incoming
+            late_events = self.late_events
+            self._place(incoming, idle_threshold)
+            if settled:
+                # '_place' ya contó 'settled_ts' (la menor de las marcas) si cayó entre marcas acumuladas
+                self.late_events += settled - (self.late_events > late_events)
+        self._trim(idle_threshold)
+        self.first_ts = min(self.first_ts, other.first_ts)
+        self.last_ts = max(self.last_ts, other.last_ts)
+        self.events += other.events
+        self.late_events += other.late_events
+        for column, value in other.totals.items():
+            self.totals[column] += value
+        self.event_bytes.merge(other.event_bytes)
+        for direction, stats in other.direction_bytes.items():
+            self.direction_bytes.setdefault(direction, RunningStats()).merge(stats)
+            self.direction_events[direction] = self.direction_events.get(direction, 0) + other.direction_events[direction]
+        for flag, count in other.flag_counts.items():
+            self.flag_counts[flag] += count
+
+    def _length_stats(self, stats, events, total_packets):
+        """Estadísticas de longitud de paquete: bytes por evento divididos por los paquetes del flujo."""
+        if total_packets > 0:
+            scale = 1.0 / total_packets
+            if stats.count == 0:
+                return 0.0, math.nan, math.nan, math.nan, math.nan
+            return stats.total * scale, stats.mean * scale, stats.min * scale, stats.max * scale, stats.std() * scale
+        # Sin paquetes, las funciones por lotes asignan longitud 0 a todos los eventos del flujo
+        if events == 0:
+            return 0.0, math.nan, math.nan, math.nan, math.nan
+        return 0.0, 0.0, 0.0, 0.0, (0.0 if events > 1 else math.nan)
+
+    def to_features(self, idle_threshold=5):
+        """
+        Devuelve un diccionario con las mismas columnas por flujo que 'compute_flow_features', más los
+        contadores de banderas TCP del flujo ('tcp_flag_*_count').
+        """
+        features = {}
+
+        iat, active, idle_total = self.timing(idle_threshold)
+        iat.update(0.0)
+        features['flow_iat_mean'] = iat.mean
+        features['flow_iat_std'] = iat.std()
+        features['flow_iat_max'] = iat.max
+        features['flow_iat_min'] = iat.min
+
+        duration = self.last_ts // 10**9 - self.first_ts // 10**9
+        features['flow_duration'] = duration
+        features.update(self.totals)
+
+        total_packets = self.totals['total_fwd_packets'] + self.totals['total_bwd_packets']
+        _, mean, minimum, maximum, std = self._length_stats(self.event_bytes, self.events, total_packets)
+        features['mean_packet_length'] = mean
+        features['max_packet_length'] = maximum
+        features['min_packet_length'] = minimum
+        features['std_packet_length'] = std
+        features['var_packet_length'] = std ** 2
+        for stat in ('mean', 'max', 'min', 'std', 'var'):
+            value = features[f'{stat}_packet_length']
+            features[f'{stat}_packet_length_stats'] = 0.0 if value != value else value
+
+        features['fwd_packets_s'] = self.totals['total_fwd_packets'] / duration if duration > 0 else 0.0
+        features['bwd_packets_s'] = self.totals['total_bwd_packets'] / duration if duration > 0 else 0.0
+
+        features['active_mean'] = active.mean if active.count else math.nan
+        features['active_std'] = active.std()
+        features['active_max'] = active.max
+        features['active_min'] = active.min
+        features['idle_total'] = idle_total
+
+        for direction, stats in self.direction_bytes.items():
+            total, mean, minimum, maximum, std = self._length_stats(stats, self.direction_events[direction], total_packets)
+            features[f'total_length_{direction}'] = total
+            features[f'max_length_{direction}'] = maximum
+            features[f'min_length_{direction}'] = minimum
+            features[f'mean_length_{direction}'] = mean
+            features[f'std_length_{direction}'] = 0.0 if std != std else std
+
+        for flag, count in self.flag_counts.items():
+            features[f'tcp_flag_{flag}_count'] = count
+        return features
+
+
+def _tcp_flags_array(df):
+    if 'tcp.flags' not in df.columns:
+        return np.zeros(len(df), dtype='int64')
+    flags = df['tcp.flags']
+    if not pd.api.types.is_numeric_dtype(flags):
+        flags = convert_tcp_flags_to_numeric(df[['tcp.flags']].copy())['tcp.flags']
+    return flags.to_numpy(dtype='int64', na_value=0)
+
+
+def _direction_array(df):
+    if 'direction' not in df.columns:
+        df = add_packet_direction(df[['dest_port']].copy())
+    return df['direction'].to_numpy(dtype=object)
+
+
+class FlowStateTable:
+    """
+    Estado en línea de todos los flujos vistos, indexado por 'flow_id'.
+
+    Cada lote nuevo cuesta proporcional a su tamaño: se reduce con 'FlowIndex' a un estado parcial por
+    flujo y se combina con el estado acumulado, sin recalcular el historial.
+
+    'late_events' cuenta los eventos colocados fuera del buffer de reordenación (ver 'FlowState') y
+    'approximate_flows' los flujos con alguno; sus filas no coinciden exactamente con las de
+    'compute_flow_features'.
+    """
+
+    def __init__(self, idle_threshold=5, directions=DIRECTIONS):
+        self.idle_threshold = idle_threshold
+        self.directions = tuple(directions)
+        self.flows = {}
+        self.late_events = 0
+        self.approximate_flows = 0
+
+    def __len__(self):
+        return len(self.flows)
+
+    def __contains__(self, flow_id):
+        return flow_id in self.flows
+
+    def get(self, flow_id):
+        return self.flows.get(flow_id)
+
+    def _count_late(self, previous, state):
+        """Suma a los contadores de la tabla los eventos aproximados que 'state' tiene desde 'previous'."""
+        if state.late_events > previous:
+            self.late_events += state.late_events - previous
+            if previous == 0:
+                self.approximate_flows += 1
+
+    def update_event(self, flow_id, timestamp_ns, counters, direction, flags=0):
+        """Agrega un único evento en tiempo constante."""
+        state = self.flows.get(flow_id)
+        if state is None:
+            state = self.flows[flow_id] = FlowState(self.directions)
+        previous = state.late_events
+        state.update(timestamp_ns, counters, direction, flags, self.idle_threshold)
+        self._count_late(previous, state)
+        return state
+
+    def partial_states(self, df):
+        """
+        Reduce un lote de eventos a un 'FlowState' parcial por flujo de forma vectorizada.
+
+        Cada estado parcial deja en su buffer las últimas 'REORDER_BUFFER' marcas del flujo, salvo si el lote
+        se solapa en el tiempo con el estado acumulado del flujo: entonces conserva todas para que 'merge'
+        las coloque de forma exacta.
+
+        Retorna:
+        - Un diccionario {flow_id: FlowState}.
+        """
+        required_columns = ['flow_id', 'timestamp'] + list(FLOW_TOTALS.values())
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Faltan columnas requeridas para actualizar el estado de flujos: {missing_columns}")
+
+        df = df[df['flow_id'].notna()]
+        if df.empty:
+            return {}
+
+        timestamps_ns = timestamps_to_ns(df['timestamp'])
+        index = FlowIndex(df['flow_id'], timestamps_ns)
+        order = index.order
+        timestamps_ns = timestamps_ns[order]
+        timestamps_s = timestamps_ns // 10**9
+
+        # Solo se acumulan los intervalos anteriores a las últimas 'REORDER_BUFFER' marcas de cada flujo,
+        # que quedan en su buffer
+        ranks = np.arange(index.n_rows) - index.broadcast(index.starts)
+        settled = ranks < index.broadcast(index.counts) - REORDER_BUFFER
+        iat = index.moments(np.where(settled, index.diff(timestamps_ns) / 1e9, np.nan))
+        time_diff = np.where(settled, index.diff(timestamps_s), np.nan)
+        with np.errstate(invalid='ignore'):
+            is_idle = time_diff > self.idle_threshold
+        active = index.moments(np.where(is_idle, 0.0, time_diff))
+        idle_total = index.sum(np.where(is_idle, time_diff, 0.0))
+
+        columns = {column: as_float_array(df[column])[order]
+                   for column in FLOW_TOTALS.values()}
+        totals = {total_column: index.sum(columns[source_column]) for total_column, source_column in FLOW_TOTALS.items()}
+        event_bytes = columns['flow.bytes_toserver'] + columns['flow.bytes_toclient']
+        bytes_moments = index.moments(event_bytes)
+
+        direction = _direction_array(df)[order]
+        direction_moments = {}
+        direction_events = {}
+        for value in self.directions:
+            in_direction = direction == value
+            direction_moments[value] = index.moments(np.where(in_direction, event_bytes, np.nan))
+            direction_events[value] = index.sum(in_direction.astype('float64'))
+
+        flags = _tcp_flags_array(df)[order]
+        flag_counts = {flag: index.sum(((flags & mask) > 0).astype('float64')) for flag, mask in TCP_FLAGS.items()}
+
+        last_rows = np.append(index.starts[1:], index.n_rows) - 1
+        first_ts = timestamps_ns[index.starts].tolist()
+        last_ts = timestamps_ns[last_rows].tolist()
+        flow_timestamps = np.split(timestamps_ns, index.starts[1:])
+
+        states = {}
+        for i, flow_id in enumerate(index.flow_ids.tolist()):
+            state = FlowState(self.directions)
+            state.first_ts = first_ts[i]
+            state.last_ts = last_ts[i]
+            state.events = int(index.counts[i])
+            current = self.flows.get(flow_id)
+            if (len(flow_timestamps[i]) > REORDER_BUFFER and current is not None and current.events
+                    and first_ts[i] < current.last_ts and last_ts[i] > current.first_ts):
+                # Lote solapado con el estado del flujo: sin intervalos acumulados, con todas sus marcas
+                state.timestamps = flow_timestamps[i].tolist()
+            else:
+                state.timestamps = flow_timestamps[i][-REORDER_BUFFER:].tolist()
+                if len(flow_timestamps[i]) > REORDER_BUFFER:
+                    state.settled_ts = int(flow_timestamps[i][-REORDER_BUFFER - 1])
+                state.iat.merge_moments(*(moment[i] for moment in iat))
+                state.active.merge_moments(*(moment[i] for moment in active))
+                state.idle_total = float(idle_total[i])
+            state.totals = {column: float(values[i]) for column, values in totals.items()}
+            state.event_bytes.merge_moments(*(moment[i] for moment in bytes_moments))
+            for value in self.directions:
+                state.direction_bytes[value].merge_moments(*(moment[i] for moment in direction_moments[value]))
+                state.direction_events[value] = int(direction_events[value][i])
+            state.flag_counts = {flag: int(counts[i]) for flag, counts in flag_counts.items()}
+            states[flow_id] = state
+        return states
+
+    def update(self, df):
+        """
+        Incorpora un lote de eventos al estado acumulado.
+
+        Retorna:
+        - La lista de 'flow_id' actualizados en este lote.
+        """
+        partial = self.partial_states(df)
+        for flow_id, state in partial.items():
+            current = self.flows.get(flow_id)
+            if current is None:
+                self.flows[flow_id] = state
+            else:
+                previous = current.late_events
+                current.merge(state, self.idle_threshold)
+                self._count_late(previous, current)
+        return list(partial)
+
+    def merge(self, other):
+        """Combina otra tabla de estados construida sobre un lote parcial distinto."""
+        for flow_id, state in other.flows.items():
+            current = self.flows.get(flow_id)
+            if current is None:
+                current = self.flows[flow_id] = FlowState(self.directions)
+            previous = current.late_events
+            current.merge(state, self.idle_threshold)
+            self._count_late(previous, current)
+        return self
+
+    def to_frame(self, flow_ids=None):
+        """
+        Emite las características actuales, una fila por flujo.
+
+        Parámetros:
+        - flow_ids (iterable, opcional): Flujos a emitir; por defecto todos.
+        """
+        if flow_ids is None:
+            flow_ids = sorted(self.flows)
+        rows = []
+        for flow_id in flow_ids:
+            features = self.flows[flow_id].to_features(self.idle_threshold)
+            features['flow_id'] = flow_id
+            rows.append(features)
+        if not rows:
+            return pd.DataFrame(columns=['flow_id'])
+        frame = pd.DataFrame(rows)
+        return frame[['flow_id'] + [col for col in frame.columns if col != 'flow_id']]
+
+    def snapshot(self):
+        """Contadores de la tabla para las métricas del modo en vivo."""
+        return {
+            'flows': len(self.flows),
+            'late_events': self.late_events,
+            'approximate_flows': self.approximate_flows,
+        }
+
+
+# Memoria estimada de un 'FlowState' (medida con tracemalloc) y de cada marca de tiempo que guarda
+FLOW_STATE_BYTES = 1800
+TIMESTAMP_BYTES = 40
+
+
+class BoundedFlowStateTable(FlowStateTable):
+    """
+    'FlowStateTable' con memoria acotada para modos de larga duración (eve_follow, eve_receiver).
+
+    - Inactividad: un flujo sin eventos nuevos durante 'idle_timeout' segundos de tiempo de evento (respecto
+      a la marca más reciente vista) se expulsa.
+    - Capacidad: si hay más de 'max_flows' flujos, o la memoria estimada supera 'max_bytes', se expulsan
+      los de actualización más antigua (LRU).
+    - Cada flujo expulsado se entrega antes de borrarse a 'on_evict(filas, motivo)': sus características
+      finales ('to_frame', una fila por flujo) y 'idle', 'capacity' o 'flush'.
+
+    La expulsión se hace al final de cada 'update' y nunca afecta a los flujos de ese mismo lote, que
+    'compute_flow_features' emite justo después. Si vuelve a llegar un evento de un flujo expulsado, empieza
+    un estado nuevo.
+    """
+
+    def __init__(self, idle_threshold=5, directions=DIRECTIONS, idle_timeout=120.0, max_flows=None,
+                 max_bytes=None, on_evict=None):
+        super().__init__(idle_threshold, directions)
+        self.flows = collections.OrderedDict()
+        self.idle_timeout_ns = None if idle_timeout is None else int(idle_timeout * 1e9)
+        self.max_flows = max_flows
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.newest_ts = None
+        self.memory_bytes = 0
+        self.peak_memory_bytes = 0
+        self.peak_flows = 0
+        self.evictions = collections.Counter()
+        self._sizes = {}
+        # Montículo perezoso de (última marca, flow_id): las entradas viejas se descartan al sacarlas
+        self._expiry = []
+
+    @staticmethod
+    def _estimate(state):
+        return FLOW_STATE_BYTES + TIMESTAMP_BYTES * len(state.timestamps)
+
+    def _touch(self, flow_ids):
+        for flow_id in flow_ids:
+            state = self.flows[flow_id]
+            self.flows.move_to_end(flow_id)
+            size = self._estimate(state)
+            self.memory_bytes += size - self._sizes.get(flow_id, 0)
+            self._sizes[flow_id] = size
+            if self.newest_ts is None or state.last_ts > self.newest_ts:
+                self.newest_ts = state.last_ts
+            if self.idle_timeout_ns is not None:
+                heapq.heappush(self._expiry, (state.last_ts, flow_id))
+        # El montículo acumula una entrada por actualización; se compacta si crece demasiado
+        if len(self._expiry) > 4 * len(self.flows) + 1024:
+            self._expiry = [(state.last_ts, flow_id) for flow_id, state in self.flows.items()]
+            heapq.heapify(self._expiry)
+        self.peak_flows = max(self.peak_flows, len(self.flows))
+        self.peak_memory_bytes = max(self.peak_memory_bytes, self.memory_bytes)
+
+    def update_event(self, flow_id, timestamp_ns, counters, direction, flags=0):
+        state = super().update_event(flow_id, timestamp_ns, counters, direction, flags)
+        self._touch([flow_id])
+        self.evict(protected={flow_id})
+        return state
+
+    def update(self, df):
+        updated = super().update(df)
+        self._touch(updated)
+        self.evict(protected=set(updated))
+        return updated
+
+    def merge(self, other):
+        super().merge(other)
+        self._touch(list(other.flows))
+        self.evict(protected=set(other.flows))
+        return self
+
+    def _emit(self, flow_ids, reason):
+        if not flow_ids:
+            return
+        if self.on_evict is not None:
+            self.on_evict(self.to_frame(flow_ids), reason)
+        for flow_id in flow_ids:
+            del self.flows[flow_id]
+            self.memory_bytes -= self._sizes.pop(flow_id)
+        self.evictions[reason] += len(flow_ids)
+
+    def evict(self, protected=()):
+        """
+        Expulsa los flujos inactivos y, después, los menos recientes mientras se supere la capacidad.
+
+        Parámetros:
+        - protected (set): Flujos que no se expulsan en esta llamada (los del lote en curso).
+
+        Retorna:
+        - El número de flujos expulsados.
+        """
+        evicted = {}
+        if self.idle_timeout_ns is not None and self.newest_ts is not None:
+            cutoff = self.newest_ts - self.idle_timeout_ns
+            kept = []
+            while self._expiry and self._expiry[0][0] < cutoff:
+                last_ts, flow_id = heapq.heappop(self._expiry)
+                state = self.flows.get(flow_id)
+                # Entrada vieja: el flujo se actualizó después o ya se expulsó
+                if state is None or state.last_ts != last_ts or flow_id in evicted:
+                    continue
+                if flow_id in protected:
+                    kept.append((last_ts, flow_id))
+                else:
+                    evicted[flow_id] = None
+            for entry in kept:
+                heapq.heappush(self._expiry, entry)
+        self._emit(list(evicted), 'idle')
+
+        overflow = []
+        excess_flows = len(self.flows) - self.max_flows if self.max_flows is not None else 0
+        excess_bytes = self.memory_bytes - self.max_bytes if self.max_bytes is not None else 0
+        if excess_flows > 0 or excess_bytes > 0:
+            for flow_id in self.flows:
+                if excess_flows <= 0 and excess_bytes <= 0:
+                    break
+                if flow_id in protected:
+                    continue
+                overflow.append(flow_id)
+                excess_flows -= 1
+                excess_bytes -= self._sizes[flow_id]
+            if excess_flows > 0 or excess_bytes > 0:
+                logging.info("El lote en curso tiene más flujos de los que admite la tabla (%d en memoria).",
+                             len(self.flows) - len(overflow))
+        self._emit(overflow, 'capacity')
+        return len(evicted) + len(overflow)
+
+    def flush(self):
+        """Expulsa y emite todos los flujos (fin del modo en vivo)."""
+        self._emit(list(self.flows), 'flush')
+        self._expiry = []
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot.update({
+            'peak_flows': self.peak_flows,
+            'flow_memory_mb': round(self.memory_bytes / 2**20, 3),
+            'peak_flow_memory_mb': round(self.peak_memory_bytes / 2**20, 3),
+            'evicted_idle': self.evictions['idle'],
+            'evicted_capacity': self.evictions['capacity'],
+            'evicted_flush': self.evictions['flush'],
+        })
+        return snapshot
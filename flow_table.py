@@ -0,0 +1,181 @@
+"""
+Tabla con una fila por flujo construida por lotes a partir de eve.json.
+
+Por ahora solo la usan la línea de comandos de este módulo y la etapa 'ingest_flow_table' de
+'benchmark_pipeline'. El pipeline principal ('processData.preprocesar_datos') y la entrada del modelo
+siguen trabajando con una fila por evento; esta tabla todavía no los alimenta.
+"""
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+from event_cache import write_parquet
+from eve_reader import DEFAULT_EVENT_TYPES, iter_eve_batches
+from kernels import as_float_array
+from schema import EVENT_SCHEMA, apply_schema, memory_usage_mb, to_epoch_us
+
+# Prefijos de los campos de aplicación; no se copian a la tabla de flujos, se resumen en agregados
+APP_LAYER_PREFIXES = ('http.', 'dns.', 'tls.')
+
+# Marcas de tiempo del registro 'flow' que se guardan como µs desde epoch en lugar de texto
+FLOW_TIME_COLUMNS = ['flow.start', 'flow.end']
+
+
+def _column(df, name):
+    return df[name] if name in df.columns else pd.Series(np.nan, index=df.index)
+
+
+def _has_value(df, name):
+    return _column(df, name).notna().to_numpy()
+
+
+# Agregados por flujo de los eventos de aplicación: columna -> (event_type, peso de cada evento, tipo).
+# Todos son sumas, así que los resultados parciales de cada lote se combinan sumando.
+APP_AGGREGATES = {
+    'http_requests': ('http', lambda df: np.ones(len(df)), 'uint32'),
+    'http_error_responses': ('http', lambda df: np.nan_to_num(as_float_array(_column(df, 'http.status'))) >= 400, 'uint32'),
+    'http_response_bytes': ('http', lambda df: np.nan_to_num(as_float_array(_column(df, 'http.length'))), 'uint64'),
+    'dns_queries': ('dns', lambda df: (_column(df, 'dns.type') == 'query').to_numpy(), 'uint32'),
+    'dns_answers': ('dns', lambda df: (_column(df, 'dns.type') == 'answer').to_numpy(), 'uint32'),
+    'tls_handshakes': ('tls', lambda df: np.ones(len(df)), 'uint32'),
+    'tls_sni_present': ('tls', lambda df: _has_value(df, 'tls.sni'), 'bool'),
+}
+
+
+def app_layer_aggregates(df):
+    """
+    Resume los eventos de aplicación de un lote en una fila por 'flow_id' con las columnas de 'APP_AGGREGATES'.
+
+    Retorna:
+    - Un DataFrame float64 indexado por 'flow_id' (sin los tipos finales, para poder sumar lotes).
+    """
+    df = df[df['flow_id'].notna()]
+    codes, flow_ids = pd.factorize(df['flow_id'])
+    event_type = df['event_type'].to_numpy(dtype=object)
+    aggregates = {}
+    for column, (source_type, weight, _) in APP_AGGREGATES.items():
+        in_type = event_type == source_type
+        values = np.where(in_type, np.asarray(weight(df), dtype='float64'), 0.0) if in_type.any() else 0.0
+        aggregates[column] = np.bincount(codes, weights=np.broadcast_to(values, codes.shape), minlength=len(flow_ids))
+    return pd.DataFrame(aggregates, index=pd.Index(flow_ids, name='flow_id'))
+
+
+class FlowTableBuilder:
+    """
+    Construye una tabla con exactamente una fila por 'flow_id' a partir de lotes de eventos.
+
+    - Las filas salen de los eventos 'flow', sin los campos http/dns/tls (vacíos en esos eventos).
+    - Los eventos http/dns/tls no se guardan: cada lote se reduce a agregados por flujo ('APP_AGGREGATES')
+      que se suman entre lotes, porque Suricata escribe el evento 'flow' al terminar el flujo, después de
+      los de aplicación.
+    - Al terminar, los agregados se unen a la tabla buscando cada 'flow_id' en un índice hash, sin merge.
+
+    La memoria depende del número de flujos y del tamaño de lote, no del número de eventos.
+    """
+
+    def __init__(self, schema=EVENT_SCHEMA):
+        self.schema = schema
+        self._flows = []
+        self._aggregates = []
+        self.events = 0
+
+    def update(self, df):
+        """Incorpora un lote de eventos normalizados (por ejemplo, de 'eve_reader.iter_eve_batches')."""
+        if df.empty or 'event_type' not in df.columns:
+            return
+        self.events += len(df)
+        is_flow = (df['event_type'] == 'flow').to_numpy()
+        if is_flow.any():
+            columns = [column for column in df.columns
+                       if column != 'event_type' and not column.startswith(APP_LAYER_PREFIXES)]
+            flows = df.loc[is_flow, columns]
+            for column in FLOW_TIME_COLUMNS:
+                if column in flows.columns and not pd.api.types.is_integer_dtype(flows[column]):
+                    flows[column] = to_epoch_us(flows[column])
+            self._flows.append(flows)
+        if not is_flow.all() and 'flow_id' in df.columns:
+            self._aggregates.append(app_layer_aggregates(df[~is_flow]))
+
+    def finish(self):
+        """
+        Retorna:
+        - La tabla de flujos ordenada por 'flow_id', con los agregados de aplicación (0 si el flujo no tuvo
+          eventos de ese tipo).
+        """
+        if not self._flows:
+            return pd.DataFrame(columns=['flow_id'] + list(APP_AGGREGATES))
+        flows = pd.concat(self._flows, ignore_index=True, sort=False)
+        self._flows = []
+        # Las categorías de cada lote pueden diferir y concat las devuelve como texto; se vuelven a aplicar
+        if self.schema:
+            flows = apply_schema(flows, self.schema)
+        flows = flows[flows['flow_id'].notna()]
+        duplicated = flows['flow_id'].duplicated(keep='last')
+        if duplicated.any():
+            logging.warning("%d flujos con más de un evento 'flow'; se conserva el último.", int(duplicated.sum()))
+            flows = flows[~duplicated]
+        flows = flows.sort_values('flow_id', kind='stable').reset_index(drop=True)
+
+        if self._aggregates:
+            aggregates = pd.concat(self._aggregates)
+            aggregates = aggregates.groupby(level=0, sort=False).sum()
+        else:
+            aggregates = pd.DataFrame(columns=list(APP_AGGREGATES), index=pd.Index([], name='flow_id'), dtype='float64')
+        self._aggregates = []
+
+        # Unión por índice hash: posición de cada flujo de la tabla entre los flujos con agregados
+        positions = aggregates.index.get_indexer(flows['flow_id'])
+        known = positions >= 0
+        orphans = len(aggregates) - int(known.sum())
+        if orphans:
+            logging.info("%d flujos con eventos de aplicación pero sin evento 'flow' quedan fuera de la tabla.", orphans)
+        for column, (_, _, dtype) in APP_AGGREGATES.items():
+            values = np.zeros(len(flows), dtype='float64')
+            values[known] = aggregates[column].to_numpy()[positions[known]]
+            flows[column] = values > 0 if dtype == 'bool' else values.astype(dtype)
+        return flows
+
+
+def build_flow_table(path, batch_size=50000, event_types=DEFAULT_EVENT_TYPES, schema=EVENT_SCHEMA):
+    """
+    Lee eve.json por lotes y construye la tabla de una fila por flujo sin cargar todos los eventos.
+
+    Parámetros:
+    - path (str): Ruta al archivo eve.json.
+    - batch_size (int): Eventos por lote de lectura.
+    - event_types (iterable): Tipos de evento a leer; 'flow' es obligatorio.
+    - schema (dict): Tipos compactos aplicados a cada lote.
+
+    Retorna:
+    - Un DataFrame con una fila por 'flow_id' (ver 'FlowTableBuilder').
+    """
+    builder = FlowTableBuilder(schema)
+    for batch in iter_eve_batches(path, batch_size=batch_size, event_types=event_types, schema=schema):
+        builder.update(batch)
+    return builder.finish()
+
+
+def flow_table_from_events(df, schema=EVENT_SCHEMA):
+    """Construye la tabla de flujos a partir de un DataFrame de eventos ya cargado."""
+    builder = FlowTableBuilder(schema)
+    builder.update(df)
+    return builder.finish()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Construye una tabla con una fila por flujo a partir de eve.json.")
+    parser.add_argument('eve', help="Ruta del eve.json.")
+    parser.add_argument('--lote', type=int, default=50000, help="Eventos por lote de lectura.")
+    parser.add_argument('--salida', default=None, help="Archivo Parquet donde guardar la tabla.")
+    args = parser.parse_args()
+
+    table = build_flow_table(args.eve, batch_size=args.lote)
+    logging.info("Tabla de flujos: %d filas, %.1f MB en memoria.", len(table), memory_usage_mb(table))
+    if args.salida:
+        write_parquet(table, args.salida)
+    else:
+        print(table.head())
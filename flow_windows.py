@@ -0,0 +1,161 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from processData import preprocesar_datos
+from schema import to_epoch_us
+
+# Columnas que se añaden a las características de cada ventana (µs desde epoch, como 'timestamp' en el esquema de eventos)
+WINDOW_COLUMNS = ['window_start', 'window_end']
+
+
+def assign_windows(timestamps_us, size_us, slide_us):
+    """
+    Asigna cada evento a las ventanas de tiempo de evento que lo contienen.
+
+    Las ventanas son [inicio, inicio + size) con inicios múltiplos de 'slide' desde epoch. Con
+    'slide_us == size_us' (ventanas fijas) cada evento cae en una sola ventana; con 'slide_us < size_us'
+    (deslizantes) en hasta ceil(size / slide).
+
+    Retorna:
+    - Una tupla (posiciones de fila, inicio de la ventana en µs), con una entrada por par evento-ventana.
+    """
+    timestamps_us = np.asarray(timestamps_us, dtype='int64')
+    per_event = -(-size_us // slide_us)
+    last_start = timestamps_us - timestamps_us % slide_us
+    starts = last_start[:, None] - slide_us * np.arange(per_event, dtype='int64')[None, :]
+    covers = starts + size_us > timestamps_us[:, None]
+    rows = np.broadcast_to(np.arange(len(timestamps_us))[:, None], starts.shape)
+    return rows[covers], starts[covers]
+
+
+class WindowedFlowAggregator:
+    """
+    Características por flujo en ventanas de tiempo de evento (fijas o deslizantes) con marcas de agua.
+
+    Cada ventana abierta guarda solo sus propios eventos. La marca de agua es el mayor 'timestamp' visto
+    menos 'allowed_lateness': una ventana se cierra cuando la marca de agua alcanza su final, y a partir de
+    ahí los eventos que solo pertenecen a ventanas cerradas se descartan como tardíos. Así la memoria
+    depende de las ventanas abiertas, no de todo el historial.
+
+    Al cerrarse, cada ventana produce exactamente lo que 'preprocesar_datos' produciría sobre sus eventos
+    (mismas columnas, una fila por evento), más 'window_start' y 'window_end'. Las ventanas que se cierran
+    juntas se calculan en una sola llamada, con una clave temporal por (ventana, flujo).
+
+    Suricata escribe el evento 'flow' al terminar el flujo pero con la marca de su inicio: 'allowed_lateness'
+    debe cubrir el retraso habitual entre ambos (del orden del 'flow-timeout' del sensor) si no se quieren
+    perder esos eventos.
+    """
+
+    def __init__(self, size, slide=None, allowed_lateness=0.0):
+        """
+        Parámetros:
+        - size (float): Duración de cada ventana en segundos.
+        - slide (float, opcional): Separación entre inicios de ventana en segundos; por defecto igual a
+          'size' (ventanas fijas).
+        - allowed_lateness (float): Segundos que la marca de agua va por detrás del evento más reciente.
+        """
+        self.size_us = int(round(size * 1e6))
+        self.slide_us = int(round((slide or size) * 1e6))
+        if self.size_us <= 0 or self.slide_us <= 0:
+            raise ValueError("La duración y la separación de las ventanas deben ser positivas.")
+        self.lateness_us = int(round(allowed_lateness * 1e6))
+        self.windows = {}
+        self.max_event_us = None
+        self.late_events = 0
+        self.emitted_windows = 0
+
+    def __len__(self):
+        return len(self.windows)
+
+    @property
+    def watermark_us(self):
+        return None if self.max_event_us is None else self.max_event_us - self.lateness_us
+
+    @property
+    def buffered_events(self):
+        """Eventos retenidos en todas las ventanas abiertas."""
+        return sum(len(part) for parts in self.windows.values() for part in parts)
+
+    def update(self, df):
+        """
+        Incorpora un lote de eventos, avanza la marca de agua y emite las ventanas que se cierran.
+
+        Parámetros:
+        - df (pandas.DataFrame): Eventos con el esquema de 'schema.EVENT_SCHEMA'.
+
+        Retorna:
+        - Las características de las ventanas cerradas (ver la descripción de la clase), ordenadas por
+          ventana, flujo y timestamp, o None si no se cerró ninguna ventana.
+        """
+        if 'flow_id' in df.columns:
+            df = df[df['flow_id'].notna()]
+        if not df.empty:
+            timestamps_us = to_epoch_us(df['timestamp']).to_numpy(dtype='int64')
+            rows, starts = assign_windows(timestamps_us, self.size_us, self.slide_us)
+
+            watermark = self.watermark_us
+            if watermark is not None:
+                on_time = starts + self.size_us > watermark
+                late = len(timestamps_us) - len(np.unique(rows[on_time]))
+                if late:
+                    self.late_events += late
+                    logging.debug("Se descartan %d eventos que solo pertenecen a ventanas cerradas.", late)
+                rows, starts = rows[on_time], starts[on_time]
+
+            if len(rows):
+                order = np.argsort(starts, kind='stable')
+                rows, starts = rows[order], starts[order]
+                boundaries = np.flatnonzero(np.diff(starts)) + 1
+                for window_rows, start in zip(np.split(rows, boundaries), starts[np.append(0, boundaries)].tolist()):
+                    self.windows.setdefault(start, []).append(df.take(window_rows))
+
+            newest = int(timestamps_us.max())
+            self.max_event_us = newest if self.max_event_us is None else max(self.max_event_us, newest)
+
+        return self._close(self.watermark_us)
+
+    def flush(self):
+        """Cierra y emite todas las ventanas abiertas (fin del flujo de eventos); None si no hay ninguna."""
+        return self._close(None)
+
+    def _close(self, watermark):
+        closing = sorted(start for start in self.windows
+                         if watermark is None or start + self.size_us <= watermark)
+        if not closing:
+            return None
+
+        parts = []
+        part_starts = []
+        for start in closing:
+            for part in self.windows.pop(start):
+                parts.append(part)
+                part_starts.append(np.full(len(part), start, dtype='int64'))
+        events = pd.concat(parts, ignore_index=True)
+        del parts
+
+        # Las etapas por flujo de 'preprocesar_datos' agrupan por 'flow_id': una clave por (ventana, flujo)
+        # separa el mismo flujo en ventanas distintas y ordena la salida por ventana y flujo
+        flow_codes, flow_ids = pd.factorize(events['flow_id'], sort=True)
+        window_codes = np.searchsorted(closing, np.concatenate(part_starts))
+        events['flow_id'] = window_codes * len(flow_ids) + flow_codes
+        features = preprocesar_datos(events)
+
+        window_codes, flow_codes = np.divmod(features['flow_id'].to_numpy(), len(flow_ids))
+        window_start = np.asarray(closing, dtype='int64')[window_codes]
+        features['flow_id'] = np.asarray(flow_ids)[flow_codes]
+        features['window_start'] = window_start
+        features['window_end'] = window_start + self.size_us
+        self.emitted_windows += len(closing)
+        return features
+
+    def snapshot(self):
+        """Estado del agregador para las métricas del modo en vivo."""
+        return {
+            'open_windows': len(self.windows),
+            'buffered_events': self.buffered_events,
+            'emitted_windows': self.emitted_windows,
+            'late_events': self.late_events,
+            'watermark_us': self.watermark_us,
+        }
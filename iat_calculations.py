@@ -17,7 +17,10 @@ def calculate_iat_statistics(df):
             raise ValueError("El DataFrame debe contener las columnas 'flow_id' y 'timestamp'.")
 
         # Intenta convertir 'timestamp' al formato datetime si no está ya en ese formato
-        if not np.issubdtype(df['timestamp'].dtype, np.datetime64):
+        if pd.api.types.is_integer_dtype(df['timestamp']):
+            # Marcas de tiempo del esquema compacto: microsegundos desde epoch
+            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='us', utc=True)
+        elif not np.issubdtype(df['timestamp'].dtype, np.datetime64):
             try:
                 df['timestamp'] = pd.to_datetime(df['timestamp'])
             except ValueError as e:
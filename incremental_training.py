@@ -0,0 +1,261 @@
+import argparse
+import logging
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import StandardScaler
+
+from training_cache import ensure_training_cache
+
+# Filas por fragmento leído del caché: acota la memoria del entrenamiento, no el tamaño del corpus
+DEFAULT_CHUNK_ROWS = 50000
+
+
+def iter_chunks(cache, columns, chunk_rows=DEFAULT_CHUNK_ROWS, start=0, stop=None):
+    """
+    Recorre las filas del caché por fragmentos sin cargarlo entero.
+
+    Retorna:
+    - Un generador de tuplas (X float32 de 'columns', códigos de etiqueta del caché).
+    """
+    features = cache.features()
+    positions = [cache.numeric_columns.index(column) for column in columns]
+    labels = cache.labels()
+    stop = len(cache) if stop is None else min(stop, len(cache))
+    for begin in range(start, stop, chunk_rows):
+        end = min(begin + chunk_rows, stop)
+        yield np.ascontiguousarray(features[begin:end, positions]), np.asarray(labels[begin:end])
+
+
+def fit_scaler(cache, columns, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Medias y escalas de 'columns' con una pasada por fragmentos ('StandardScaler.partial_fit' ignora los NaN)."""
+    scaler = StandardScaler()
+    for X, _ in iter_chunks(cache, columns, chunk_rows):
+        scaler.partial_fit(X)
+    return scaler
+
+
+class WindowedForest:
+    """
+    Bosque que crece por ventanas de datos: cada llamada a 'partial_fit' entrena 'trees_per_window' árboles
+    nuevos solo con esa ventana (en todos los núcleos, 'n_jobs=-1') y los añade a los anteriores.
+
+    Equivale a 'RandomForestClassifier(warm_start=True)' subiendo 'n_estimators' en cada ventana, salvo en
+    que una ventana puede no traer todas las clases: con 'warm_start' scikit-learn recalcula 'classes_' con
+    cada ventana y los árboles anteriores quedan desalineados. Aquí cada ventana es un sub-bosque y
+    'predict_proba' promedia todos los árboles sobre las clases globales.
+
+    Con 'max_windows' se descartan los sub-bosques más antiguos (memoria acotada y olvido de datos viejos).
+    """
+
+    def __init__(self, trees_per_window=20, max_windows=None, n_jobs=-1, random_state=42, **forest_params):
+        self.trees_per_window = trees_per_window
+        self.max_windows = max_windows
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.forest_params = forest_params
+        self.forests = []
+        self.classes_ = None
+
+    @property
+    def n_estimators(self):
+        return sum(len(forest.estimators_) for forest in self.forests)
+
+    def partial_fit(self, X, y, classes=None):
+        if classes is not None:
+            self.classes_ = np.asarray(classes)
+        forest = RandomForestClassifier(n_estimators=self.trees_per_window, n_jobs=self.n_jobs,
+                                        random_state=None if self.random_state is None else self.random_state + len(self.forests),
+                                        **self.forest_params)
+        forest.fit(X, y)
+        self.forests.append(forest)
+        if self.max_windows is not None and len(self.forests) > self.max_windows:
+            self.forests = self.forests[-self.max_windows:]
+        return self
+
+    def predict_proba(self, X):
+        probabilities = np.zeros((X.shape[0], len(self.classes_)), dtype='float64')
+        positions = pd.Index(self.classes_)
+        for forest in self.forests:
+            # Promedio de árboles: cada sub-bosque pesa según su número de árboles
+            probabilities[:, positions.get_indexer(forest.classes_)] += forest.predict_proba(X) * len(forest.estimators_)
+        return probabilities / self.n_estimators
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class IncrementalModel:
+    """
+    Modelo entrenable por fragmentos: imputación (y escalado opcional) fijados con el primer corpus más un
+    estimador con 'partial_fit' ('WindowedForest', 'SGDClassifier', 'GaussianNB'...).
+
+    Las características llegan al estimador en float32. 'classes_' son posiciones en 'labels', los
+    nombres originales de la etiqueta; reentrenar con un CSV nuevo traduce sus etiquetas por nombre.
+    Expone 'feature_names_in_', 'classes_' y 'predict_proba' como un pipeline de scikit-learn, así que
+    'scoring_service' lo sirve igual que el modelo de prototype.pyw.
+    """
+
+    def __init__(self, estimator, feature_names, labels, means, scales=None):
+        self.estimator = estimator
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.labels = list(labels)
+        self.means = np.asarray(means, dtype='float32')
+        self.scales = None if scales is None else np.asarray(scales, dtype='float32')
+        self.rows_seen = 0
+
+    @property
+    def classes_(self):
+        return np.arange(len(self.labels))
+
+    def _prepare(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X.reindex(columns=self.feature_names_in_).to_numpy(dtype='float32', na_value=np.nan)
+        X = np.array(X, dtype='float32')
+        # Como en el caché de entrenamiento, los infinitos cuentan como valores ausentes
+        missing = ~np.isfinite(X)
+        if missing.any():
+            X[missing] = np.broadcast_to(self.means, X.shape)[missing]
+        if self.scales is not None:
+            X -= self.means
+            X /= self.scales
+        return X
+
+    def label_codes(self, names):
+        """Traduce nombres de etiqueta a 'classes_'; las etiquetas nuevas se añaden al final."""
+        known = pd.Index(self.labels)
+        new = [name for name in names if name not in known]
+        if new:
+            if self.rows_seen and not isinstance(self.estimator, WindowedForest):
+                raise ValueError(f"Etiquetas nuevas {new}: el estimador incremental solo admite las clases del primer entrenamiento.")
+            self.labels.extend(new)
+        return pd.Index(self.labels).get_indexer(names)
+
+    def partial_fit(self, X, y):
+        self.estimator.partial_fit(self._prepare(X), y, classes=self.classes_)
+        self.rows_seen += len(y)
+        return self
+
+    def predict_proba(self, X):
+        X = self._prepare(X)
+        probabilities = self.estimator.predict_proba(X)
+        # Un estimador que aún no vio todas las clases devuelve menos columnas
+        classes = getattr(self.estimator, 'classes_', self.classes_)
+        if len(classes) == len(self.labels):
+            return probabilities
+        aligned = np.zeros((len(X), len(self.labels)))
+        aligned[:, np.asarray(classes)] = probabilities
+        return aligned
+
+    def predict(self, X):
+        return self.predict_proba(X).argmax(axis=1)
+
+
+ESTIMATORS = {
+    'bosque': lambda args: WindowedForest(args.arboles_por_ventana, args.ventanas_max),
+    'sgd': lambda args: SGDClassifier(loss='log_loss', random_state=42),
+    'nb': lambda args: GaussianNB(),
+}
+
+
+def _holdout(start, length, test_size, seed=42):
+    """Máscara reproducible de filas de prueba: depende solo de la posición de cada fila en el caché."""
+    if not test_size:
+        return np.zeros(length, dtype=bool)
+    return np.random.default_rng([seed, start]).random(length) < test_size
+
+
+def train_incremental(model, cache, chunk_rows=DEFAULT_CHUNK_ROWS, test_size=0.2):
+    """
+    Entrena 'model' con las filas del caché, un fragmento a la vez; el coste depende solo de este caché,
+    no de lo entrenado antes.
+
+    Parámetros:
+    - model (IncrementalModel): Modelo a actualizar.
+    - cache (training_cache.TrainingCache): Datos nuevos.
+    - chunk_rows (int): Filas por fragmento; con 'WindowedForest' cada fragmento es una ventana.
+    - test_size (float): Fracción de filas de cada fragmento que se reserva para evaluar.
+
+    Retorna:
+    - La exactitud sobre las filas reservadas (None si no se reservó ninguna).
+    """
+    label_codes = model.label_codes(cache.classes)
+    columns = list(model.feature_names_in_)
+    unknown = [column for column in columns if column not in cache.numeric_columns]
+    if unknown:
+        raise ValueError(f"Columnas del modelo que no están en el caché: {unknown}")
+
+    started = time.time()
+    for position, (X, y) in enumerate(iter_chunks(cache, columns, chunk_rows)):
+        y = label_codes[y]
+        test = _holdout(position * chunk_rows, len(y), test_size)
+        model.partial_fit(X[~test], y[~test])
+        logging.info("Fragmento %d: %d filas de entrenamiento (%.1f s).", position, int((~test).sum()), time.time() - started)
+
+    # La evaluación va al final para que todas las filas reservadas se midan con el modelo completo. Las filas
+    # no se guardan en memoria durante el entrenamiento: la máscara es reproducible y se vuelven a leer del
+    # caché mapeado, un fragmento a la vez
+    correct = evaluated = 0
+    if test_size:
+        for position, (X, y) in enumerate(iter_chunks(cache, columns, chunk_rows)):
+            test = _holdout(position * chunk_rows, len(y), test_size)
+            if test.any():
+                correct += int((model.predict(X[test]) == label_codes[y[test]]).sum())
+                evaluated += int(test.sum())
+    return correct / evaluated if evaluated else None
+
+
+def create_model(cache, estimator, columns=None, scale=False, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Modelo nuevo con la imputación (y el escalado) calculados en una pasada por fragmentos sobre 'cache'.
+
+    Solo usa columnas numéricas: las categóricas necesitarían codificarse con un vocabulario fijo.
+    """
+    columns = list(columns) if columns is not None else list(cache.numeric_columns)
+    scaler = fit_scaler(cache, columns, chunk_rows)
+    # Columnas sin ningún valor finito: se imputan con 0 y no se escalan
+    means = np.nan_to_num(scaler.mean_)
+    scales = np.where(np.isfinite(scaler.scale_) & (scaler.scale_ > 0), scaler.scale_, 1.0) if scale else None
+    return IncrementalModel(estimator, columns, [], means, scales)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # Las clases del modelo guardado deben referirse a este módulo y no a '__main__' para que
+    # scoring_service (u otro proceso) pueda cargarlo
+    from incremental_training import ESTIMATORS, create_model, train_incremental
+
+    parser = argparse.ArgumentParser(description="Entrenamiento incremental por fragmentos sobre el caché de un CSV de entrenamiento.")
+    parser.add_argument('csv', nargs='?', default='DarknetFinal.csv', help="CSV con los datos nuevos.")
+    parser.add_argument('--modelo', default='modelo_incremental.joblib',
+                        help="Modelo: si existe se continúa entrenando con los datos nuevos; si no, se crea.")
+    parser.add_argument('--cache', default=None, help="Directorio del caché del CSV; por defecto '<csv>.cache'.")
+    parser.add_argument('--estimador', choices=sorted(ESTIMATORS), default='bosque', help="Estimador de un modelo nuevo.")
+    parser.add_argument('--arboles-por-ventana', type=int, default=20, help="Árboles nuevos por fragmento ('bosque').")
+    parser.add_argument('--ventanas-max', type=int, default=None, help="Sub-bosques que se conservan ('bosque').")
+    parser.add_argument('--fragmento', type=int, default=DEFAULT_CHUNK_ROWS, help="Filas por fragmento.")
+    parser.add_argument('--prueba', type=float, default=0.2, help="Fracción de filas reservada para evaluar.")
+    args = parser.parse_args()
+
+    columns_to_drop = ['Flow ID', 'Timestamp', 'Src IP', 'Dst IP', 'Label.1']
+    cache = ensure_training_cache(args.csv, args.cache or os.path.splitext(args.csv)[0] + '.cache',
+                                  exclude=columns_to_drop)
+    if os.path.exists(args.modelo):
+        model = joblib.load(args.modelo)['pipeline']
+        logging.info("Continuando el modelo %s (%d filas vistas).", args.modelo, model.rows_seen)
+    else:
+        model = create_model(cache, ESTIMATORS[args.estimador](args), scale=args.estimador == 'sgd',
+                             chunk_rows=args.fragmento)
+
+    accuracy = train_incremental(model, cache, chunk_rows=args.fragmento, test_size=args.prueba)
+    if accuracy is not None:
+        print(f"Accuracy sobre las filas reservadas: {accuracy}")
+    joblib.dump({'pipeline': model, 'labels': model.labels}, args.modelo)
+    print(f"Modelo guardado en {args.modelo}")
@@ -0,0 +1,181 @@
+import contextlib
+import contextvars
+import json
+import logging
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+# Reporte activo del lote en curso; si no hay ninguno, la instrumentación no hace nada
+_active_report = contextvars.ContextVar('active_report', default=None)
+
+
+def read_proc_status(field):
+    """Lee un campo en bytes de /proc/self/status (por ejemplo 'VmRSS' o 'VmHWM'); None si no existe."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reinicia el pico de RSS del proceso (Linux); devuelve False si el sistema no lo permite."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """Pico de RSS del proceso en bytes."""
+    peak = read_proc_status('VmHWM')
+    if peak is None:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return None
+    return peak
+
+
+def _to_mb(value):
+    return round(value / 2**20, 3) if value is not None else None
+
+
+class _NullStage:
+    """Etapa sin instrumentación: no mide nada y cuesta prácticamente cero."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_output(self, df):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _StageRecorder:
+    def __init__(self, report, name, df):
+        self.report = report
+        self.record = {'stage': name, 'rows_in': _rows(df), 'rows_out': None, 'columns_out': None}
+
+    def __enter__(self):
+        if self.report.trace_allocations:
+            tracemalloc.reset_peak()
+            self._traced_start = tracemalloc.get_traced_memory()[0]
+        self._rss_start = read_proc_status('VmRSS')
+        self._start = time.perf_counter()
+        return self
+
+    def set_output(self, df):
+        """Registra el DataFrame resultante de la etapa (filas y columnas de salida)."""
+        self.record['rows_out'] = _rows(df)
+        self.record['columns_out'] = len(df.columns) if hasattr(df, 'columns') else None
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record['elapsed_s'] = round(time.perf_counter() - self._start, 6)
+        rss_end = read_proc_status('VmRSS')
+        self.record['rss_delta_mb'] = _to_mb(rss_end - self._rss_start) if rss_end is not None and self._rss_start is not None else None
+        if self.report.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            self.record['alloc_peak_mb'] = _to_mb(peak - self._traced_start)
+        if exc_type is not None:
+            self.record['error'] = f"{exc_type.__name__}: {exc}"
+        self.report.stages.append(self.record)
+        return False
+
+
+def _rows(df):
+    return len(df) if df is not None and hasattr(df, '__len__') else None
+
+
+class RunReport:
+    """
+    Reporte de un lote: una entrada por etapa con tiempo, filas de entrada/salida, columnas, variación
+    de RSS y, opcionalmente, el pico de asignaciones medido con tracemalloc.
+    """
+
+    def __init__(self, batch_id=None, trace_allocations=False):
+        self.batch_id = batch_id if batch_id is not None else uuid.uuid4().hex
+        self.trace_allocations = trace_allocations
+        self.started = datetime.now(timezone.utc)
+        self.stages = []
+        self._start = time.perf_counter()
+        self.total_s = None
+
+    def stage(self, name, df=None):
+        return _StageRecorder(self, name, df)
+
+    def finish(self):
+        self.total_s = round(time.perf_counter() - self._start, 6)
+        return self
+
+    def to_dict(self):
+        return {
+            'batch_id': self.batch_id,
+            'started': self.started.isoformat(),
+            'total_s': self.total_s,
+            'stages': self.stages,
+        }
+
+    def emit(self, path=None):
+        """Escribe el reporte como una línea JSON en 'path' o, si no se indica, en el log."""
+        line = json.dumps(self.to_dict(), default=str)
+        if path:
+            with open(path, 'a') as output:
+                output.write(line + '\n')
+        else:
+            logging.info("Reporte de ejecución: %s", line)
+        return line
+
+
+@contextlib.contextmanager
+def run_report(batch_id=None, path=None, trace_allocations=False, emit=True):
+    """
+    Activa la instrumentación para un lote y emite su reporte al salir.
+
+    Uso:
+        with run_report(batch_id='lote-1', path='run_reports.jsonl') as report:
+            df = preprocesar_datos(df)
+    """
+    report = RunReport(batch_id, trace_allocations)
+    started_tracing = trace_allocations and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _active_report.set(report)
+    try:
+        yield report
+    finally:
+        _active_report.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+        report.finish()
+        if emit:
+            report.emit(path)
+
+
+def stage(name, df=None):
+    """
+    Contexto de medición de una etapa dentro del reporte activo; sin reporte activo no mide nada.
+
+    Uso:
+        with stage('banderas_tcp', df) as recorder:
+            df = count_tcp_flags_vectorized(df)
+            recorder.set_output(df)
+    """
+    report = _active_report.get()
+    if report is None:
+        return _NULL_STAGE
+    return report.stage(name, df)
+
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+
+def as_float_array(values):
+    """
+    Convierte una serie o arreglo a float64 de numpy; los nulos de pandas (pd.NA) y los valores no
+    numéricos pasan a NaN.
+    """
+    if isinstance(values, (pd.Series, pd.Index)):
+        if not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_numeric(values, errors='coerce')
+        return values.to_numpy(dtype='float64', na_value=np.nan)
+    return np.asarray(values, dtype='float64')
+
+
+def _parse_hex(value):
+    if isinstance(value, (int, np.integer)):
+        return float(value)
+    try:
+        return float(int(str(value), 16))
+    except ValueError:
+        return np.nan
+
+
+def parse_hex_flags(values):
+    """
+    Convierte banderas TCP en hexadecimal ('1b', '0x02', ...) a números sobre el arreglo completo.
+
+    Solo se decodifica cada valor distinto una vez (a lo sumo 256 para banderas TCP) y el resultado se
+    expande con una indexación; los valores nulos o no hexadecimales quedan como NaN.
+
+    Parámetros:
+    - values (pd.Series o array): Banderas en texto hexadecimal o ya numéricas.
+
+    Retorna:
+    - numpy.ndarray de tipo float64.
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return as_float_array(values)
+
+    codes, uniques = pd.factorize(values)
+    lookup = np.array([_parse_hex(value) for value in uniques], dtype='float64')
+    result = np.full(len(values), np.nan)
+    valid = codes >= 0
+    result[valid] = lookup[codes[valid]]
+    return result
+
+
+def safe_divide(numerator, denominator, fill=0.0):
+    """
+    Divide elemento a elemento y devuelve 'fill' donde el denominador no es positivo.
+
+    Equivale a 'a / b if b > 0 else fill' fila por fila: un numerador NaN con denominador válido
+    sigue dando NaN.
+    """
+    numerator = as_float_array(numerator)
+    denominator = as_float_array(denominator)
+    with np.errstate(invalid='ignore'):
+        valid = denominator > 0
+    result = np.full(np.broadcast(numerator, denominator).shape, fill, dtype='float64')
+    np.divide(numerator, denominator, out=result, where=valid)
+    return result
+
+
+def masked_group_sum(values, mask, keys):
+    """
+    Suma por grupo solo de los valores donde 'mask' es verdadero, sin funciones lambda por grupo.
+
+    Parámetros:
+    - values (array): Valores a sumar (los NaN se ignoran).
+    - mask (array de bool): Filas que participan en la suma.
+    - keys (array): Clave de grupo de cada fila (por ejemplo 'flow_id'); las claves nulas se descartan.
+
+    Retorna:
+    - pd.Series indexada por clave en orden ascendente, como 'groupby(keys).sum()'.
+    """
+    codes, uniques = pd.factorize(keys, sort=True)
+    values = as_float_array(values)
+    mask = mask.to_numpy(dtype=bool, na_value=False) if isinstance(mask, pd.Series) else np.asarray(mask, dtype=bool)
+    weights = np.where(mask & ~np.isnan(values), values, 0.0)
+    valid = codes >= 0
+    sums = np.bincount(codes[valid], weights=weights[valid], minlength=len(uniques))
+    return pd.Series(sums, index=uniques)
+
@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd  # Asegúrate de importar pandas para manejar DataFrames
 
+from schema import DIRECTION_DTYPE
+
 def add_packet_direction(df):
     """
     Agrega una columna 'direction' al DataFrame basada en una lógica definida.
@@ -22,7 +24,7 @@ def add_packet_direction(df):
             raise ValueError("La columna 'dest_port' contiene valores NaN.")
 
         # Definir la lógica de dirección aquí. Por ejemplo:
-        df['direction'] = np.where(df['dest_port'] < 1024, 'forward', 'backward')
+        df['direction'] = pd.Categorical(np.where(df['dest_port'] < 1024, 'forward', 'backward'), dtype=DIRECTION_DTYPE)
         return df
 
     except ValueError as ve:
@@ -2,28 +2,8 @@ import pandas as pd
 import numpy as np
 import logging
 
-# Configuración inicial del logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from packet_stats_calculations import ensure_packet_length
 
-def ensure_packet_length(df):
-    if 'packet_length' not in df.columns:
-        logging.info("'packet_length' no se encuentra en el DataFrame. Intentando calcular...")
-        
-        # Verifica si las columnas para el cálculo alternativo existen
-        required_columns_for_calculation = ['flow.bytes_toserver', 'flow.bytes_toclient', 'total_fwd_packets', 'total_bwd_packets']
-        missing_columns = set(required_columns_for_calculation) - set(df.columns)
-        if missing_columns:
-            logging.error(f"No se pueden calcular 'packet_length' porque faltan las columnas requeridas: {missing_columns}")
-            raise ValueError(f"Faltan columnas requeridas para calcular 'packet_length': {missing_columns}")
-
-        # Estimación de 'packet_length'
-        df['total_bytes'] = df['flow.bytes_toserver'] + df['flow.bytes_toclient']
-        df['total_packets'] = df['total_fwd_packets'] + df['total_bwd_packets']
-        df['packet_length'] = df.apply(lambda row: row['total_bytes'] / row['total_packets'] if row['total_packets'] > 0 else 0, axis=1)
-        logging.info("La columna 'packet_length' ha sido calculada como una estimación basada en el flujo de bytes.")
-    else:
-        logging.info("'packet_length' ya existe en el DataFrame.")
-    return df
 
 def calculate_packet_length_stats(df):
     """
@@ -36,7 +16,7 @@ def calculate_packet_length_stats(df):
         if not required_columns.issubset(df.columns):
             raise ValueError(f"El DataFrame no contiene las columnas requeridas: {required_columns - set(df.columns)}")
         
-        logging.debug("Columnas antes de la agregación: %s", df.columns.tolist())
+        logging.debug("Columnas antes de la agregación: %d", df.shape[1])
         
         packet_length_stats = df.groupby('flow_id')['packet_length'].agg(['mean', 'max', 'min', 'std']).reset_index()
         packet_length_stats.rename(columns={'mean': 'mean_packet_length', 'max': 'max_packet_length', 'min': 'min_packet_length', 'std': 'std_packet_length'}, inplace=True)
@@ -45,7 +25,7 @@ def calculate_packet_length_stats(df):
         
         df = df.merge(packet_length_stats, on='flow_id', how='left')
         
-        logging.debug("Columnas después de la fusión: %s", df.columns.tolist())
+        logging.debug("Columnas después de la fusión: %d", df.shape[1])
         
         if 'std_packet_length' not in df.columns:
             logging.error("'std_packet_length' no se encuentra en el DataFrame después de la fusión.")
@@ -1,8 +1,6 @@
 import pandas as pd
 import logging
 
-# Configuración inicial del logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def calculate_packet_length_stats(df):
     try:
@@ -35,12 +33,13 @@ def calculate_packet_length_stats(df):
         }
         packet_length_stats.rename(columns=new_column_names, inplace=True)
 
-        logging.debug(f"Estadísticas de longitud de paquete calculadas: {packet_length_stats.head()}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Estadísticas de longitud de paquete calculadas:\n%s", packet_length_stats.head())
 
         # Merge las estadísticas calculadas con el DataFrame original
         df = pd.merge(df, packet_length_stats, on='flow_id', how='left')
 
-        logging.info(f"DataFrame después de la fusión: {df.columns.tolist()}")
+        logging.debug("DataFrame después de la fusión: %d columnas", df.shape[1])
 
         # Calcula varianza de longitud de paquete como nueva columna
         df['var_packet_length_stats'] = df['std_packet_length_stats'] ** 2
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from schema import sanitize_columns
+
 def calculate_packet_stats(df):
     """
     Calcula estadísticas detalladas de longitud de paquetes para cada flujo en el DataFrame.
@@ -53,8 +55,9 @@ def calculate_packet_stats(df):
         # Combinar estadísticas de dirección y generales en un solo DataFrame
         combined_stats = pd.merge(direction_stats, general_stats, on='flow_id', how='outer')
         
-        # Rellenar los valores faltantes con 0, asumiendo que la ausencia de paquetes implica longitud 0
-        combined_stats.fillna(0, inplace=True)
+        # Rellenar los valores faltantes con 0, asumiendo que la ausencia de paquetes implica longitud 0;
+        # solo en las columnas de estadísticas recién calculadas
+        sanitize_columns(combined_stats, combined_stats.columns.drop('flow_id'))
         
         return combined_stats
     except ValueError as ve:
@@ -2,8 +2,8 @@ import pandas as pd
 import numpy as np
 import logging
 
-# Configuración inicial del logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from kernels import safe_divide
+
 
 
 def calculate_basic_packet_stats(df):
@@ -37,12 +37,13 @@ def calculate_basic_packet_stats(df):
         }
         packet_length_stats.rename(columns=new_column_names, inplace=True)
 
-        logging.debug(f"Estadísticas de longitud de paquete calculadas: {packet_length_stats.head()}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Estadísticas de longitud de paquete calculadas:\n%s", packet_length_stats.head())
 
         # Merge las estadísticas calculadas con el DataFrame original
         df = pd.merge(df, packet_length_stats, on='flow_id', how='left')
 
-        logging.info(f"DataFrame después de la fusión: {df.columns.tolist()}")
+        logging.debug("DataFrame después de la fusión: %d columnas", df.shape[1])
 
         # Calcula varianza de longitud de paquete como nueva columna
         df['var_packet_length_stats'] = df['std_packet_length_stats'] ** 2
@@ -79,7 +80,7 @@ def ensure_packet_length(df):
         # Estimación de 'packet_length'
         df['total_bytes'] = df['flow.bytes_toserver'] + df['flow.bytes_toclient']
         df['total_packets'] = df['total_fwd_packets'] + df['total_bwd_packets']
-        df['packet_length'] = df.apply(lambda row: row['total_bytes'] / row['total_packets'] if row['total_packets'] > 0 else 0, axis=1)
+        df['packet_length'] = safe_divide(df['total_bytes'], df['total_packets'])
         logging.info("La columna 'packet_length' ha sido calculada como una estimación basada en el flujo de bytes.")
     else:
         logging.info("'packet_length' ya existe en el DataFrame.")
@@ -96,7 +97,7 @@ def ensure_and_calculate_packet_stats(df):
         if not required_columns.issubset(df.columns):
             raise ValueError(f"El DataFrame no contiene las columnas requeridas: {required_columns - set(df.columns)}")
         
-        logging.debug("Columnas antes de la agregación: %s", df.columns.tolist())
+        logging.debug("Columnas antes de la agregación: %d", df.shape[1])
         
         packet_length_stats = df.groupby('flow_id')['packet_length'].agg(['mean', 'max', 'min', 'std']).reset_index()
         packet_length_stats.rename(columns={'mean': 'mean_packet_length', 'max': 'max_packet_length', 'min': 'min_packet_length', 'std': 'std_packet_length'}, inplace=True)
@@ -105,7 +106,7 @@ def ensure_and_calculate_packet_stats(df):
         
         df = df.merge(packet_length_stats, on='flow_id', how='left')
         
-        logging.debug("Columnas después de la fusión: %s", df.columns.tolist())
+        logging.debug("Columnas después de la fusión: %d", df.shape[1])
         
         if 'std_packet_length' not in df.columns:
             logging.error("'std_packet_length' no se encuentra en el DataFrame después de la fusión.")
@@ -0,0 +1,177 @@
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from processData import pipeline_sorts_rows, preprocesar_datos
+from schema import EVENT_SCHEMA, sanitize_columns
+
+# Columnas que leen las etapas de 'preprocesar_datos'; solo estas viajan a los procesos. El resto de
+# columnas del evento solo se arrastran y se reincorporan en el proceso principal.
+SHARD_INPUT_COLUMNS = ['flow_id', 'timestamp', 'dest_port', 'tcp.flags', 'flow.pkts_toserver',
+                       'flow.pkts_toclient', 'flow.bytes_toserver', 'flow.bytes_toclient']
+
+# Posición de cada evento en el DataFrame original, para reincorporar las columnas arrastradas
+ROW_COLUMN = '__row'
+
+
+def shard_ids(flow_ids, n_shards):
+    """
+    Asigna cada evento a un shard por hash de 'flow_id'; todos los eventos de un flujo caen en el mismo.
+
+    El hash es determinista entre ejecuciones y procesos (no depende de PYTHONHASHSEED).
+    """
+    hashes = pd.util.hash_pandas_object(pd.Series(flow_ids), index=False).to_numpy()
+    return (hashes % np.uint64(n_shards)).astype(np.int64)
+
+
+def _write_shared(df):
+    """Serializa un DataFrame como flujo Arrow IPC en un segmento de memoria compartida nuevo."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    segment = shared_memory.SharedMemory(create=True, size=max(sink.size(), 1))
+    buffer = pa.py_buffer(segment.buf)
+    stream = pa.FixedSizeBufferWriter(buffer)
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+    # Las vistas de Arrow sobre el segmento deben liberarse antes de cerrarlo
+    del writer, stream, buffer
+    name = segment.name
+    segment.close()
+    return name
+
+
+def _read_shared(name, unlink=True):
+    """Reconstruye el DataFrame de un segmento de memoria compartida y libera el segmento."""
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        buffer = pa.py_buffer(segment.buf)
+        with pa.ipc.open_stream(buffer) as reader:
+            table = reader.read_all()
+        # Copia explícita: el DataFrame no puede seguir apuntando al segmento una vez cerrado
+        df = table.to_pandas().copy()
+        del reader, table, buffer
+    finally:
+        segment.close()
+        if unlink:
+            segment.unlink()
+    return df
+
+
+def _gather_shared(names, sort_by_flow=True):
+    """
+    Une los resultados de los shards en un único DataFrame ordenado por flow_id o, con
+    'sort_by_flow=False', en el orden original de los eventos ('ROW_COLUMN').
+
+    La concatenación y el reordenamiento se hacen sobre las tablas Arrow leídas sin copia desde la memoria
+    compartida, y la conversión a pandas (multihilo) se hace una sola vez sobre el resultado.
+    """
+    segments = [shared_memory.SharedMemory(name=name) for name in names]
+    try:
+        tables = []
+        for segment in segments:
+            with pa.ipc.open_stream(pa.py_buffer(segment.buf)) as reader:
+                tables.append(reader.read_all())
+        table = pa.concat_tables(tables)
+        del tables, reader
+        if sort_by_flow:
+            # Cada flujo está entero en un shard y ya viene ordenado por timestamp: basta un orden estable por flujo
+            order = np.argsort(table.column('flow_id').to_numpy(), kind='stable')
+        else:
+            # Sin la etapa por flujo cada shard conserva el orden de entrada; se intercalan de nuevo por posición
+            order = np.argsort(table.column(ROW_COLUMN).to_numpy(), kind='stable')
+        df = table.take(order).to_pandas()
+        del table
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+    return df
+
+
+def _release(names):
+    for name in names:
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        segment.close()
+        segment.unlink()
+
+
+def _process_shard(name, caracteristicas=None):
+    """Trabajo de cada proceso: lee su shard, ejecuta el pipeline y deja el resultado en memoria compartida."""
+    df = _read_shared(name)
+    return _write_shared(preprocesar_datos(df, caracteristicas=caracteristicas))
+
+
+def parallel_preprocess(df, n_workers=None, n_shards=None, caracteristicas=None):
+    """
+    Ejecuta 'preprocesar_datos' repartiendo los eventos por hash de 'flow_id' entre varios procesos.
+
+    Todas las características se calculan por flujo, así que cada shard es independiente. Los datos viajan
+    como buffers Arrow en memoria compartida, no como DataFrames serializados con pickle; solo se envían
+    las columnas que usa el pipeline y el resto se reincorpora al final.
+
+    El resultado es idéntico al de 'preprocesar_datos(df, caracteristicas=caracteristicas)': mismas filas, mismo orden
+    (por flow_id y timestamp si se calculan las estadísticas por flujo; si no, el de entrada), mismas columnas y tipos.
+
+    Parámetros:
+    - df (pandas.DataFrame): Eventos con el esquema de 'schema.EVENT_SCHEMA'.
+    - n_workers (int, opcional): Procesos a usar; por defecto uno por núcleo.
+    - n_shards (int, opcional): Número de shards; por defecto igual a 'n_workers'.
+    - caracteristicas (list, opcional): Características a calcular (ver 'preprocesar_datos').
+
+    Retorna:
+    - El DataFrame de características.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    n_shards = n_shards or n_workers
+    if n_shards <= 1 or df.empty or 'flow_id' not in df.columns:
+        return preprocesar_datos(df, caracteristicas=caracteristicas)
+
+    original_columns = df.columns.tolist()
+    sent_columns = [column for column in SHARD_INPUT_COLUMNS if column in df.columns]
+    work = df[sent_columns].copy()
+    work[ROW_COLUMN] = np.arange(df.shape[0])
+    shards = shard_ids(work['flow_id'], n_shards)
+
+    names = []
+    result_names = []
+    try:
+        for shard in range(n_shards):
+            part = work[shards == shard]
+            if not part.empty:
+                names.append(_write_shared(part.reset_index(drop=True)))
+        del work
+
+        n_parts = len(names)
+        n_processes = min(n_workers, n_parts)
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            pending = executor.map(functools.partial(_process_shard, caracteristicas=caracteristicas), names)
+            # Mientras los procesos calculan, se aplica a las columnas arrastradas la limpieza final del pipeline
+            carried = df.drop(columns=sent_columns)
+            sanitize_columns(carried, EVENT_SCHEMA)
+            for result_name in pending:
+                result_names.append(result_name)
+        names = []
+        result = _gather_shared(result_names, sort_by_flow=pipeline_sorts_rows(original_columns, caracteristicas))
+        result_names = []
+    finally:
+        # Si un proceso falló quedan segmentos sin liberar: entradas no leídas o resultados no recogidos
+        _release(names + result_names)
+
+    # Columnas arrastradas: las mismas filas en el mismo orden que el resultado
+    carried = carried.take(result[ROW_COLUMN].to_numpy()).reset_index(drop=True)
+    result = pd.concat([carried, result.drop(columns=[ROW_COLUMN])], axis=1)
+
+    new_columns = [column for column in result.columns if column not in original_columns]
+    logging.info("Pipeline paralelo: %d shards en %d procesos.", n_parts, n_processes)
+    return result[[column for column in original_columns if column in result.columns] + new_columns]
@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from kernels import as_float_array
+
+# Versión del formato del artefacto; cambia si cambia su estructura
+ARTIFACT_FORMAT_VERSION = 1
+
+
+def _json_value(value):
+    """Convierte escalares de numpy a tipos nativos para guardarlos en JSON."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class FeatureMatrix:
+    """
+    Matriz de características sin densificar: bloque numérico denso (float32 por defecto) y bloque
+    one-hot en CSR, con los nombres de columna como metadatos.
+
+    Los estimadores de scikit-learn aceptan directamente 'tocsr()' (los árboles trabajan internamente en
+    float32, así que no se pierde precisión respecto a la salida float64). 'to_frame()' densifica y solo
+    está pensado para inspección.
+    """
+
+    def __init__(self, numeric, categorical, numeric_names, categorical_names, index=None):
+        self.numeric = numeric
+        self.categorical = categorical
+        self.numeric_names = list(numeric_names)
+        self.categorical_names = list(categorical_names)
+        self.feature_names = self.numeric_names + self.categorical_names
+        self.index = index
+
+    def __len__(self):
+        return self.numeric.shape[0]
+
+    @property
+    def shape(self):
+        return (self.numeric.shape[0], len(self.feature_names))
+
+    @property
+    def nbytes(self):
+        categorical = self.categorical
+        return self.numeric.nbytes + categorical.data.nbytes + categorical.indices.nbytes + categorical.indptr.nbytes
+
+    def tocsr(self):
+        """Ambos bloques en una sola matriz CSR, en el orden de 'feature_names'."""
+        return sparse.hstack([sparse.csr_matrix(self.numeric), self.categorical], format='csr')
+
+    def to_frame(self):
+        """DataFrame denso con las columnas 'feature_names' (densifica el bloque one-hot)."""
+        matrix = np.hstack([self.numeric, self.categorical.toarray()])
+        return pd.DataFrame(matrix, columns=self.feature_names, index=self.index)
+
+
+class FittedPreprocessor:
+    """
+    Escalado estándar y codificación one-hot ajustados una sola vez sobre una ventana de referencia.
+
+    Guarda solo los parámetros aprendidos (medias, escalas y categorías) y aplica 'transform' con numpy,
+    de modo que cada lote usa la misma escala y produce siempre las mismas columnas en el mismo orden.
+
+    - Columnas numéricas ausentes en un lote se rellenan con la media de ajuste (0 tras escalar).
+    - Categorías no vistas en el ajuste, o columnas categóricas ausentes, se codifican con ceros, como
+      'OneHotEncoder(handle_unknown='ignore')'.
+    """
+
+    def __init__(self, numeric_features, means, scales, categorical_features, categories, pipeline_version=None,
+                 created=None):
+        self.numeric_features = list(numeric_features)
+        self.means = np.asarray(means, dtype='float64')
+        self.scales = np.asarray(scales, dtype='float64')
+        self.categorical_features = list(categorical_features)
+        self.categories = [list(values) for values in categories]
+        self.pipeline_version = pipeline_version
+        self.created = created
+        self.feature_names = self.numeric_features + [
+            f'{column}_{value}' for column, values in zip(self.categorical_features, self.categories) for value in values
+        ]
+
+    @classmethod
+    def fit(cls, df, numeric_features, categorical_features, pipeline_version=None):
+        """
+        Ajusta el preprocesador con el mismo 'ColumnTransformer' que 'preprocesar_datos_y_ajustar_columnas'.
+
+        Las columnas de las listas que no estén en 'df' se omiten del artefacto.
+        """
+        numeric_present = [col for col in numeric_features if col in df.columns]
+        categorical_present = [col for col in categorical_features if col in df.columns]
+        transformer = ColumnTransformer(
+            transformers=[
+                ('num', StandardScaler(), numeric_present),
+                ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_present)
+            ],
+            remainder='drop'
+        )
+        transformer.fit(df)
+        scaler = transformer.named_transformers_['num']
+        encoder = transformer.named_transformers_['cat']
+        categories = [[_json_value(value) for value in values] for values in encoder.categories_] if categorical_present else []
+        return cls(numeric_present, scaler.mean_ if numeric_present else [], scaler.scale_ if numeric_present else [],
+                   categorical_present, categories, pipeline_version=pipeline_version,
+                   created=datetime.now(timezone.utc).isoformat())
+
+    def _numeric_block(self, df, dtype='float64'):
+        """Bloque numérico escalado (filas x 'numeric_features') en 'dtype'."""
+        numeric = np.empty((df.shape[0], len(self.numeric_features)), dtype='float64')
+        missing = []
+        for position, column in enumerate(self.numeric_features):
+            if column in df.columns:
+                numeric[:, position] = as_float_array(df[column])
+            else:
+                numeric[:, position] = self.means[position]
+                missing.append(column)
+        if missing:
+            logging.warning("Columnas numéricas ausentes en el lote (se usa la media de ajuste): %s", missing)
+        numeric -= self.means
+        numeric /= self.scales
+        return numeric.astype(dtype, copy=False)
+
+    def _category_codes(self, df):
+        """Para cada columna categórica, la posición de cada valor en sus categorías (-1 si no se vio)."""
+        codes = []
+        for column, values in zip(self.categorical_features, self.categories):
+            if column in df.columns:
+                codes.append(pd.Index(values, dtype=object).get_indexer(df[column].to_numpy(dtype=object)))
+            else:
+                logging.warning("Columna categórica ausente en el lote: '%s'.", column)
+                codes.append(np.full(df.shape[0], -1, dtype=np.intp))
+        return codes
+
+    def transform(self, df):
+        """
+        Escala y codifica un lote. Retorna un DataFrame float64 con las columnas 'feature_names'.
+        """
+        n_rows = df.shape[0]
+        blocks = []
+        if self.numeric_features:
+            blocks.append(self._numeric_block(df))
+        for codes, values in zip(self._category_codes(df), self.categories):
+            encoded = np.zeros((n_rows, len(values)), dtype='float64')
+            known = codes >= 0
+            encoded[np.flatnonzero(known), codes[known]] = 1.0
+            blocks.append(encoded)
+
+        matrix = np.hstack(blocks) if blocks else np.empty((n_rows, 0))
+        return pd.DataFrame(matrix, columns=self.feature_names, index=df.index)
+
+    def transform_sparse(self, df, dtype='float32'):
+        """
+        Escala y codifica un lote sin densificar el bloque one-hot.
+
+        Retorna un 'FeatureMatrix' con el bloque numérico denso en 'dtype' y el categórico en CSR.
+        """
+        n_rows = df.shape[0]
+        numeric = self._numeric_block(df, dtype) if self.numeric_features else np.empty((n_rows, 0), dtype=dtype)
+
+        # Cada columna categórica aporta como mucho un 1 por fila: se construyen directamente los índices COO
+        rows, columns = [], []
+        offset = 0
+        for codes, values in zip(self._category_codes(df), self.categories):
+            known = np.flatnonzero(codes >= 0)
+            rows.append(known)
+            columns.append(codes[known] + offset)
+            offset += len(values)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+        columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.intp)
+        categorical = sparse.csr_matrix((np.ones(len(rows), dtype=dtype), (rows, columns)), shape=(n_rows, offset))
+        categorical.sort_indices()
+
+        n_numeric = len(self.numeric_features)
+        return FeatureMatrix(numeric, categorical, self.feature_names[:n_numeric], self.feature_names[n_numeric:],
+                             index=df.index)
+
+    def to_dict(self):
+        return {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'pipeline_version': self.pipeline_version,
+            'created': self.created,
+            'numeric_features': self.numeric_features,
+            'means': self.means.tolist(),
+            'scales': self.scales.tolist(),
+            'categorical_features': self.categorical_features,
+            'categories': self.categories,
+        }
+
+    def save(self, path):
+        """Guarda el artefacto en JSON (sin pickle: se puede inspeccionar y cargar de forma segura)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.to_dict(), file)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, pipeline_version=None):
+        """
+        Carga un artefacto guardado con 'save'.
+
+        Parámetros:
+        - path (str): Ruta del archivo JSON.
+        - pipeline_version (str, opcional): Versión actual del pipeline; si no coincide con la del ajuste
+          se registra una advertencia, porque las características pueden haber cambiado.
+        """
+        with open(path) as file:
+            data = json.load(file)
+        if data.get('format_version') != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Formato de preprocesador no soportado: {data.get('format_version')}")
+        if pipeline_version is not None and data.get('pipeline_version') != pipeline_version:
+            logging.warning("El preprocesador se ajustó con la versión %s del pipeline y la actual es %s.",
+                            data.get('pipeline_version'), pipeline_version)
+        return cls(data['numeric_features'], data['means'], data['scales'], data['categorical_features'],
+                   data['categories'], pipeline_version=data.get('pipeline_version'), created=data.get('created'))
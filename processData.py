@@ -1,48 +1,103 @@
 import pandas as pd
 import numpy as np
+import argparse
+import contextlib
+import hashlib
 import json
+import os
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 import logging
 
-# Configuración básica de logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
 # Asumimos que las importaciones de módulos personalizados son correctas
 # Asegúrate de manejar las excepciones dentro de estas funciones también
-from iat_calculations import calculate_iat_statistics
-from tcp_flags_count import count_tcp_flags_vectorized
-from packet_length_stats import calculate_packet_length_stats as calculate_basic_packet_length_stats
-from tcp_advanced_stats import calculate_tcp_advanced_stats
-from packet_direction import add_packet_direction
-from packet_stats import calculate_packet_stats
-#from packet_length_management import calculate_packet_length_stats as calculate_and_ensure_packet_length_stats
+from data_cleaning import clean_data
+from eve_reader import load_eve_events
+from event_cache import EventCache
+from feature_store import FlowFeatureStore
+from feature_registry import FEATURE_REGISTRY, produced_columns, sorts_rows
+from instrumentation import run_report, stage
+from preprocessor import FeatureMatrix, FittedPreprocessor
+from schema import EVENT_SCHEMA, memory_usage_mb, sanitize_columns
 
-from packet_stats_calculations import calculate_basic_packet_stats, ensure_and_calculate_packet_stats
+# Ruta por defecto del eve.json de Suricata
+EVE_JSON_PATH = '../../../var/log/suricata/eve.json'
 
+# Selección y definición de características
+# Actualización de características numéricas basadas en los pasos de preprocesamiento observados
+numeric_features_updated = [
+    'src_port', 'dest_port', 'flow.pkts_toserver', 'flow.pkts_toclient', 
+    'flow.bytes_toserver', 'flow.bytes_toclient', 'flow_duration', 
+    'total_fwd_packets', 'total_bwd_packets', 'flow_iat_mean', 'flow_iat_std', 
+    'flow_iat_max', 'flow_iat_min', 'total_fwd_length', 'max_fwd_length', 
+    'min_fwd_length', 'mean_fwd_length', 'std_fwd_length', 'total_bwd_length', 
+    'max_bwd_length', 'min_bwd_length', 'mean_bwd_length', 'std_bwd_length', 
+    'min_packet_length', 'max_packet_length', 'mean_packet_length', 
+    'std_packet_length', 'var_packet_length', 'fwd_psh_flags', 'bwd_psh_flags', 
+    'fwd_urg_flags', 'bwd_urg_flags', 'active_mean', 'active_std', 'active_max', 
+    'active_min', 'idle_total', 'tcp_flag_FIN_count', 'tcp_flag_SYN_count', 
+    'tcp_flag_RST_count', 'tcp_flag_PSH_count', 'tcp_flag_ACK_count', 
+    'tcp_flag_URG_count', 'tcp_flag_ECE_count', 'tcp_flag_CWR_count'
+]
+
+# Verificación y posible actualización de características categóricas
+categorical_features_updated = [
+    'proto', 'tcp.flags', 'direction'  # Asumiendo que 'tcp.flags' es relevante y 'direction' fue calculada o relevante
+]
+
+# Características que calcula 'preprocesar_datos' por defecto: las que usa el modelo
+PIPELINE_FEATURES = numeric_features_updated + categorical_features_updated
+
+# Campos del evento que usa 'preprocesar_datos'; solo se extraen estos del JSON o, con caché, del Parquet
+PIPELINE_INPUT_COLUMNS = [
+    'timestamp', 'flow_id', 'event_type', 'proto', 'src_port', 'dest_port', 'flow.pkts_toserver',
+    'flow.pkts_toclient', 'flow.bytes_toserver', 'flow.bytes_toclient', 'tcp.flags'
+]
+
+# Versión del cálculo de características: incrementarla al cambiar 'preprocesar_datos' invalida las
+# características guardadas en el caché
+PIPELINE_VERSION = '3'
 
-from data_cleaning import clean_data
 
-def preprocesar_datos_y_ajustar_columnas(df_preprocesado, numeric_features_updated, categorical_features_updated):
+def preprocesar_datos_y_ajustar_columnas(df_preprocesado, numeric_features_updated, categorical_features_updated,
+                                          preprocesador=None, salida='densa'):
+    # Salida 'dispersa': 'preprocessor.FeatureMatrix' con el bloque numérico en float32 y el one-hot en CSR,
+    # sin pasar por un DataFrame denso float64
+    if salida == 'dispersa':
+        if preprocesador is None:
+            preprocesador = FittedPreprocessor.fit(df_preprocesado, numeric_features_updated, categorical_features_updated)
+        return preprocesador.transform_sparse(df_preprocesado)
+
+    # Con un preprocesador ya ajustado ('preprocessor.FittedPreprocessor') solo se transforma: la escala y las
+    # columnas de salida son las de la ventana de referencia y no dependen del lote
+    if preprocesador is not None:
+        return preprocesador.transform(df_preprocesado)
+
     # Eliminar de las listas las columnas que no están presentes en el DataFrame
     numeric_features_present = [col for col in numeric_features_updated if col in df_preprocesado.columns]
     categorical_features_present = [col for col in categorical_features_updated if col in df_preprocesado.columns]
 
+    # Solo se incluyen los transformadores con columnas: con una lista de características reducida una de
+    # las dos listas puede quedar vacía y su transformador no se ajustaría
+    transformers = [(name, transformer, columns) for name, transformer, columns in (
+        ('num', StandardScaler(), numeric_features_present),
+        ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features_present)
+    ) if columns]
+
     try:
         preprocessor = ColumnTransformer(
-            transformers=[
-                ('num', StandardScaler(), numeric_features_present),
-                ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features_present)
-            ],
-            remainder='drop'  # Descarta las columnas no especificadas
+            transformers=transformers,
+            remainder='drop',  # Descarta las columnas no especificadas
+            sparse_threshold=0  # Salida densa para poder construir el DataFrame
         )
         
         X_preprocessed = preprocessor.fit_transform(df_preprocesado)
         
-        columns_transformed = (
-            preprocessor.named_transformers_['num'].get_feature_names_out(numeric_features_present).tolist() +
-            preprocessor.named_transformers_['cat'].get_feature_names_out(categorical_features_present).tolist()
-        )
+        columns_transformed = [
+            name
+            for transformer_name, _, columns in transformers
+            for name in preprocessor.named_transformers_[transformer_name].get_feature_names_out(columns).tolist()
+        ]
         
         df_preprocessed = pd.DataFrame(X_preprocessed, columns=columns_transformed)
         
@@ -96,202 +151,235 @@ def review_transformed_data(df_preprocessed):
     except Exception as e:
         logging.error(f"Error al revisar datos transformados: {e}")
 
-def preprocesar_datos(df):
+def resolve_pipeline_stages(columns, caracteristicas=None):
+    """Etapas del registro que ejecuta 'preprocesar_datos' sobre eventos con las columnas 'columns'."""
+    return FEATURE_REGISTRY.resolve(PIPELINE_FEATURES if caracteristicas is None else caracteristicas, columns)
+
+
+def pipeline_sorts_rows(columns, caracteristicas=None):
+    """
+    True si 'preprocesar_datos' devuelve las filas ordenadas por flujo y timestamp; si no, las devuelve
+    en el orden de entrada.
+    """
+    return sorts_rows(resolve_pipeline_stages(columns, caracteristicas))
+
+
+def preprocesar_datos(df, estado_flujos=None, caracteristicas=None):
+    """
+    Calcula las características del modelo sobre los eventos de 'df'.
+
+    Con 'estado_flujos' (flow_state.FlowStateTable) las estadísticas por flujo se acumulan entre llamadas,
+    de modo que 'df' puede ser un micro-lote de un flujo de eventos en vivo.
+
+    Con 'caracteristicas' solo se ejecutan las etapas del registro ('feature_registry') que esas columnas
+    necesitan; por defecto, las del modelo ('PIPELINE_FEATURES').
+    """
     try:
-        logging.info("Calculando estadísticas IAT...")
-        iat_stats = calculate_iat_statistics(df)
-        df = df.merge(iat_stats, on='flow_id', how='left')
-        logging.info(f"DataFrame después de calcular estadísticas IAT y hacer merge: {df.columns}")
+        # Las etapas se resuelven y ordenan a partir de las columnas que declara cada una
+        logging.info("Calculando características...")
+        etapas = resolve_pipeline_stages(df.columns, caracteristicas)
+        df = FEATURE_REGISTRY.run(df, etapas, state=estado_flujos)
+
+        # Una sola limpieza de NaN e infinitos, solo sobre las columnas numéricas que crearon las etapas y
+        # los contadores del evento (nulos en los eventos sin campos 'flow.*')
+        with stage('limpieza_nan_inf', df) as recorder:
+            sanitize_columns(df, produced_columns(etapas) + list(EVENT_SCHEMA))
+            recorder.set_output(df)
+
+        return df
 
+    except Exception as e:
+        logging.error(f"Error durante el preprocesamiento de datos: {e}")
+        raise
+
+
+def main(ruta_eve=EVE_JSON_PATH, ruta_reporte=None, ruta_cache=None, procesos=1, ruta_preprocesador=None,
+         salida='densa', caracteristicas=None, ruta_memo=None, memo_limite_mb=1024, memo_ttl_horas=None,
+         trazar_memoria=False):
+    # Con una lista de características reducida solo se calculan sus etapas y el modelo usa solo esas columnas
+    numericas, categoricas = numeric_features_updated, categorical_features_updated
+    version = PIPELINE_VERSION
+    if caracteristicas is not None:
+        numericas = [col for col in numericas if col in caracteristicas]
+        categoricas = [col for col in categoricas if col in caracteristicas]
+        # Las características guardadas en el caché dependen también de la lista pedida
+        version = PIPELINE_VERSION + '-' + hashlib.sha1(','.join(sorted(caracteristicas)).encode()).hexdigest()[:8]
+    # Instrumentación opcional por etapa: un reporte JSON por lote en 'ruta_reporte'; con 'trazar_memoria'
+    # incluye el pico de asignaciones de cada etapa (tracemalloc, más lento)
+    instrumentacion = (run_report(batch_id=os.path.basename(ruta_eve), path=ruta_reporte, trace_allocations=trazar_memoria)
+                       if ruta_reporte else contextlib.nullcontext())
+    cache = EventCache(ruta_cache) if ruta_cache else None
+    # Almacén por flujo entre ejecuciones: solo se calculan los flujos nuevos o con eventos nuevos
+    memo = FlowFeatureStore(ruta_memo, max_bytes=int(memo_limite_mb * 2**20),
+                            ttl=memo_ttl_horas * 3600 if memo_ttl_horas else None) if ruta_memo else None
+    df_preprocesado = None
+    with instrumentacion:
         try:
-            logging.info("Procesando banderas TCP...")
-            df['tcp.flags'] = df.get('tcp.flags', pd.Series([None] * df.shape[0]))
-            df = count_tcp_flags_vectorized(df)
-            logging.info(f"DataFrame después de procesar banderas TCP: {df.columns}")
+            # Intenta cargar los datos, captura y maneja errores comunes
+            # Lectura por lotes con filtro de 'event_type' a nivel de bytes; cada línea se decodifica una sola vez
+            with stage('ingesta') as recorder:
+                if cache is None:
+                    # Solo se extraen del evento los campos que usa el pipeline, ya con su tipo compacto
+                    df = load_eve_events(ruta_eve, event_types=['flow', 'http', 'dns', 'tls'],
+                                         columns=PIPELINE_INPUT_COLUMNS)
+                else:
+                    # El JSON solo se decodifica la primera vez; después se reutilizan las características
+                    # de esta versión del pipeline o, si no existen, las columnas necesarias del Parquet
+                    # Si eve.json creció desde la última ejecución, solo se decodifica la cola nueva
+                    segmentos = cache.add_segment(ruta_eve, event_types=['flow', 'http', 'dns', 'tls'])
+                    segmento = segmentos[-1]
+                    df_preprocesado = cache.load_features(segmento, version)
+                    if df_preprocesado is None:
+                        df = cache.load_events(columns=PIPELINE_INPUT_COLUMNS, segments=segmentos)
+                    else:
+                        logging.info("Características del segmento %s leídas del caché.", segmento)
+                        df = df_preprocesado
+                recorder.set_output(df)
+            logging.info("Eventos cargados: %d filas, %.1f MB en memoria.", df.shape[0], memory_usage_mb(df))
+            print(df.head())
+        except FileNotFoundError:
+            logging.error("Archivo JSON no encontrado.")
+            raise SystemExit("Fallo crítico: Archivo de datos no encontrado.")
+        except json.JSONDecodeError:
+            logging.error("Error al decodificar el archivo JSON.")
+            raise SystemExit("Fallo crítico: Formato de archivo JSON inválido.")
         except Exception as e:
-            logging.critical(f"Fallo crítico durante el procesamiento de banderas TCP: {e}")
-            raise SystemExit("Fallo crítico durante el procesamiento de datos.")
-
-        logging.info("Convirtiendo timestamp a UNIX time...")
-        df['timestamp'] = pd.to_datetime(df['timestamp']).astype('int64') // 10**9
-        logging.info(f"DataFrame después de convertir timestamp a UNIX time: {df.columns}")
-
-        logging.info("Calculando duración de flujo y otros totales...")
-        grouped = df.groupby('flow_id')
-        df['flow_duration'] = grouped['timestamp'].transform('max') - grouped['timestamp'].transform('min')
-        df['total_fwd_packets'] = grouped['flow.pkts_toserver'].transform('sum')
-        df['total_bwd_packets'] = grouped['flow.pkts_toclient'].transform('sum')
-        df['total_bytes_toserver'] = grouped['flow.bytes_toserver'].transform('sum')
-        df['total_bytes_toclient'] = grouped['flow.bytes_toclient'].transform('sum')
-        logging.info(f"DataFrame después de calcular duración de flujo y otros totales: {df.columns}")
-
-        logging.info("Asegurando y calculando estadísticas básicas de longitud de paquete...")
-        df = ensure_and_calculate_packet_stats(df)
-        logging.info(f"DataFrame después de asegurar y calcular estadísticas básicas de longitud de paquete: {df.columns}")
-
-
-        logging.info("Calculando estadísticas de longitud de paquete...")
-        packet_stats = calculate_basic_packet_stats(df)
-
-        if not packet_stats.empty:
-            # Debugging: imprimir las columnas de ambos DataFrames antes del merge
-            logging.debug(f"Columnas en df antes del merge: {df.columns.tolist()}")
-            logging.debug(f"Columnas en packet_stats antes del merge: {packet_stats.columns.tolist()}")
-
-            # Preparar una lista de columnas en packet_stats que ya existen en df
-            overlapping_columns = [col for col in packet_stats.columns if col in df.columns and col != 'flow_id']
-            if overlapping_columns:
-                # Añadir sufijos únicamente a las columnas en packet_stats que se solapan, excepto 'flow_id'
-                rename_mapping = {col: f"{col}_stats" for col in overlapping_columns}
-                packet_stats.rename(columns=rename_mapping, inplace=True)
-                logging.debug(f"Columnas en packet_stats después de renombrar para evitar solapamientos: {packet_stats.columns.tolist()}")
-
-            # Realizar el merge
-            df = df.merge(packet_stats, on='flow_id', how='left')
-            logging.info("Estadísticas de longitud de paquete calculadas y fusionadas con éxito.")
-        else:
-            logging.warning("La función calculate_basic_packet_length_stats devolvió un DataFrame vacío.")
+            logging.error(f"Error inesperado al cargar datos: {e}")
+            raise SystemExit("Fallo crítico: Error inesperado al cargar datos.")
+
+        # Preprocesamiento de datos con manejo de errores
+        if df_preprocesado is None:
+            def calcular(eventos):
+                if procesos > 1:
+                    # Import local: parallel_pipeline depende de este módulo
+                    from parallel_pipeline import parallel_preprocess
+                    return parallel_preprocess(eventos, n_workers=procesos, caracteristicas=caracteristicas)
+                return preprocesar_datos(eventos, caracteristicas=caracteristicas)
+
+            try:
+                df_preprocesado = calcular(df) if memo is None else memo.preprocess(
+                    df, calcular, version, sorted_by_flow=pipeline_sorts_rows(df.columns, caracteristicas))
+            except Exception as e:
+                logging.critical("Fallo crítico durante el preprocesamiento. El programa terminará.")
+                raise SystemExit(e)
+            if cache is not None:
+                cache.store_features(segmento, version, df_preprocesado)
+
+        # Función de limpieza de datos actualizada para incluir características actualizadas
+        with stage('limpieza', df_preprocesado):
+            clean_data(df_preprocesado, numericas, categoricas)
+
+        preprocesador = None
+        if ruta_preprocesador:
+            if os.path.exists(ruta_preprocesador):
+                preprocesador = FittedPreprocessor.load(ruta_preprocesador, version)
+            else:
+                # Primera ejecución: este lote es la ventana de referencia del ajuste
+                logging.info("Ajustando el preprocesador y guardándolo en %s.", ruta_preprocesador)
+                preprocesador = FittedPreprocessor.fit(df_preprocesado, numericas, categoricas, version)
+                preprocesador.save(ruta_preprocesador)
+
+        with stage('ajuste_columnas', df_preprocesado) as recorder:
+            df_preprocesado = preprocesar_datos_y_ajustar_columnas(df_preprocesado, numericas, categoricas,
+                                                                   preprocesador, salida)
+            recorder.set_output(df_preprocesado)
+
+    # Verificación de la limpieza de los datos
+    """ verify_data_cleanliness(df_preprocesado, numeric_features_updated)
 
-        # Debugging: imprimir las columnas de df después del merge para verificar cambios
-        logging.info(f"DataFrame después de añadir estadísticas de longitud de paquete: {df.columns}")
 
 
-        logging.info("Calculando estadísticas avanzadas de TCP y dirección de paquete...")
-        # Aquí imprimimos el DataFrame antes de pasarlo a calculate_tcp_advanced_stats
-        logging.info(f"DataFrame antes de calcular estadísticas avanzadas de TCP: {df.columns}")
-        df = calculate_tcp_advanced_stats(df)
-        logging.info(f"DataFrame después de calcular estadísticas avanzadas de TCP: {df.columns}")
 
-        # Agregar la dirección de los paquetes al DataFrame
-        df = add_packet_direction(df)
+    try:
+        preprocessor = ColumnTransformer(
+            transformers=[
+                ('num', StandardScaler(), numeric_features_updated),
+                ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features_updated)
+            ],
+            remainder='drop'  # Descarta las columnas no especificadas
+        )
+
+        # Verificar si todas las columnas especificadas existen en el DataFrame
+        missing_num = [col for col in numeric_features_updated if col not in df_preprocesado.columns]
+        missing_cat = [col for col in categorical_features_updated if col not in df_preprocesado.columns]
 
-        # Calcular las estadísticas de los paquetes
-        packet_stats_df = calculate_packet_stats(df)
+        if missing_num or missing_cat:
+            raise ValueError(f"Columnas numéricas faltantes: {missing_num}, Columnas categóricas faltantes: {missing_cat}")
 
-        # Realizar el merge, utilizando sufijos explícitos para manejar posibles columnas duplicadas
-        # Esto te ayuda a identificar y diferenciar las columnas de cada DataFrame original después del merge
-        df_merged = pd.merge(df, packet_stats_df, on='flow_id', how='left', suffixes=('', '_stats'))
+        X_preprocessed = preprocessor.fit_transform(df_preprocesado)
 
+        columns_transformed = (
+            preprocessor.named_transformers_['num'].get_feature_names_out(numeric_features_updated).tolist() +
+            preprocessor.named_transformers_['cat'].get_feature_names_out(categorical_features_updated).tolist()
+        )
 
-        return df_merged
+        df_preprocessed = pd.DataFrame(X_preprocessed, columns=columns_transformed)
 
+    except ValueError as ve:
+        logging.error(f"Error de valor durante el preprocesamiento: {ve}")
+        raise SystemExit("Fallo crítico durante el preprocesamiento.")
     except Exception as e:
-        logging.error(f"Error durante el preprocesamiento de datos: {e}")
-        raise
+        logging.error(f"Error inesperado durante el preprocesamiento: {e}")
+        raise SystemExit("Fallo crítico inesperado durante el preprocesamiento.")
+     """
+    if isinstance(df_preprocesado, FeatureMatrix):
+        print("\nMatriz de características dispersa:", df_preprocesado.shape,
+              f"({df_preprocesado.nbytes / 2**20:.2f} MB, {df_preprocesado.categorical.nnz} valores one-hot no nulos)")
+        print("\nColumnas obtenidas al final:\n", df_preprocesado.feature_names)
+        return
+
+    # Revisión de los datos transformados/preprocesados
+    try:
+        review_transformed_data(df_preprocesado)
+        print("\nTotal de columnas obtenidas al final:", len(df_preprocesado.columns))
+        print("\nColumnas obtenidas al final:\n", df_preprocesado.columns.tolist())
 
 
-try:
-    # Intenta cargar los datos, captura y maneja errores comunes
-    with open('../../../var/log/suricata/eve.json', 'r') as file:
-        lines = file.readlines()
-        data = [json.loads(line) for line in lines if json.loads(line).get('event_type', '') in ['flow', 'http', 'dns', 'tls']]
-    df = pd.json_normalize(data)
-    print(df.head())
-except FileNotFoundError:
-    logging.error("Archivo JSON no encontrado.")
-    raise SystemExit("Fallo crítico: Archivo de datos no encontrado.")
-except json.JSONDecodeError:
-    logging.error("Error al decodificar el archivo JSON.")
-    raise SystemExit("Fallo crítico: Formato de archivo JSON inválido.")
-except Exception as e:
-    logging.error(f"Error inesperado al cargar datos: {e}")
-    raise SystemExit("Fallo crítico: Error inesperado al cargar datos.")
-
-# Preprocesamiento de datos con manejo de errores
-try:
-    df_preprocesado = preprocesar_datos(df)
-except Exception as e:
-    logging.critical("Fallo crítico durante el preprocesamiento. El programa terminará.")
-    raise SystemExit(e)
+        # Información del DataFrame
+        print("\nInformación del DataFrame al final del preprocesamiento:")
+        print(df_preprocesado.info())
 
-# Selección y definición de características
-# Actualización de características numéricas basadas en los pasos de preprocesamiento observados
-numeric_features_updated = [
-    'src_port', 'dest_port', 'flow.pkts_toserver', 'flow.pkts_toclient', 
-    'flow.bytes_toserver', 'flow.bytes_toclient', 'flow_duration', 
-    'total_fwd_packets', 'total_bwd_packets', 'flow_iat_mean', 'flow_iat_std', 
-    'flow_iat_max', 'flow_iat_min', 'total_fwd_length', 'max_fwd_length', 
-    'min_fwd_length', 'mean_fwd_length', 'std_fwd_length', 'total_bwd_length', 
-    'max_bwd_length', 'min_bwd_length', 'mean_bwd_length', 'std_bwd_length', 
-    'min_packet_length', 'max_packet_length', 'mean_packet_length', 
-    'std_packet_length', 'var_packet_length', 'fwd_psh_flags', 'bwd_psh_flags', 
-    'fwd_urg_flags', 'bwd_urg_flags', 'active_mean', 'active_std', 'active_max', 
-    'active_min', 'idle_total', 'tcp_flag_FIN_count', 'tcp_flag_SYN_count', 
-    'tcp_flag_RST_count', 'tcp_flag_PSH_count', 'tcp_flag_ACK_count', 
-    'tcp_flag_URG_count', 'tcp_flag_ECE_count', 'tcp_flag_CWR_count'
-]
+        # Estadísticas descriptivas
+        print(df_preprocesado.describe())
 
-# Verificación y posible actualización de características categóricas
-categorical_features_updated = [
-    'proto', 'tcp.flags', 'direction'  # Asumiendo que 'tcp.flags' es relevante y 'direction' fue calculada o relevante
-]
+        # Asegúrate de que 'df_preprocesado' sea el DataFrame final tras el preprocesamiento
+        # Con una lista de características reducida solo se resumen las columnas seleccionadas que se pidieron
+        seleccionadas = [col for col in ['src_port', 'dest_port', 'flow.pkts_toserver', 'flow.pkts_toclient', 'flow_duration']
+                         if col in df_preprocesado.columns]
+        if seleccionadas:
+            print("\nResumen estadístico enfocado en la duración del flujo y otras columnas seleccionadas:")
+            print(df_preprocesado[seleccionadas].describe())
 
 
-# Función de limpieza de datos actualizada para incluir características actualizadas
-clean_data(df_preprocesado, numeric_features_updated, categorical_features_updated)
-
-df_preprocesado = preprocesar_datos_y_ajustar_columnas(df_preprocesado, numeric_features_updated, categorical_features_updated)
-
-
-# Verificación de la limpieza de los datos
-""" verify_data_cleanliness(df_preprocesado, numeric_features_updated)
-
-
-
-
-try:
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('num', StandardScaler(), numeric_features_updated),
-            ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features_updated)
-        ],
-        remainder='drop'  # Descarta las columnas no especificadas
-    )
-    
-    # Verificar si todas las columnas especificadas existen en el DataFrame
-    missing_num = [col for col in numeric_features_updated if col not in df_preprocesado.columns]
-    missing_cat = [col for col in categorical_features_updated if col not in df_preprocesado.columns]
-    
-    if missing_num or missing_cat:
-        raise ValueError(f"Columnas numéricas faltantes: {missing_num}, Columnas categóricas faltantes: {missing_cat}")
-    
-    X_preprocessed = preprocessor.fit_transform(df_preprocesado)
-    
-    columns_transformed = (
-        preprocessor.named_transformers_['num'].get_feature_names_out(numeric_features_updated).tolist() +
-        preprocessor.named_transformers_['cat'].get_feature_names_out(categorical_features_updated).tolist()
-    )
-    
-    df_preprocessed = pd.DataFrame(X_preprocessed, columns=columns_transformed)
-    
-except ValueError as ve:
-    logging.error(f"Error de valor durante el preprocesamiento: {ve}")
-    raise SystemExit("Fallo crítico durante el preprocesamiento.")
-except Exception as e:
-    logging.error(f"Error inesperado durante el preprocesamiento: {e}")
-    raise SystemExit("Fallo crítico inesperado durante el preprocesamiento.")
- """
-# Revisión de los datos transformados/preprocesados
-try:
-    review_transformed_data(df_preprocesado)
-    print("\nTotal de columnas obtenidas al final:", len(df_preprocesado.columns))
-    print("\nColumnas obtenidas al final:\n", df_preprocesado.columns.tolist())
-    
-    
-    # Información del DataFrame
-    print("\nInformación del DataFrame al final del preprocesamiento:")
-    print(df_preprocesado.info())
-
-    # Estadísticas descriptivas
-    print(df_preprocesado.describe())
-
-    # Asegúrate de que 'df_preprocesado' sea el DataFrame final tras el preprocesamiento
-    print("\nResumen estadístico enfocado en la duración del flujo y otras columnas seleccionadas:")
-    print(df_preprocesado[['src_port', 'dest_port', 'flow.pkts_toserver', 'flow.pkts_toclient', 'flow_duration']].describe())
-
-
-    # Asegúrate de reemplazar `df_preprocesado` con el nombre correcto de tu DataFrame final.
-
-except Exception as e:
-    logging.error(f"Error durante la revisión de los datos transformados/preprocesados: {e}")
-    # Este error podría no ser crítico pero requiere revisión
\ No newline at end of file
+        # Asegúrate de reemplazar `df_preprocesado` con el nombre correcto de tu DataFrame final.
+
+    except Exception as e:
+        logging.error(f"Error durante la revisión de los datos transformados/preprocesados: {e}")
+        # Este error podría no ser crítico pero requiere revisión
+
+
+if __name__ == "__main__":
+    # Configuración básica de logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Preprocesa eventos de Suricata para el modelo de detección.")
+    parser.add_argument('eve', nargs='?', default=EVE_JSON_PATH, help="Ruta del eve.json.")
+    parser.add_argument('--reporte', default=None, help="Archivo JSONL donde escribir el reporte de tiempos y memoria por etapa.")
+    parser.add_argument('--trazar-memoria', action='store_true',
+                        help="Con --reporte, añade el pico de asignaciones de cada etapa medido con tracemalloc (más lento).")
+    parser.add_argument('--cache', default=None, help="Directorio del caché Parquet de eventos y características.")
+    parser.add_argument('--procesos', type=int, default=1, help="Procesos para calcular las características por shards de flow_id.")
+    parser.add_argument('--preprocesador', default=None,
+                        help="Artefacto JSON del escalado/codificación: se carga si existe; si no, se ajusta con este lote y se guarda.")
+    parser.add_argument('--salida', choices=['densa', 'dispersa'], default='densa',
+                        help="'dispersa': bloque numérico float32 y one-hot en CSR, sin densificar.")
+    parser.add_argument('--caracteristicas', nargs='+', default=None,
+                        help="Calcula solo estas características (y las etapas que necesitan) en lugar de todas las del modelo.")
+    parser.add_argument('--memo', default=None,
+                        help="Directorio del almacén de características por flujo; los flujos sin cambios no se recalculan.")
+    parser.add_argument('--memo-limite-mb', type=float, default=1024, help="Tamaño máximo del almacén en MB.")
+    parser.add_argument('--memo-ttl-horas', type=float, default=None,
+                        help="Horas sin uso tras las que se expulsa un segmento del almacén.")
+    args = parser.parse_args()
+    main(args.eve, args.reporte, args.cache, args.procesos, args.preprocesador, args.salida, args.caracteristicas,
+         args.memo, args.memo_limite_mb, args.memo_ttl_horas, args.trazar_memoria)
@@ -17,30 +17,34 @@ from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.pipeline import Pipeline
+import joblib
 import os
 
+from training_cache import ensure_training_cache
+
 archivo_csv = 'DarknetFinal.csv'
+# Modelo entrenado, para servirlo con scoring_service.py sin volver a ajustarlo
+archivo_modelo = 'modelo_rf.joblib'
+# Caché binario del CSV (ver training_cache.py); se reconstruye solo si el CSV cambia
+directorio_cache = 'DarknetFinal.cache'
+columnas_entrenamiento = None
 if not os.path.isfile(archivo_csv):
     raise FileNotFoundError(f"El archivo {archivo_csv} no se encontró.")
 
 try:
-    dataframe = pd.read_csv(archivo_csv)
-    
-    # Reemplaza infinitos por NaNs para una correcta imputación
-    dataframe.replace([np.inf, -np.inf], np.nan, inplace=True)
-
-    if 'Label' not in dataframe.columns:
-        raise ValueError("La columna 'Label' no se encuentra en el DataFrame.")
-
     columns_to_drop = ['Label', 'Flow ID', 'Timestamp', 'Src IP', 'Dst IP', 'Label.1']
 
-    y = dataframe['Label']
-    X = dataframe.drop(columns=columns_to_drop, errors='ignore')
+    # El CSV se convierte una vez a un caché binario (float32, infinitos ya como NaN, etiqueta ya
+    # factorizada); las ejecuciones siguientes lo mapean en memoria en lugar de volver a leer el texto
+    cache = ensure_training_cache(archivo_csv, directorio_cache, label='Label', exclude=columns_to_drop)
 
-    y, _ = pd.factorize(y)
+    # None usa todas las columnas; una lista limita el entrenamiento (y la lectura) a esas columnas
+    X = cache.frame(columnas_entrenamiento)
+    y = np.asarray(cache.labels())
+    etiquetas = pd.Index(cache.classes)
 
-    categorical_features = X.select_dtypes(include=['object']).columns.tolist()
-    numerical_features = X.select_dtypes(exclude=['object']).columns.tolist()
+    categorical_features = [col for col in X.columns if col in cache.categorical_columns]
+    numerical_features = [col for col in X.columns if col in cache.numeric_columns]
 
     categorical_transformer = OneHotEncoder(handle_unknown='ignore')
     numerical_imputer = SimpleImputer(strategy='mean')
@@ -66,6 +70,10 @@ try:
     rf_accuracy = pipeline.score(X_test, y_test)
     print(f"Accuracy of Random Forest: {rf_accuracy}")
 
+    # Se guardan las etiquetas originales junto al pipeline: el modelo predice sus códigos de factorize
+    joblib.dump({'pipeline': pipeline, 'labels': etiquetas.tolist()}, archivo_modelo)
+    print(f"Modelo guardado en {archivo_modelo}")
+
 except FileNotFoundError as e:
     print(e)
 except ValueError as e:
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+# Tipos compactos de cada columna que usa el pipeline. Los contadores y puertos usan enteros con
+# nulos de pandas porque los eventos http/dns/tls no traen los campos 'flow.*' ni siempre puertos.
+EVENT_SCHEMA = {
+    'timestamp': 'int64',              # microsegundos desde epoch (UTC)
+    'flow_id': 'int64',
+    'event_type': 'category',
+    'proto': 'category',
+    'src_port': 'UInt16',
+    'dest_port': 'UInt16',
+    'flow.pkts_toserver': 'UInt32',
+    'flow.pkts_toclient': 'UInt32',
+    'flow.bytes_toserver': 'UInt64',
+    'flow.bytes_toclient': 'UInt64',
+    'tcp.flags': 'UInt8',
+    'flow.age': 'UInt32',
+    'http.status': 'UInt16',
+    'http.length': 'UInt64',
+    # Texto de baja cardinalidad: cada valor distinto se guarda una sola vez
+    'host': 'category',
+    'in_iface': 'category',
+    'flow.alerted': 'category',
+    'src_ip': 'category',
+    'dest_ip': 'category',
+    'app_proto': 'category',
+    'flow.state': 'category',
+    'flow.reason': 'category',
+    'tcp.tcp_flags': 'category',
+    'tcp.tcp_flags_ts': 'category',
+    'tcp.tcp_flags_tc': 'category',
+    'http.http_method': 'category',
+    'dns.type': 'category',
+    'dns.rrtype': 'category',
+    'tls.version': 'category',
+}
+
+# Tipos de las columnas que crean las etapas de características
+DIRECTION_DTYPE = pd.CategoricalDtype(['forward', 'backward'])
+FLAG_DTYPE = 'uint8'
+
+
+def to_epoch_us(timestamps):
+    """
+    Convierte marcas de tiempo (texto ISO de Suricata, datetime o enteros ya en microsegundos) a int64
+    en microsegundos desde epoch.
+    """
+    timestamps = timestamps if isinstance(timestamps, pd.Series) else pd.Series(timestamps)
+    if pd.api.types.is_integer_dtype(timestamps):
+        return timestamps.astype('int64')
+    # Suricata escribe ISO 8601 ('2024-01-01T00:00:00.000000+0000'); fijar el formato evita inferirlo
+    converted = pd.to_datetime(timestamps, utc=True, format='ISO8601')
+    if converted.isna().any():
+        raise ValueError("La columna 'timestamp' contiene valores nulos o no interpretables.")
+    return pd.Series(converted.dt.as_unit('us').to_numpy(dtype='int64'), index=timestamps.index, name=timestamps.name)
+
+
+def _to_integer(series, dtype):
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series, errors='coerce')
+    if dtype == 'int64' and series.isna().any():
+        # Sin valores nulos se usa el entero de numpy; con nulos, su equivalente con máscara
+        dtype = 'Int64'
+    if series.dtype == 'float64' and dtype[0] in 'UI':
+        # json_normalize deja los contadores como float64 con NaN: se construye la máscara directamente,
+        # mucho más rápido que 'astype' sobre el tipo con nulos
+        values = series.to_numpy()
+        mask = np.isnan(values)
+        data = np.where(mask, 0, values).astype(pd.api.types.pandas_dtype(dtype).numpy_dtype)
+        if np.array_equal(data, np.where(mask, 0, values)):
+            return pd.Series(pd.arrays.IntegerArray(data, mask), index=series.index, name=series.name)
+    return series.astype(dtype)
+
+
+def apply_schema(df, schema=EVENT_SCHEMA):
+    """
+    Convierte en el lugar las columnas presentes en 'df' a los tipos declarados en 'schema'.
+
+    Es idempotente: aplicarlo sobre un DataFrame ya convertido no cambia nada.
+
+    Parámetros:
+    - df (pandas.DataFrame): Eventos normalizados.
+    - schema (dict): Columna -> tipo ('int64', 'UInt16', 'category', ...).
+
+    Retorna:
+    - El mismo DataFrame con los tipos aplicados.
+    """
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if column == 'timestamp':
+            df[column] = to_epoch_us(series)
+        elif column == 'tcp.flags' and not pd.api.types.is_numeric_dtype(series):
+            # Import local para evitar un ciclo: kernels no depende del esquema
+            from kernels import parse_hex_flags
+            df[column] = pd.array(parse_hex_flags(series), dtype='Float64').astype(dtype)
+        elif dtype == 'category':
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[column] = series.astype('category')
+        elif str(series.dtype) != dtype:
+            df[column] = _to_integer(series, dtype)
+    return df
+
+
+def fill_missing(df, value=0):
+    """
+    Equivalente a 'df.fillna(value, inplace=True)' que no toca las columnas categóricas del esquema:
+    sus nulos se conservan para que la limpieza los reemplace por la moda.
+    """
+    columns = [column for column in df.columns if not isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if len(columns) == df.shape[1]:
+        df.fillna(value, inplace=True)
+    elif columns:
+        df[columns] = df[columns].fillna(value)
+    return df
+
+
+def sanitize_columns(df, columns, value=0):
+    """
+    Reemplaza en el lugar NaN e infinitos por 'value', solo en las columnas numéricas de 'columns'.
+
+    Sustituye a 'df.replace([np.inf, -np.inf, np.nan], value)' sobre el DataFrame completo: no recorre
+    columnas de texto ni categóricas, salta los enteros de numpy (no pueden tener nulos) y en las columnas
+    float solo escribe las posiciones no finitas.
+
+    Parámetros:
+    - df (pandas.DataFrame): DataFrame a limpiar.
+    - columns (iterable): Columnas candidatas, normalmente las que declaró como nuevas cada etapa; las
+      ausentes se omiten.
+    - value: Valor de reemplazo.
+
+    Retorna:
+    - El mismo DataFrame.
+    """
+    for column in dict.fromkeys(columns):
+        if column not in df.columns:
+            continue
+        series = df[column]
+        dtype = series.dtype
+        if not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+            continue
+        if isinstance(dtype, np.dtype) and dtype.kind in 'iu':
+            continue
+        if dtype.kind == 'f':
+            numpy_float = isinstance(dtype, np.dtype)
+            values = series.to_numpy() if numpy_float else series.to_numpy(dtype='float64', na_value=np.nan)
+            invalid = ~np.isfinite(values)
+            if invalid.any():
+                values = np.where(invalid, value, values).astype(values.dtype, copy=False)
+                df[column] = values if numpy_float else pd.array(values, dtype=dtype)
+        elif series.hasnans:
+            # Enteros con máscara: solo pueden tener nulos, no infinitos
+            df[column] = series.fillna(value)
+    return df
+
+
+def memory_usage_mb(df):
+    """Memoria ocupada por el DataFrame en MB, incluyendo el contenido de las columnas de texto."""
+    return float(df.memory_usage(deep=True).sum()) / 2**20
@@ -0,0 +1,440 @@
+import argparse
+import collections
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Ruta por defecto del modelo que guarda prototype.pyw
+MODEL_PATH = 'modelo_rf.joblib'
+
+
+def load_model(path):
+    """
+    Carga el modelo guardado por prototype.pyw.
+
+    El archivo es un pickle de joblib: solo deben cargarse modelos de origen confiable.
+
+    Retorna:
+    - Una tupla (pipeline de scikit-learn, nombres de las etiquetas o None si no se guardaron).
+    """
+    data = joblib.load(path)
+    if isinstance(data, dict):
+        return data['pipeline'], data.get('labels')
+    return data, None
+
+
+def frame_to_payload(features):
+    """Serializa filas de características al cuerpo JSON que espera el servicio ('orient=split')."""
+    return features.to_json(orient='split', index=False)
+
+
+def payload_to_frame(payload):
+    """Inversa de 'frame_to_payload'; acepta también una lista de registros {columna: valor}."""
+    if isinstance(payload, list):
+        return pd.DataFrame.from_records(payload)
+    return pd.DataFrame(payload['data'], columns=payload['columns'])
+
+
+class LatencyTracker:
+    """
+    Latencias de las últimas 'window' solicitudes (desde que llegan a la cola hasta que tienen
+    resultado) y throughput desde el arranque.
+    """
+
+    def __init__(self, window=10000):
+        self.latencies = collections.deque(maxlen=window)
+        self.started = time.time()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.batch_rows = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record_batch(self, latencies, rows):
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.requests += len(latencies)
+            self.rows += rows
+            self.batches += 1
+            self.batch_rows += rows
+
+    def record_error(self, requests):
+        with self.lock:
+            self.errors += requests
+
+    def snapshot(self):
+        with self.lock:
+            latencies = np.array(self.latencies)
+            elapsed = time.time() - self.started
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1e3 if len(latencies) else (None, None)
+            return {
+                'requests': self.requests,
+                'rows': self.rows,
+                'batches': self.batches,
+                'errors': self.errors,
+                'mean_batch_rows': round(self.batch_rows / self.batches, 1) if self.batches else None,
+                'p50_ms': round(float(p50), 3) if p50 is not None else None,
+                'p99_ms': round(float(p99), 3) if p99 is not None else None,
+                'rows_per_s': round(self.rows / elapsed, 1) if elapsed > 0 else None,
+                'requests_per_s': round(self.requests / elapsed, 1) if elapsed > 0 else None,
+            }
+
+
+class MicroBatchScorer:
+    """
+    Agrupa las solicitudes concurrentes en micro-lotes y las puntúa con una sola llamada al modelo.
+
+    Un micro-lote se cierra al reunir 'max_batch_rows' filas o cuando su primera solicitud lleva
+    'max_wait' segundos esperando, lo que ocurra antes: 'max_wait' es el presupuesto de latencia que se
+    cede a cambio de amortizar el coste fijo de 'predict_proba' (recorrer los árboles del bosque una vez
+    por lote y no por fila). Un solo hilo llama al modelo.
+
+    Las filas se alinean con las columnas de ajuste del modelo ('feature_names_in_'): las columnas de más
+    se descartan y las que falten llegan como NaN (el 'SimpleImputer' de prototype.pyw las imputa). Una
+    solicitud que no trae al menos 'min_column_fraction' de las columnas del modelo se rechaza con
+    ValueError (HTTP 400): imputarlas todas daría la misma predicción para cualquier fila. Las columnas
+    numéricas llegan al modelo como float64 y las categóricas (las que el 'ColumnTransformer' envía a un
+    codificador) como objeto.
+
+    Solo se pueden servir filas con las mismas columnas con que se entrenó el modelo. Los modelos de
+    prototype.pyw e incremental_training se entrenan con las columnas CIC de DarknetFinal.csv ('Flow
+    Duration', 'Src Port'...), no con las de 'preprocesar_datos' ('flow_duration', 'src_port'...): para
+    puntuar la salida de eve_follow o eve_receiver hace falta un modelo entrenado con esas columnas.
+    """
+
+    def __init__(self, model, labels=None, max_batch_rows=1024, max_wait=0.005, metrics_interval=30.0,
+                 min_column_fraction=0.5):
+        self.model = model
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self.min_column_fraction = min_column_fraction
+        self.metrics_interval = metrics_interval
+        self.columns = list(getattr(model, 'feature_names_in_', [])) or None
+        self.categorical_columns = _encoded_columns(model) if self.columns else []
+        self.numeric_columns = [column for column in self.columns or [] if column not in self.categorical_columns]
+        classes = getattr(model, 'classes_', None)
+        if classes is not None and labels is not None:
+            classes = [labels[code] for code in classes]
+        self.classes = None if classes is None else [_json_scalar(value) for value in classes]
+        self.metrics = LatencyTracker()
+        self._queue = queue.Queue()
+        self._warned_missing = False
+        self._worker = threading.Thread(target=self._run, name='micro-batch-scorer', daemon=True)
+        self._worker.start()
+
+    def submit(self, features):
+        """
+        Encola filas de características para puntuarlas.
+
+        Retorna:
+        - Un 'concurrent.futures.Future' con {'labels': [...], 'probabilities': [[...]]}.
+        """
+        future = Future()
+        arrived = time.perf_counter()
+        try:
+            prepared = self._prepare(features)
+        except ValueError:
+            self.metrics.record_error(1)
+            raise
+        self._queue.put((prepared, len(features), arrived, future))
+        return future
+
+    def score(self, features, timeout=None):
+        """Puntúa las filas y espera el resultado (ver 'submit')."""
+        return self.submit(features).result(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _prepare(self, features):
+        """
+        Alinea las filas de una solicitud con las columnas del modelo: un bloque float64 con las numéricas y
+        un arreglo de objetos con las categóricas. Se hace en el hilo de la solicitud, así el hilo del modelo
+        solo apila bloques.
+        """
+        if self.columns is None:
+            return features
+        missing = [column for column in self.columns if column not in features.columns]
+        present = len(self.columns) - len(missing)
+        if present == 0 or present < self.min_column_fraction * len(self.columns):
+            raise ValueError(f"Las filas traen {present} de las {len(self.columns)} columnas del modelo (mínimo "
+                             f"{self.min_column_fraction:.0%}); faltan, entre otras: {missing[:10]}")
+        if missing and not self._warned_missing:
+            logging.warning("Faltan %d columnas del modelo en las filas recibidas (se imputan): %s",
+                            len(missing), missing[:10])
+            self._warned_missing = True
+        numeric = features.reindex(columns=self.numeric_columns)
+        for column in numeric.columns[numeric.dtypes == object]:
+            numeric[column] = pd.to_numeric(numeric[column], errors='coerce')
+        categorical = features.reindex(columns=self.categorical_columns)
+        return (numeric.to_numpy(dtype='float64', na_value=np.nan),
+                categorical.to_numpy(dtype=object, na_value=np.nan))
+
+    def _stack(self, prepared):
+        """Une los bloques de un micro-lote en un solo DataFrame con las columnas del modelo."""
+        if self.columns is None:
+            return prepared[0] if len(prepared) == 1 else pd.concat(prepared, ignore_index=True, sort=False)
+        features = pd.DataFrame(np.vstack([numeric for numeric, _ in prepared]), columns=self.numeric_columns)
+        if self.categorical_columns:
+            categorical = np.vstack([categorical for _, categorical in prepared])
+            for position, column in enumerate(self.categorical_columns):
+                features[column] = categorical[:, position]
+        return features[self.columns]
+
+    def _collect(self, first):
+        """Reúne solicitudes tras 'first' hasta llenar el lote o agotar el presupuesto de espera."""
+        batch = [first]
+        rows = first[1]
+        deadline = first[2] + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+            rows += item[1]
+        return batch
+
+    def _score_batch(self, batch):
+        features = self._stack([prepared for prepared, _, _, _ in batch])
+        probabilities = self.model.predict_proba(features)
+        codes = probabilities.argmax(axis=1)
+        labels = [self.classes[code] for code in codes] if self.classes is not None else codes.tolist()
+
+        finished = time.perf_counter()
+        offset = 0
+        for _, rows, _, future in batch:
+            end = offset + rows
+            future.set_result({'labels': labels[offset:end], 'probabilities': probabilities[offset:end].tolist()})
+            offset = end
+        self.metrics.record_batch([finished - arrived for _, _, arrived, _ in batch], len(features))
+
+    def _run(self):
+        last_log = time.time()
+        while True:
+            try:
+                first = self._queue.get(timeout=self.metrics_interval)
+            except queue.Empty:
+                first = False
+            if first is None:
+                return
+            if first:
+                batch = self._collect(first)
+                try:
+                    self._score_batch(batch)
+                except Exception as error:
+                    logging.error("Error al puntuar un micro-lote de %d solicitudes: %s", len(batch), error)
+                    self.metrics.record_error(len(batch))
+                    for _, _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(error)
+            if time.time() - last_log >= self.metrics_interval:
+                logging.info("Métricas del servicio de puntuación: %s", self.metrics.snapshot())
+                last_log = time.time()
+
+
+def _encoded_columns(model):
+    """Columnas que el 'ColumnTransformer' del pipeline envía a un codificador (categóricas)."""
+    steps = getattr(model, 'steps', [(None, model)])
+    for _, step in steps:
+        if hasattr(step, 'transformers_'):
+            return [column for _, transformer, columns in step.transformers_
+                    if type(transformer).__name__.endswith('Encoder') and not isinstance(columns, str)
+                    for column in columns]
+    return []
+
+
+def _json_scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def handle_payload(scorer, payload, timeout=None):
+    """Puntúa un cuerpo de solicitud ya decodificado y devuelve la respuesta como diccionario."""
+    result = scorer.score(payload_to_frame(payload), timeout)
+    result['classes'] = scorer.classes
+    return result
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    """POST /puntuar con filas en JSON ('frame_to_payload'); GET /metricas con latencias y throughput."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/metricas':
+            self._reply(200, self.server.scorer.metrics.snapshot())
+        else:
+            self._reply(404, {'error': 'ruta desconocida'})
+
+    def do_POST(self):
+        if self.path != '/puntuar':
+            self._reply(404, {'error': 'ruta desconocida'})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            self._reply(200, handle_payload(self.server.scorer, payload, self.server.timeout_s))
+        except (ValueError, KeyError, TypeError) as error:
+            self._reply(400, {'error': str(error)})
+        except Exception as error:
+            logging.error("Error en el servicio de puntuación: %s", error)
+            self._reply(500, {'error': str(error)})
+
+    def log_message(self, format, *args):
+        logging.debug("HTTP %s", format % args)
+
+
+class _UnixHandler(socketserver.StreamRequestHandler):
+    """Socket unix: una solicitud JSON por línea y una respuesta JSON por línea, en la misma conexión."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                payload = json.loads(line)
+                if payload == 'metricas':
+                    response = self.server.scorer.metrics.snapshot()
+                else:
+                    response = handle_payload(self.server.scorer, payload, self.server.timeout_s)
+            except Exception as error:
+                response = {'error': str(error)}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(scorer, host='127.0.0.1', port=8765, unix_path=None, timeout=30.0):
+    """
+    Crea el servidor del servicio: HTTP en 'host:port' o, con 'unix_path', un socket unix con JSON por línea.
+
+    Cada conexión se atiende en su propio hilo y todas comparten el mismo 'scorer', de modo que sus
+    solicitudes se agrupan en los mismos micro-lotes. Se arranca con 'serve_forever()'.
+    """
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = _UnixServer(unix_path, _UnixHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _HTTPHandler)
+        server.daemon_threads = True
+    server.scorer = scorer
+    server.timeout_s = timeout
+    return server
+
+
+class ScoringClient:
+    """
+    Cliente del servicio para el camino de características de processData ('preprocesar_datos' o
+    'eve_follow'): envía un DataFrame de filas y devuelve etiquetas y probabilidades.
+
+    'address' es 'http://host:puerto' o la ruta de un socket unix. La conexión se reutiliza entre llamadas.
+    Si el modelo del servicio no usa las columnas de 'features' (ver 'MicroBatchScorer'), 'score' lanza
+    ValueError.
+    """
+
+    def __init__(self, address, timeout=30.0):
+        self.address = address
+        self.timeout = timeout
+        self._connection = None
+
+    def _connect(self):
+        if self.address.startswith('http://'):
+            host, _, port = self.address[len('http://'):].rstrip('/').partition(':')
+            self._connection = http.client.HTTPConnection(host, int(port or 80), timeout=self.timeout)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            self._connection = sock.makefile('rwb')
+
+    def _request(self, method, path, body=None):
+        if self._connection is None:
+            self._connect()
+        if isinstance(self._connection, http.client.HTTPConnection):
+            self._connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+            response = json.loads(self._connection.getresponse().read())
+        else:
+            self._connection.write((body if body is not None else json.dumps('metricas')).encode() + b'\n')
+            self._connection.flush()
+            response = json.loads(self._connection.readline())
+        if isinstance(response, dict) and 'error' in response:
+            raise ValueError(f"El servicio de puntuación respondió con error: {response['error']}")
+        return response
+
+    def score(self, features):
+        """
+        Retorna:
+        - Un DataFrame con la columna 'label' y una columna de probabilidad por clase, alineado con 'features'.
+        """
+        response = self._request('POST', '/puntuar', frame_to_payload(features))
+        columns = [f'proba_{label}' for label in response['classes']] if response.get('classes') else None
+        result = pd.DataFrame(response['probabilities'], columns=columns, index=features.index)
+        result.insert(0, 'label', response['labels'])
+        return result
+
+    def metrics(self):
+        return self._request('GET', '/metricas')
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Servicio local de puntuación por micro-lotes con el modelo de prototype.pyw.")
+    parser.add_argument('modelo', nargs='?', default=MODEL_PATH, help="Modelo guardado por prototype.pyw.")
+    parser.add_argument('--puerto', type=int, default=8765, help="Puerto HTTP en localhost.")
+    parser.add_argument('--unix', default=None, help="Ruta de un socket unix (en lugar de HTTP).")
+    parser.add_argument('--lote-max', type=int, default=1024, help="Filas máximas por micro-lote.")
+    parser.add_argument('--espera-ms', type=float, default=5.0,
+                        help="Presupuesto de latencia: milisegundos máximos que una solicitud espera a completar su lote.")
+    parser.add_argument('--metricas', type=float, default=30.0, help="Segundos entre registros de métricas en el log.")
+    parser.add_argument('--columnas-min', type=float, default=0.5,
+                        help="Fracción mínima de las columnas del modelo que debe traer cada solicitud; si no, se rechaza.")
+    args = parser.parse_args()
+
+    pipeline, labels = load_model(args.modelo)
+    scorer = MicroBatchScorer(pipeline, labels, max_batch_rows=args.lote_max, max_wait=args.espera_ms / 1e3,
+                              metrics_interval=args.metricas, min_column_fraction=args.columnas_min)
+    server = create_server(scorer, port=args.puerto, unix_path=args.unix)
+    logging.info("Servicio de puntuación escuchando en %s.", args.unix or f'http://127.0.0.1:{args.puerto}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scorer.close()
+        logging.info("Métricas finales: %s", scorer.metrics.snapshot())
@@ -0,0 +1,168 @@
+import argparse
+import heapq
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+# Proporción de cada tipo de evento de Suricata en los datos sintéticos
+DEFAULT_EVENT_MIX = {'flow': 0.4, 'http': 0.2, 'dns': 0.2, 'tls': 0.1, 'alert': 0.1}
+
+# Distribución de banderas TCP (hexadecimal, como las escribe Suricata)
+DEFAULT_FLAG_DISTRIBUTION = {'1b': 0.35, '1f': 0.15, '02': 0.15, '12': 0.1, '14': 0.1, '04': 0.05, '19': 0.05, '18': 0.05}
+
+DEFAULT_START_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _weighted_picker(rng, distribution):
+    values = list(distribution)
+    weights = list(distribution.values())
+    return lambda: rng.choices(values, weights)[0]
+
+
+def _format_timestamp(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.%f') + '+0000'
+
+
+def _new_flow(rng, flow_number, start, events_per_flow):
+    if isinstance(events_per_flow, int):
+        n_events = events_per_flow
+    else:
+        n_events = rng.randint(*events_per_flow)
+    proto = rng.choice(('TCP', 'TCP', 'TCP', 'UDP'))
+    return {
+        'flow_id': (flow_number << 20) | rng.getrandbits(20),
+        'remaining': n_events,
+        'src_ip': f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+        'src_port': rng.randint(1024, 65535),
+        'dest_ip': f'192.0.2.{rng.randint(1, 254)}',
+        'dest_port': rng.choice((53, 80, 443, 22, 8080, 8443, 3389, rng.randint(1024, 65535))),
+        'proto': proto,
+        'start': start,
+    }
+
+
+def _build_event(rng, flow, event_type, moment, pick_flags):
+    event = {
+        'timestamp': _format_timestamp(moment),
+        'flow_id': flow['flow_id'],
+        'in_iface': 'eth0',
+        'event_type': event_type,
+        'src_ip': flow['src_ip'],
+        'src_port': flow['src_port'],
+        'dest_ip': flow['dest_ip'],
+        'dest_port': flow['dest_port'],
+        'proto': flow['proto'],
+    }
+    if event_type == 'flow':
+        pkts_toserver = rng.randint(1, 200)
+        pkts_toclient = rng.randint(0, 200)
+        event['flow'] = {
+            'pkts_toserver': pkts_toserver,
+            'pkts_toclient': pkts_toclient,
+            'bytes_toserver': pkts_toserver * rng.randint(40, 1500),
+            'bytes_toclient': pkts_toclient * rng.randint(40, 1500),
+            'start': _format_timestamp(flow['start']),
+            'end': _format_timestamp(moment),
+            'age': int((moment - flow['start']).total_seconds()),
+            'state': rng.choice(('established', 'closed', 'new')),
+            'reason': rng.choice(('timeout', 'shutdown')),
+            'alerted': False,
+        }
+        if flow['proto'] == 'TCP':
+            flags = pick_flags()
+            # El pipeline lee 'tcp.flags'; se escribe junto al 'tcp_flags' propio de Suricata
+            event['tcp'] = {'tcp_flags': flags, 'tcp_flags_ts': flags, 'tcp_flags_tc': pick_flags(), 'flags': flags}
+    elif event_type == 'http':
+        event['http'] = {'hostname': f'host{rng.randint(0, 999)}.example.com', 'url': f'/p/{rng.randint(0, 9999)}',
+                         'http_method': rng.choice(('GET', 'POST')), 'status': rng.choice((200, 301, 404, 500)),
+                         'length': rng.randint(0, 100000)}
+    elif event_type == 'dns':
+        event['dns'] = {'type': rng.choice(('query', 'answer')), 'rrname': f'name{rng.randint(0, 999)}.example.org',
+                        'rrtype': rng.choice(('A', 'AAAA', 'TXT'))}
+    elif event_type == 'tls':
+        event['tls'] = {'sni': f'site{rng.randint(0, 999)}.example.net', 'version': rng.choice(('TLS 1.2', 'TLS 1.3'))}
+    elif event_type == 'alert':
+        event['alert'] = {'signature_id': rng.randint(2000000, 2100000), 'signature': 'ET SYNTHETIC test',
+                          'severity': rng.randint(1, 3)}
+    return event
+
+
+def generate_eve_events(n_flows=1000, events_per_flow=(1, 8), event_mix=None, flag_distribution=None,
+                        seed=0, start_time=DEFAULT_START_TIME, flows_per_second=50.0, mean_gap_seconds=2.0,
+                        max_events=None):
+    """
+    Genera eventos sintéticos de Suricata de forma determinista y en orden de timestamp, como en eve.json.
+
+    Parámetros:
+    - n_flows (int): Número de flujos a generar.
+    - events_per_flow (int o tuple): Eventos por flujo, fijo o como rango (mínimo, máximo).
+    - event_mix (dict): Proporción de cada 'event_type'.
+    - flag_distribution (dict): Probabilidad de cada valor hexadecimal de banderas TCP.
+    - seed (int): Semilla; la misma semilla produce exactamente los mismos eventos.
+    - start_time (datetime): Marca de tiempo del primer flujo.
+    - flows_per_second (float): Tasa media de llegada de flujos nuevos.
+    - mean_gap_seconds (float): Separación media entre eventos de un mismo flujo.
+    - max_events (int, opcional): Corta la generación tras este número de eventos.
+
+    Retorna:
+    - Un generador de diccionarios con la estructura de eventos de eve.json.
+    """
+    rng = random.Random(seed)
+    pick_event_type = _weighted_picker(rng, event_mix or DEFAULT_EVENT_MIX)
+    pick_flags = _weighted_picker(rng, flag_distribution or DEFAULT_FLAG_DISTRIBUTION)
+
+    # Los flujos activos se intercalan con un heap por próxima marca de tiempo, así la memoria
+    # depende de los flujos concurrentes y no del total generado
+    pending = []
+    next_start = start_time
+    flows_created = 0
+    emitted = 0
+
+    while flows_created < n_flows or pending:
+        if flows_created < n_flows and (not pending or next_start <= pending[0][0]):
+            flow = _new_flow(rng, flows_created, next_start, events_per_flow)
+            heapq.heappush(pending, (next_start, flows_created, flow))
+            flows_created += 1
+            next_start += timedelta(seconds=rng.expovariate(flows_per_second))
+            continue
+
+        moment, order, flow = heapq.heappop(pending)
+        yield _build_event(rng, flow, pick_event_type(), moment, pick_flags)
+        emitted += 1
+        if max_events is not None and emitted >= max_events:
+            return
+
+        flow['remaining'] -= 1
+        if flow['remaining'] > 0:
+            heapq.heappush(pending, (moment + timedelta(seconds=rng.expovariate(1.0 / mean_gap_seconds)), order, flow))
+
+
+def write_eve_json(path, **kwargs):
+    """
+    Escribe los eventos de 'generate_eve_events' en formato eve.json (un JSON por línea).
+
+    Retorna:
+    - El número de eventos escritos.
+    """
+    written = 0
+    with open(path, 'w') as file:
+        for event in generate_eve_events(**kwargs):
+            file.write(json.dumps(event, separators=(',', ':')))
+            file.write('\n')
+            written += 1
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un eve.json sintético y determinista.")
+    parser.add_argument('output', help="Ruta del archivo a generar.")
+    parser.add_argument('--flows', type=int, default=1000)
+    parser.add_argument('--min-events', type=int, default=1)
+    parser.add_argument('--max-events-per-flow', type=int, default=8)
+    parser.add_argument('--max-events', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    total = write_eve_json(args.output, n_flows=args.flows, events_per_flow=(args.min_events, args.max_events_per_flow),
+                           seed=args.seed, max_events=args.max_events)
+    print(f"{total} eventos escritos en {args.output}")
@@ -2,8 +2,16 @@ import pandas as pd
 import numpy as np
 import logging
 
-# Configuración inicial del logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from kernels import masked_group_sum, safe_divide
+from schema import FLAG_DTYPE, sanitize_columns
+
+# Columnas nuevas que produce cada etapa; la limpieza de NaN e infinitos se aplica solo sobre ellas
+PACKET_RATE_COLUMNS = ['fwd_packets_s', 'bwd_packets_s']
+HEADER_LENGTH_COLUMNS = ['fwd_header_length_total', 'bwd_header_length_total']
+FLAG_COLUMNS = ['fwd_psh_flags', 'bwd_psh_flags', 'fwd_urg_flags', 'bwd_urg_flags']
+ACTIVE_IDLE_COLUMNS = ['active_time', 'active_mean', 'active_std', 'active_max', 'active_min', 'idle_total']
+TCP_ADVANCED_COLUMNS = PACKET_RATE_COLUMNS + HEADER_LENGTH_COLUMNS + FLAG_COLUMNS + ACTIVE_IDLE_COLUMNS
+
 
 def check_required_columns(df, required_columns):
     """
@@ -24,11 +32,8 @@ def calculate_packet_rates(df):
         check_required_columns(df, required_columns)
 
         # Realiza los cálculos asumiendo que las columnas necesarias existen
-        df['fwd_packets_s'] = np.where(df['flow_duration'] > 0, df['total_fwd_packets'] / df['flow_duration'], 0)
-        df['bwd_packets_s'] = np.where(df['flow_duration'] > 0, df['total_bwd_packets'] / df['flow_duration'], 0)
-
-        # Limpieza de datos para evitar NaN o infinitos
-        df.replace([np.inf, -np.inf, np.nan], 0, inplace=True)
+        df['fwd_packets_s'] = safe_divide(df['total_fwd_packets'], df['flow_duration'])
+        df['bwd_packets_s'] = safe_divide(df['total_bwd_packets'], df['flow_duration'])
 
         logging.info("Packet rates calculated successfully.")
     except ValueError as ve:
@@ -64,11 +69,11 @@ def calculate_flags(df):
             raise ValueError("'tcp.flags' column is missing.")
 
         # Intenta convertir 'tcp.flags' a enteros
-        df['tcp.flags'] = df['tcp.flags'].fillna(0).astype(int)
+        df['tcp.flags'] = df['tcp.flags'].fillna(0).astype(FLAG_DTYPE)
         # Continúa con el procesamiento después de la conversión exitosa
-        df['fwd_psh_flags'] = np.where(df['tcp.flags'] & 0x08, 1, 0)
+        df['fwd_psh_flags'] = ((df['tcp.flags'] & 0x08) > 0).astype(FLAG_DTYPE)
         df['bwd_psh_flags'] = df['fwd_psh_flags']
-        df['fwd_urg_flags'] = np.where(df['tcp.flags'] & 0x20, 1, 0)
+        df['fwd_urg_flags'] = ((df['tcp.flags'] & 0x20) > 0).astype(FLAG_DTYPE)
         df['bwd_urg_flags'] = df['fwd_urg_flags']
     except ValueError as ve:
         logging.error(f"Error calculating flags: {ve}")
@@ -109,18 +114,16 @@ def calculate_active_idle_times(df):
             active_std=('active_time', 'std'),
             active_max=('active_time', 'max'),
             active_min=('active_time', 'min'),
-            # Para calcular los tiempos inactivos, puedes sumar todos los 'time_diff' marcados como idle
-            # Ajusta estos cálculos según tus necesidades específicas
-            idle_total=('time_diff', lambda x: x[x > idle_threshold].sum()),
         ).reset_index()
+
+        # Para calcular los tiempos inactivos se suman todos los 'time_diff' marcados como idle
+        active_idle_stats['idle_total'] = masked_group_sum(df['time_diff'], df['is_idle'], df['flow_id']).to_numpy()
         
         # Fusionar las estadísticas calculadas de vuelta al DataFrame original
         df = df.merge(active_idle_stats, on='flow_id', how='left')
         
-        # Limpieza final: eliminar columnas temporales y llenar NaN con 0
+        # Limpieza final: eliminar columnas temporales; los NaN de 'ACTIVE_IDLE_COLUMNS' los limpia quien llama
         df.drop(columns=['time_diff', 'is_idle'], inplace=True)
-        df.fillna(0, inplace=True)
-        df.replace([np.inf, -np.inf, np.nan], 0, inplace=True)
 
         logging.info("Active and idle times calculated successfully.")
     except ValueError as ve:
@@ -145,7 +148,7 @@ def calculate_tcp_advanced_stats(df):
     # Llamar a calculate_active_idle_times para calcular estadísticas de tiempo activo e inactivo
     df = calculate_active_idle_times(df)
     
-    # Asegura que todas las nuevas columnas tengan valores válidos para evitar NaN o infinitos
-    df.replace([np.inf, -np.inf, np.nan], 0, inplace=True)
+    # Una sola limpieza de NaN e infinitos, solo sobre las columnas que crearon las etapas
+    sanitize_columns(df, TCP_ADVANCED_COLUMNS)
     
     return df
\ No newline at end of file
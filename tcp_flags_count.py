@@ -2,10 +2,25 @@ import pandas as pd
 import numpy as np
 import logging
 
+from kernels import parse_hex_flags
+from schema import FLAG_DTYPE
+
+# Máscaras de bits de las banderas TCP
+TCP_FLAGS = {
+    'FIN': 0x01,
+    'SYN': 0x02,
+    'RST': 0x04,
+    'PSH': 0x08,
+    'ACK': 0x10,
+    'URG': 0x20,
+    'ECE': 0x40,
+    'CWR': 0x80,
+}
+
 def convert_tcp_flags_to_numeric(df):
     if 'tcp.flags' in df.columns:
-        df['tcp.flags'] = pd.to_numeric(df['tcp.flags'].apply(lambda x: int(x, 16) if pd.notnull(x) else np.nan), errors='coerce')
-        df['tcp.flags'] = df['tcp.flags'].fillna(0).astype(int)
+        df['tcp.flags'] = parse_hex_flags(df['tcp.flags'])
+        df['tcp.flags'] = df['tcp.flags'].fillna(0).astype(FLAG_DTYPE)
     else:
         logging.error("'tcp.flags' no se encuentra en el DataFrame.")
     return df
@@ -23,19 +38,8 @@ def count_tcp_flags_vectorized(df):
         if not np.issubdtype(df['tcp.flags'].dtype, np.number):
             raise TypeError("Incluso después de la conversión, la columna 'tcp.flags' no es de tipo numérico.")
 
-        flags = {
-            'FIN': 0x01,
-            'SYN': 0x02,
-            'RST': 0x04,
-            'PSH': 0x08,
-            'ACK': 0x10,
-            'URG': 0x20,
-            'ECE': 0x40,
-            'CWR': 0x80,
-        }
-
-        for flag, value in flags.items():
-            df[f'tcp_flag_{flag}_count'] = ((df['tcp.flags'] & value) > 0).astype(int)
+        for flag, value in TCP_FLAGS.items():
+            df[f'tcp_flag_{flag}_count'] = ((df['tcp.flags'] & value) > 0).astype(FLAG_DTYPE)
 
         return df
 
@@ -0,0 +1,54 @@
+import json
+import time
+
+import pytest
+
+from eve_follow import follow_eve
+from synthetic_eve import generate_eve_events
+
+
+class ScriptedFollower:
+    """Devuelve en cada lectura el siguiente elemento del guion: líneas, una espera en segundos o una excepción."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.closed = False
+
+    def read_lines(self):
+        step = self.script.pop(0) if self.script else []
+        if isinstance(step, BaseException):
+            raise step
+        if isinstance(step, float):
+            time.sleep(step)
+            return self.read_lines()
+        return step
+
+    def close(self):
+        self.closed = True
+
+
+def flow_lines(n):
+    events = (event for event in generate_eve_events(n_flows=n, seed=0) if event['event_type'] == 'flow')
+    return [json.dumps(next(events)).encode() + b'\n' for _ in range(n)]
+
+
+def test_leftover_after_full_batch_waits_its_own_latency():
+    lines = flow_lines(20)
+    # 5 eventos esperan más que 'max_latency' y luego llegan 10 más de golpe, seguidos de otros 5
+    follower = ScriptedFollower([lines[:5], 0.3, lines[5:15], lines[15:]])
+    sizes = [len(batch) for batch, _ in follow_eve('eve.json', batch_size=10, max_latency=0.2, poll_interval=0.01,
+                                                   follower=follower, stop=lambda: not follower.script)]
+    # El resto del lote completo no hereda la espera del primero: se junta con los 5 siguientes
+    assert sizes == [10, 10]
+    assert follower.closed
+
+
+def test_interrupt_flushes_decoded_events():
+    lines = flow_lines(7)
+    follower = ScriptedFollower([lines, KeyboardInterrupt()])
+    batches = follow_eve('eve.json', batch_size=100, max_latency=60.0, follower=follower)
+    batch, _ = next(batches)
+    assert len(batch) == 7
+    with pytest.raises(KeyboardInterrupt):
+        next(batches)
+    assert follower.closed
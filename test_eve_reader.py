@@ -0,0 +1,36 @@
+import json
+import logging
+
+import pytest
+
+from eve_reader import decode_eve_lines, iter_eve_events
+
+FLOW = json.dumps({'event_type': 'flow', 'flow_id': 1, 'timestamp': '2024-01-01T00:00:00.000000+0000'}).encode()
+ALERT = json.dumps({'event_type': 'alert', 'flow_id': 2}).encode()
+
+# Líneas que pasan el filtro de bytes pero no son eventos válidos
+INVALID_LINES = [
+    b'{"event_type":"flow","flow_id":3,"app":"\xff\xfe"}',
+    b'{"event_type":"flow","flow_id":',
+    b'[{"event_type":"flow"}]',
+]
+
+
+def test_invalid_lines_are_skipped_and_counted(caplog):
+    lines = [FLOW, INVALID_LINES[0], ALERT, INVALID_LINES[1], FLOW + b'\n', INVALID_LINES[2]]
+    with caplog.at_level(logging.WARNING):
+        events = list(decode_eve_lines(lines, source='sensor'))
+    assert [event['flow_id'] for event in events] == [1, 1]
+    assert "Se omitieron 3 líneas inválidas en sensor." in caplog.messages
+
+
+@pytest.mark.parametrize('line', INVALID_LINES)
+def test_invalid_lines_raise_without_skip(line):
+    with pytest.raises(ValueError):
+        list(decode_eve_lines([FLOW, line], skip_invalid=False))
+
+
+def test_iter_eve_events_skips_invalid_utf8(tmp_path):
+    path = tmp_path / 'eve.json'
+    path.write_bytes(b'\n'.join([FLOW, INVALID_LINES[0], FLOW]) + b'\n')
+    assert len(list(iter_eve_events(str(path)))) == 2
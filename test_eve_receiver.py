@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import time
+
+from eve_reader import DEFAULT_EVENT_TYPES
+from eve_receiver import EveReceiver
+from synthetic_eve import generate_eve_events
+
+
+def eve_lines(n_flows, seed=0):
+    events = list(generate_eve_events(n_flows=n_flows, seed=seed))
+    lines = [json.dumps(event, separators=(',', ':')).encode() for event in events]
+    expected = sum(event['event_type'] in DEFAULT_EVENT_TYPES for event in events)
+    return lines, expected
+
+
+def serve(receiver, path, payloads):
+    """Envía cada payload por una conexión propia y detiene el receptor cuando todas se han cerrado."""
+
+    async def send(data):
+        _, writer = await asyncio.open_unix_connection(path)
+        writer.write(data)
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+
+    async def run():
+        stop = asyncio.Event()
+        server = asyncio.create_task(receiver.serve(unix_path=path, stop=stop))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*(send(payload) for payload in payloads))
+        while (len(receiver.connections) < len(payloads)
+               or any(connection.closed is None for connection in receiver.connections.values())):
+            await asyncio.sleep(0.01)
+        stop.set()
+        return await server
+
+    return asyncio.run(run())
+
+
+def test_invalid_utf8_line_costs_only_itself(tmp_path):
+    lines, expected = eve_lines(50)
+    bad = b'{"event_type":"flow","flow_id":1,"app":"\xff\xfe"}'
+    payloads = [b'\n'.join(lines[:len(lines) // 2] + [bad] + lines[len(lines) // 2:]) + b'\n',
+                b'\n'.join(lines[:10]) + b'\n']
+    second = sum(json.loads(line)['event_type'] in DEFAULT_EVENT_TYPES for line in lines[:10])
+    rows = []
+    # Un lote grande: las dos conexiones se procesan juntas
+    receiver = EveReceiver(rows.append, batch_size=100000, max_latency=5.0)
+    snapshot = serve(receiver, str(tmp_path / 'eve.sock'), payloads)
+
+    assert snapshot['events'] == expected + second
+    assert sum(len(features) for features in rows) == snapshot['rows_out'] > 0
+    assert snapshot['invalid_lines'] == 1
+    assert snapshot['failed_lines'] == 0
+    assert sorted(connection['invalid_lines'] for connection in snapshot['connections']) == [0, 1]
+
+
+def test_full_queue_delivers_every_line(tmp_path):
+    # Consumidor lento y cola de un lote: las conexiones esperan sitio en lugar de descartar líneas
+    payloads, expected = [], 0
+    for seed in range(3):
+        lines, count = eve_lines(200, seed)
+        payloads.append(b'\n'.join(lines) + b'\n')
+        expected += count
+    rows = []
+
+    def slow(features):
+        rows.append(len(features))
+        time.sleep(0.02)
+
+    receiver = EveReceiver(slow, batch_size=50, max_latency=0.05, queue_batches=1)
+    snapshot = serve(receiver, str(tmp_path / 'eve.sock'), payloads)
+
+    assert snapshot['events'] == expected
+    assert sum(rows) == snapshot['rows_out']
+    assert snapshot['failed_lines'] == snapshot['invalid_lines'] == 0
+    assert sum(connection['backpressure_waits'] for connection in snapshot['connections']) > 0
+    assert sum(connection['lines'] for connection in snapshot['connections']) == sum(payload.count(b'\n') for payload in payloads)
@@ -0,0 +1,85 @@
+import os
+
+import pandas as pd
+import pytest
+
+from eve_reader import load_eve_events
+from event_cache import EventCache, complete_lines_end
+from processData import PIPELINE_INPUT_COLUMNS
+from synthetic_eve import write_eve_json
+
+
+@pytest.fixture(scope='module')
+def eve_bytes(tmp_path_factory):
+    path = tmp_path_factory.mktemp('eve') / 'eve.json'
+    write_eve_json(str(path), n_flows=300, events_per_flow=(1, 6), seed=5)
+    return path.read_bytes()
+
+
+def cached_events(cache, keys):
+    return cache.load_events(columns=PIPELINE_INPUT_COLUMNS, segments=keys)
+
+
+def assert_same_events(result, path):
+    expected = load_eve_events(str(path), columns=PIPELINE_INPUT_COLUMNS)
+    sort = lambda df: df.sort_values(['timestamp', 'flow_id', 'event_type'], kind='stable').reset_index(drop=True)
+    pd.testing.assert_frame_equal(sort(result), sort(expected)[result.columns], check_dtype=False, check_categorical=False)
+
+
+def test_growing_file_decodes_only_the_new_tail(eve_bytes, tmp_path):
+    path = tmp_path / 'eve.json'
+    cut = eve_bytes.index(b'\n', len(eve_bytes) // 2) + 1
+    # La primera mitad más media línea todavía sin escribir
+    path.write_bytes(eve_bytes[:cut + 20])
+    cache = EventCache(str(tmp_path / 'cache'))
+    first = cache.add_segment(str(path))
+    assert len(first) == 1 and cache.manifest(first[0])['end'] == cut
+    path.write_bytes(eve_bytes[:cut])
+    assert_same_events(cached_events(cache, first), path)
+    cache.store_features(first[0], 'v', pd.DataFrame({'a': [1]}))
+
+    with open(path, 'ab') as file:
+        file.write(eve_bytes[cut:])
+    keys = cache.add_segment(str(path))
+    assert keys[0] == first[0] and len(keys) == 2
+    tail = cache.manifest(keys[1])
+    assert (tail['start'], tail['end']) == (cut, len(eve_bytes))
+    assert tail['rows'] < len(load_eve_events(str(path)))
+    assert_same_events(cached_events(cache, keys), path)
+    # Las características del prefijo ya no describen el archivo
+    assert cache.load_features(first[0], 'v') is None
+
+    # Sin cambios no se lee nada nuevo
+    assert cache.add_segment(str(path)) == keys
+
+
+@pytest.mark.parametrize('change', ['truncate', 'rewrite', 'rotate'])
+def test_truncated_rewritten_or_rotated_file_is_replaced(eve_bytes, tmp_path, change):
+    path = tmp_path / 'eve.json'
+    half = eve_bytes.index(b'\n', len(eve_bytes) // 2) + 1
+    path.write_bytes(eve_bytes[:half])
+    cache = EventCache(str(tmp_path / 'cache'))
+    old = cache.add_segment(str(path))
+
+    lines = eve_bytes.splitlines(keepends=True)
+    if change == 'truncate':
+        path.write_bytes(eve_bytes[:half // 2 + eve_bytes[half // 2:].index(b'\n') + 1])
+    elif change == 'rewrite':
+        # Mismo inodo y más largo, pero con otro contenido
+        path.write_bytes(b''.join(reversed(lines)))
+    else:
+        os.rename(path, tmp_path / 'eve.json.1')
+        path.write_bytes(b''.join(lines[:len(lines) // 3]))
+
+    keys = cache.add_segment(str(path))
+    assert len(keys) == 1 and keys != old
+    assert [manifest['segment'] for manifest in cache.manifests()] == keys
+    assert_same_events(cached_events(cache, keys), path)
+
+
+def test_complete_lines_end(tmp_path):
+    path = tmp_path / 'eve.json'
+    path.write_bytes(b'{"a":1}\n' * 10000 + b'{"b":')
+    assert complete_lines_end(str(path), os.path.getsize(path)) == 80000
+    path.write_bytes(b'{"b":')
+    assert complete_lines_end(str(path), os.path.getsize(path)) == 0
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from eve_reader import load_eve_events
+from feature_store import FlowFeatureStore, flow_digests
+from processData import PIPELINE_INPUT_COLUMNS, pipeline_sorts_rows, preprocesar_datos
+from synthetic_eve import write_eve_json
+from tcp_flags_count import TCP_FLAGS
+
+VERSION = 'test'
+
+# Subconjunto sin las estadísticas por flujo: 'preprocesar_datos' devuelve las filas en el orden de entrada
+FLAG_FEATURES = [f'tcp_flag_{flag}_count' for flag in TCP_FLAGS]
+
+
+@pytest.fixture(scope='module')
+def events(tmp_path_factory):
+    path = tmp_path_factory.mktemp('eve') / 'eve.json'
+    write_eve_json(str(path), n_flows=300, events_per_flow=(1, 8), seed=7)
+    return load_eve_events(str(path), columns=PIPELINE_INPUT_COLUMNS)
+
+
+def assert_same(result, expected):
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True), check_categorical=False)
+
+
+def test_rerun_reuses_every_finished_flow(events, tmp_path):
+    store = FlowFeatureStore(str(tmp_path))
+    expected = preprocesar_datos(events)
+    assert_same(store.preprocess(events, preprocesar_datos, VERSION), expected)
+    assert store.hits == 0
+
+    finished = events.loc[events['event_type'] == 'flow', 'flow_id'].nunique()
+    rerun = FlowFeatureStore(str(tmp_path))
+    assert_same(rerun.preprocess(events, preprocesar_datos, VERSION), expected)
+    assert rerun.hits == finished > 0
+    assert rerun.misses == events['flow_id'].nunique() - finished
+
+
+def test_half_then_full_recomputes_changed_flows(events, tmp_path):
+    half = events.iloc[:len(events) // 2]
+    store = FlowFeatureStore(str(tmp_path))
+    store.preprocess(half, preprocesar_datos, VERSION)
+    result = store.preprocess(events, preprocesar_datos, VERSION)
+    assert_same(result, preprocesar_datos(events))
+
+    # Solo se reutilizan los flujos ya finalizados en la primera mitad y sin eventos en la segunda
+    finished = set(half.loc[half['event_type'] == 'flow', 'flow_id'])
+    unchanged = finished - set(events.iloc[len(events) // 2:]['flow_id'])
+    assert store.hits == len(unchanged) > 0
+
+
+def test_changed_event_or_version_invalidates_digest(events, tmp_path):
+    store = FlowFeatureStore(str(tmp_path))
+    store.preprocess(events, preprocesar_datos, VERSION)
+
+    changed = events.copy()
+    row = int(np.flatnonzero((changed['event_type'] == 'flow').to_numpy())[0])
+    changed.loc[row, 'flow.bytes_toserver'] += 1
+    flow_ids, digests, _ = flow_digests(events, VERSION)
+    changed_ids, changed_digests, _ = flow_digests(changed, VERSION)
+    assert list(flow_ids) == list(changed_ids)
+    assert list(flow_ids[digests != changed_digests]) == [changed.loc[row, 'flow_id']]
+    assert not np.intersect1d(digests, flow_digests(events, VERSION + '-2')[1]).size
+
+    rerun = FlowFeatureStore(str(tmp_path))
+    assert_same(rerun.preprocess(changed, preprocesar_datos, VERSION), preprocesar_datos(changed))
+    other_version = FlowFeatureStore(str(tmp_path))
+    other_version.preprocess(events, preprocesar_datos, VERSION + '-2')
+    assert other_version.hits == 0
+
+
+def test_input_order_is_restored_without_flow_sorting(events, tmp_path):
+    # Eventos desordenados y una lista de características que no reordena las filas por flujo
+    shuffled = events.sample(frac=1, random_state=0).reset_index(drop=True)
+    compute = lambda df: preprocesar_datos(df, caracteristicas=FLAG_FEATURES)
+    sorted_by_flow = pipeline_sorts_rows(shuffled.columns, FLAG_FEATURES)
+    assert not sorted_by_flow
+    expected = compute(shuffled)
+
+    store = FlowFeatureStore(str(tmp_path))
+    store.preprocess(shuffled.iloc[:len(shuffled) // 2], compute, VERSION, sorted_by_flow=sorted_by_flow)
+    result = store.preprocess(shuffled, compute, VERSION, sorted_by_flow=sorted_by_flow)
+    assert store.hits > 0
+    assert_same(result, expected)
+
+
+def test_eviction_by_size_and_ttl(events, tmp_path):
+    store = FlowFeatureStore(str(tmp_path), max_bytes=None)
+    for start in range(0, len(events), len(events) // 4):
+        store.preprocess(events.iloc[start:start + len(events) // 4], preprocesar_datos, VERSION)
+    manifests = sorted(store.manifests(), key=lambda manifest: manifest['last_access'])
+    assert len(manifests) > 2
+
+    # Con un límite de tamaño se expulsan los de uso más antiguo hasta caber
+    store.max_bytes = store.size_bytes - manifests[0]['bytes']
+    assert store.evict() == 1
+    assert [manifest['segment'] for manifest in store.manifests()] == sorted(manifest['segment'] for manifest in manifests[1:])
+
+    store.max_bytes, store.ttl = None, 60
+    assert store.evict(now=manifests[-1]['last_access'] + 30) == 0
+    assert store.evict(now=manifests[-1]['last_access'] + 61) == len(manifests) - 1
+    assert store.size_bytes == 0
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flow_aggregation import DIRECTIONS, FLOW_FEATURE_COLUMNS, FLOW_TOTALS, FlowIndex, compute_flow_features
+from iat_calculations import calculate_iat_statistics
+
+# 'compute_flow_features' reemplaza la cadena de groupby + merge por etapa; aquí se compara con esa cadena
+
+ROW_COLUMNS = ['total_bytes', 'total_packets', 'packet_length']
+
+
+@pytest.fixture
+def events():
+    rng = np.random.default_rng(0)
+    n = 5000
+    df = pd.DataFrame({
+        'flow_id': rng.integers(0, 600, n),
+        # Microsegundos del esquema; pausas de fracciones de segundo a más de un minuto
+        'timestamp': 1_700_000_000_000_000 + rng.integers(0, 90_000_000, n),
+        'direction': rng.choice(['forward', 'backward', 'unknown'], n, p=[0.5, 0.4, 0.1]),
+    })
+    for column in FLOW_TOTALS.values():
+        values = rng.integers(0, 200, n).astype('float64')
+        values[rng.random(n) < 0.3] = np.nan
+        df[column] = values
+    # Flujos sin paquetes: longitud 0 en todos sus eventos
+    no_packets = df['flow_id'] < 20
+    df.loc[no_packets, ['flow.pkts_toserver', 'flow.pkts_toclient']] = 0.0
+    return df
+
+
+def groupby_reference(df, idle_threshold=5):
+    """Las mismas columnas calculadas por etapas con groupby, como antes de 'compute_flow_features'."""
+    df = df.sort_values(['flow_id', 'timestamp'], kind='stable').reset_index(drop=True)
+    iat = calculate_iat_statistics(df.copy())
+    flow = iat.set_index('flow_id')
+
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='us', utc=True).astype('int64') // 10**9
+    grouped = df.groupby('flow_id')
+    flow['flow_duration'] = grouped['timestamp'].max() - grouped['timestamp'].min()
+    for total_column, source_column in FLOW_TOTALS.items():
+        flow[total_column] = grouped[source_column].sum()
+
+    rows = pd.DataFrame({'flow_id': df['flow_id'], 'timestamp': df['timestamp']})
+    rows['total_bytes'] = df['flow.bytes_toserver'] + df['flow.bytes_toclient']
+    rows['total_packets'] = df['flow_id'].map(flow['total_fwd_packets'] + flow['total_bwd_packets'])
+    rows['packet_length'] = rows['total_bytes'].div(rows['total_packets']).where(rows['total_packets'] > 0, 0.0)
+    rows.loc[rows['total_bytes'].isna() & (rows['total_packets'] > 0), 'packet_length'] = np.nan
+
+    lengths = rows.groupby('flow_id')['packet_length'].agg(['mean', 'max', 'min', 'std'])
+    for stat in ('mean', 'max', 'min', 'std'):
+        flow[f'{stat}_packet_length'] = lengths[stat]
+    flow['var_packet_length'] = lengths['std'] ** 2
+    for stat in ('mean', 'max', 'min', 'std', 'var'):
+        flow[f'{stat}_packet_length_stats'] = flow[f'{stat}_packet_length'].fillna(0)
+
+    duration = flow['flow_duration']
+    flow['fwd_packets_s'] = np.where(duration > 0, flow['total_fwd_packets'] / duration.where(duration > 0, 1), 0)
+    flow['bwd_packets_s'] = np.where(duration > 0, flow['total_bwd_packets'] / duration.where(duration > 0, 1), 0)
+
+    time_diff = grouped['timestamp'].diff()
+    is_idle = time_diff > idle_threshold
+    active = rows.assign(active=time_diff.where(~is_idle, 0.0)).groupby('flow_id')['active'].agg(['mean', 'std', 'max', 'min'])
+    for stat in ('mean', 'std', 'max', 'min'):
+        flow[f'active_{stat}'] = active[stat]
+    flow['idle_total'] = time_diff.where(is_idle, 0.0).groupby(df['flow_id']).sum()
+
+    for value in DIRECTIONS:
+        directional = rows['packet_length'].where(df['direction'] == value).groupby(df['flow_id'])
+        flow[f'total_length_{value}'] = directional.sum()
+        flow[f'max_length_{value}'] = directional.max()
+        flow[f'min_length_{value}'] = directional.min()
+        flow[f'mean_length_{value}'] = directional.mean()
+        flow[f'std_length_{value}'] = directional.std().fillna(0)
+    return flow, rows
+
+
+def test_flow_columns_match_groupby_reference(events):
+    result = compute_flow_features(events.copy())
+    expected_flow, expected_rows = groupby_reference(events)
+
+    assert list(result.columns[-len(FLOW_FEATURE_COLUMNS):]) == FLOW_FEATURE_COLUMNS
+    # Una fila por evento, ordenadas por (flow_id, timestamp) y con 'timestamp' en segundos
+    assert len(result) == len(events)
+    np.testing.assert_array_equal(result['flow_id'], expected_rows['flow_id'])
+    np.testing.assert_array_equal(result['timestamp'], expected_rows['timestamp'])
+    np.testing.assert_allclose(result[ROW_COLUMNS].to_numpy(dtype='float64'),
+                               expected_rows[ROW_COLUMNS].to_numpy(dtype='float64'), rtol=1e-12, equal_nan=True)
+
+    flow_columns = [column for column in FLOW_FEATURE_COLUMNS if column not in ROW_COLUMNS]
+    per_flow = result.drop_duplicates('flow_id').set_index('flow_id')[flow_columns]
+    expected = expected_flow.loc[per_flow.index, flow_columns]
+    for column in flow_columns:
+        np.testing.assert_allclose(per_flow[column].to_numpy(dtype='float64'), expected[column].to_numpy(dtype='float64'),
+                                   rtol=1e-9, atol=1e-12, equal_nan=True, err_msg=column)
+    # Las columnas por flujo son constantes dentro de cada flujo
+    assert (result.groupby('flow_id')[flow_columns].nunique(dropna=False) <= 1).all().all()
+
+
+def test_rows_without_flow_id_are_dropped(events):
+    events['flow_id'] = events['flow_id'].astype('float64')
+    events.loc[::7, 'flow_id'] = np.nan
+    result = compute_flow_features(events.copy())
+    assert len(result) == events['flow_id'].notna().sum()
+    assert not result['flow_id'].isna().any()
+
+
+def test_flow_index_reductions_match_groupby():
+    rng = np.random.default_rng(1)
+    flow_ids = rng.integers(0, 300, 4000)
+    timestamps = rng.integers(0, 10**12, 4000)
+    values = rng.normal(size=4000)
+    values[rng.random(4000) < 0.2] = np.nan
+    index = FlowIndex(flow_ids, timestamps)
+    ordered = values[index.order]
+    grouped = pd.Series(values).groupby(flow_ids)
+
+    np.testing.assert_array_equal(index.flow_ids, grouped.size().index)
+    np.testing.assert_array_equal(index.counts, grouped.size())
+    np.testing.assert_allclose(index.sum(ordered), grouped.sum())
+    np.testing.assert_allclose(index.min(ordered), grouped.min(), equal_nan=True)
+    np.testing.assert_allclose(index.max(ordered), grouped.max(), equal_nan=True)
+    mean, std = index.mean_std(ordered)
+    np.testing.assert_allclose(mean, grouped.mean(), equal_nan=True)
+    np.testing.assert_allclose(std, grouped.std(), equal_nan=True)
+
+    counts, totals, moment_mean, m2, minimum, maximum = index.moments(ordered)
+    np.testing.assert_array_equal(counts, grouped.count())
+    np.testing.assert_allclose(m2, grouped.var(ddof=0).fillna(0) * counts, atol=1e-9)
+    # 'diff' no cruza entre flujos
+    diffs = index.diff(timestamps[index.order])
+    expected = pd.Series(timestamps[index.order]).groupby(flow_ids[index.order]).diff()
+    np.testing.assert_array_equal(diffs, expected.to_numpy())
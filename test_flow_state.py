@@ -0,0 +1,236 @@
+import collections
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from flow_aggregation import FLOW_FEATURE_COLUMNS, FLOW_TOTALS, compute_flow_features
+from flow_state import REORDER_BUFFER, BoundedFlowStateTable, FlowStateTable
+
+# Las columnas por flujo de la tabla de estado deben coincidir con las de 'compute_flow_features' sobre todos
+# los eventos, con cualquier partición en lotes, salvo los eventos que quedan fuera del buffer de reordenación
+
+FLOW_COLUMNS = [column for column in FLOW_FEATURE_COLUMNS if column not in ('total_bytes', 'total_packets', 'packet_length')]
+
+
+def make_events(rng, n_flows, min_events, max_events):
+    """Eventos en orden de timestamp (microsegundos) con pausas cortas, de segundos y de inactividad."""
+    frames = []
+    for flow_id in range(n_flows):
+        n = int(rng.integers(min_events, max_events + 1))
+        gaps = rng.choice([0.001, 0.5, 3.0, 9.0], size=n, p=[0.3, 0.4, 0.2, 0.1]) * rng.random(n)
+        timestamps = 1_700_000_000_000_000 + flow_id * 1_000_000 + (np.cumsum(gaps) * 1e6).astype('int64')
+        frames.append(pd.DataFrame({'flow_id': flow_id, 'timestamp': timestamps}))
+    df = pd.concat(frames).sort_values('timestamp', kind='stable').reset_index(drop=True)
+    df['direction'] = rng.choice(['forward', 'backward'], len(df))
+    for column in FLOW_TOTALS.values():
+        values = rng.integers(0, 100, len(df)).astype('float64')
+        # Los eventos que no son 'flow' no traen contadores
+        values[rng.random(len(df)) < 0.3] = np.nan
+        df[column] = values
+    return df
+
+
+def reference(df):
+    return compute_flow_features(df.copy()).drop_duplicates('flow_id').set_index('flow_id')[FLOW_COLUMNS]
+
+
+def table_frame(table):
+    return table.to_frame().set_index('flow_id')[FLOW_COLUMNS]
+
+
+def assert_flows_match(table, expected, flow_ids=None):
+    result = table_frame(table)
+    flow_ids = list(expected.index) if flow_ids is None else list(flow_ids)
+    assert sorted(result.index) == sorted(expected.index)
+    np.testing.assert_allclose(result.loc[flow_ids].to_numpy(dtype='float64'),
+                               expected.loc[flow_ids].to_numpy(dtype='float64'), rtol=1e-9, equal_nan=True)
+
+
+def update_events(table, df):
+    """Agrega los eventos uno a uno en el orden de 'df'."""
+    for row in df.itertuples(index=False):
+        counters = {column: getattr(row, f'_{position}') for position, column in enumerate(df.columns)
+                    if column in FLOW_TOTALS.values()}
+        table.update_event(row.flow_id, int(row.timestamp) * 1000, counters, row.direction)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def long_flows(rng):
+    return make_events(rng, n_flows=30, min_events=100, max_events=300)
+
+
+@pytest.mark.parametrize('batch_size', [20, 500, 100000])
+def test_in_order_batches_match_batch_features(long_flows, batch_size):
+    table = FlowStateTable()
+    for start in range(0, len(long_flows), batch_size):
+        table.update(long_flows.iloc[start:start + batch_size])
+    assert_flows_match(table, reference(long_flows))
+    assert table.snapshot()['late_events'] == 0
+
+
+def test_in_order_events_match_batch_features(rng):
+    df = make_events(rng, n_flows=10, min_events=50, max_events=150)
+    table = FlowStateTable()
+    update_events(table, df)
+    assert_flows_match(table, reference(df))
+    assert table.late_events == 0
+
+
+def test_merged_tables_of_consecutive_halves_match(long_flows):
+    half = len(long_flows) // 2
+    first, second = FlowStateTable(), FlowStateTable()
+    first.update(long_flows.iloc[:half])
+    second.update(long_flows.iloc[half:])
+    assert_flows_match(first.merge(second), reference(long_flows))
+    assert first.late_events == 0
+
+
+def test_merged_partial_states_of_interleaved_halves_match(rng):
+    # Flujos que caben en el buffer: dos mitades que se solapan en el tiempo se combinan de forma exacta
+    df = make_events(rng, n_flows=50, min_events=1, max_events=REORDER_BUFFER)
+    in_first = rng.random(len(df)) < 0.5
+    table = FlowStateTable()
+    partial = table.partial_states(df[in_first])
+    for flow_id, state in table.partial_states(df[~in_first]).items():
+        if flow_id in partial:
+            partial[flow_id].merge(state, table.idle_threshold)
+        else:
+            partial[flow_id] = state
+    table.flows = partial
+    assert_flows_match(table, reference(df))
+
+
+def test_overlapping_batches_keep_all_timestamps(long_flows):
+    # Eventos alternos del principio de cada flujo (caben en el buffer) y después el resto: el segundo lote
+    # se solapa con el primero y trae más de 'REORDER_BUFFER' eventos por flujo
+    rank = long_flows.groupby('flow_id').cumcount()
+    in_first = (rank % 2 == 1) & (rank < 2 * REORDER_BUFFER)
+    table = FlowStateTable()
+    table.update(long_flows[in_first])
+    table.update(long_flows[~in_first])
+    assert_flows_match(table, reference(long_flows))
+    assert table.late_events == 0
+
+
+def test_reordering_within_buffer_is_exact(long_flows, rng):
+    # Cada evento se retrasa como mucho unas decenas de posiciones: siempre cae dentro del buffer
+    delayed = long_flows.iloc[np.argsort(np.arange(len(long_flows)) + rng.integers(0, 40, len(long_flows)), kind='stable')]
+    table = FlowStateTable()
+    for start in range(0, len(delayed), 20):
+        table.update(delayed.iloc[start:start + 20])
+    assert_flows_match(table, reference(long_flows))
+    assert table.late_events == 0
+
+
+def test_flow_event_before_whole_flow_is_exact(rng):
+    # El evento 'flow' llega al final con la marca de inicio del flujo, detrás de cientos de eventos
+    df = make_events(rng, n_flows=5, min_events=200, max_events=300)
+    first_rows = df.groupby('flow_id').head(1).index
+    table = FlowStateTable()
+    update_events(table, pd.concat([df.drop(first_rows), df.loc[first_rows]]))
+    assert_flows_match(table, reference(df))
+    assert table.late_events == 0
+
+
+@pytest.mark.parametrize('batch_size', [20, 500])
+def test_events_outside_buffer_are_counted(long_flows, batch_size):
+    shuffled = long_flows.sample(frac=1, random_state=0).reset_index(drop=True)
+    table = FlowStateTable()
+    for start in range(0, len(shuffled), batch_size):
+        table.update(shuffled.iloc[start:start + batch_size])
+    expected = reference(long_flows)
+
+    late = pd.Series({flow_id: state.late_events for flow_id, state in table.flows.items()})
+    snapshot = table.snapshot()
+    assert snapshot['late_events'] == late.sum() > 0
+    assert snapshot['approximate_flows'] == (late > 0).sum()
+    # Los flujos sin eventos fuera del buffer son exactos; en el resto, los totales siguen siéndolo
+    assert_flows_match(table, expected, late.index[late == 0])
+    result = table_frame(table)
+    exact_columns = ['flow_duration'] + list(FLOW_TOTALS) + ['mean_packet_length', 'std_packet_length']
+    np.testing.assert_allclose(result.loc[expected.index, exact_columns].to_numpy(dtype='float64'),
+                               expected[exact_columns].to_numpy(dtype='float64'), rtol=1e-9, equal_nan=True)
+
+
+def collect_evictions(**kwargs):
+    evicted = []
+    table = BoundedFlowStateTable(on_evict=lambda rows, reason: evicted.append((rows, reason)), **kwargs)
+    return table, evicted
+
+
+def emitted_rows(evicted):
+    return pd.concat([rows for rows, _ in evicted]).set_index('flow_id')
+
+
+@pytest.mark.parametrize('limits', [dict(idle_timeout=30.0), dict(idle_timeout=None, max_flows=5),
+                                    dict(idle_timeout=None, max_bytes=20000), dict(idle_timeout=20.0, max_flows=8)])
+def test_eviction_emits_every_flow_once(rng, limits):
+    # Un flujo expulsado que vuelve a tener eventos empieza un estado nuevo y se emite otra vez: cada evento
+    # cuenta en exactamente una fila emitida
+    df = make_events(rng, n_flows=60, min_events=1, max_events=30)
+    table, evicted = collect_evictions(**limits)
+    for start in range(0, len(df), 25):
+        table.update(df.iloc[start:start + 25])
+        assert table.max_flows is None or len(table) <= max(table.max_flows, df.iloc[start:start + 25]['flow_id'].nunique())
+    table.flush()
+    assert len(table) == 0 and table.memory_bytes == 0
+
+    rows = emitted_rows(evicted)
+    reasons = collections.Counter()
+    for frame, reason in evicted:
+        reasons[reason] += len(frame)
+    assert set(rows.index) == set(df['flow_id'])
+    assert table.evictions == reasons
+    assert reasons['flush'] < len(rows)
+    for total_column, source_column in FLOW_TOTALS.items():
+        assert rows[total_column].sum() == df[source_column].sum()
+
+
+def test_flush_emits_each_flow_once_with_batch_features(rng):
+    # Con una inactividad mayor que todo el intervalo nada se expulsa antes de 'flush', que emite cada flujo una
+    # vez con las columnas de 'compute_flow_features' sobre todos sus eventos
+    df = make_events(rng, n_flows=40, min_events=1, max_events=20)
+    last_seen = df.groupby('flow_id')['timestamp'].max()
+    table, evicted = collect_evictions(idle_timeout=(df['timestamp'].max() - df['timestamp'].min()) / 1e6 + 1)
+    for start in range(0, len(df), 30):
+        table.update(df.iloc[start:start + 30])
+    assert not evicted
+    table.flush()
+    rows = emitted_rows(evicted)
+    assert [reason for _, reason in evicted] == ['flush'] and len(rows) == len(last_seen)
+    np.testing.assert_allclose(rows.loc[last_seen.index, FLOW_COLUMNS].to_numpy(dtype='float64'),
+                               reference(df).loc[last_seen.index].to_numpy(dtype='float64'), rtol=1e-9, equal_nan=True)
+
+
+def test_protected_flows_survive_capacity_eviction():
+    table, evicted = collect_evictions(idle_timeout=None, max_flows=2)
+    batch = pd.DataFrame({'flow_id': [1, 2, 3], 'timestamp': [1_000_000, 2_000_000, 3_000_000], 'direction': 'forward'})
+    for column in FLOW_TOTALS.values():
+        batch[column] = 1.0
+    # El lote trae más flujos que la capacidad: ninguno se expulsa mientras es el lote en curso
+    table.update(batch)
+    assert len(table) == 3 and not evicted
+    table.update(batch.iloc[[2]].assign(timestamp=4_000_000))
+    assert [list(rows['flow_id']) for rows, _ in evicted] == [[1]]
+    assert list(table.flows) == [2, 3]
+
+
+def test_idle_eviction_uses_event_time_and_spares_current_batch():
+    table, evicted = collect_evictions(idle_timeout=10.0)
+    events = pd.DataFrame({'flow_id': [1, 2, 1], 'timestamp': [0, 5_000_000, 30_000_000], 'direction': 'forward'})
+    for column in FLOW_TOTALS.values():
+        events[column] = 1.0
+    table.update(events.iloc[:2])
+    assert not evicted
+    # La marca más reciente avanza 25 s: el flujo 2 lleva más de 10 s inactivo y el 1 es del lote en curso
+    table.update(events.iloc[[2]])
+    assert [(list(rows['flow_id']), reason) for rows, reason in evicted] == [([2], 'idle')]
+    assert table.get(1).events == 2
+    table.flush()
+    assert [reason for _, reason in evicted] == ['idle', 'flush']
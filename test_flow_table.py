@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from eve_reader import load_eve_events
+from flow_table import APP_AGGREGATES, FlowTableBuilder, build_flow_table, flow_table_from_events
+from synthetic_eve import write_eve_json
+
+
+@pytest.fixture(scope='module')
+def eve_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('eve') / 'eve.json'
+    write_eve_json(str(path), n_flows=400, events_per_flow=(1, 10), seed=11)
+    return str(path)
+
+
+@pytest.fixture
+def events(eve_path):
+    return load_eve_events(eve_path)
+
+
+def groupby_reference(df):
+    """Los agregados de aplicación de cada flujo calculados con groupby sobre todos los eventos a la vez."""
+    flow_ids = df.loc[df['event_type'] == 'flow', 'flow_id'].drop_duplicates().sort_values()
+    app = df[df['event_type'] != 'flow']
+    is_http, is_dns, is_tls = (app['event_type'] == value for value in ('http', 'dns', 'tls'))
+
+    def count(mask):
+        return app[mask].groupby('flow_id').size().reindex(flow_ids, fill_value=0).to_numpy()
+
+    return flow_ids.to_numpy(), {
+        'http_requests': count(is_http),
+        'http_error_responses': count(is_http & (app['http.status'].astype('float64') >= 400)),
+        'http_response_bytes': app[is_http].groupby('flow_id')['http.length'].sum().reindex(flow_ids, fill_value=0).to_numpy(),
+        'dns_queries': count(is_dns & (app['dns.type'] == 'query')),
+        'dns_answers': count(is_dns & (app['dns.type'] == 'answer')),
+        'tls_handshakes': count(is_tls),
+        'tls_sni_present': count(is_tls & app['tls.sni'].notna()) > 0,
+    }
+
+
+def assert_matches_reference(table, events):
+    flow_ids, expected = groupby_reference(events)
+    assert table['flow_id'].is_unique
+    np.testing.assert_array_equal(table['flow_id'].to_numpy(), flow_ids)
+    for column, (_, _, dtype) in APP_AGGREGATES.items():
+        assert table[column].dtype == dtype
+        np.testing.assert_array_equal(table[column].to_numpy(dtype='float64'), expected[column].astype('float64'),
+                                      err_msg=column)
+
+
+@pytest.mark.parametrize('batch_size', [37, 1000, 100000])
+def test_batched_aggregates_match_groupby_reference(events, batch_size):
+    # Algunos TLS sin SNI para que 'tls_sni_present' no sea siempre cierto
+    tls_rows = np.flatnonzero((events['event_type'] == 'tls').to_numpy())
+    events.loc[tls_rows[::3], 'tls.sni'] = None
+    builder = FlowTableBuilder()
+    for start in range(0, len(events), batch_size):
+        builder.update(events.iloc[start:start + batch_size])
+    table = builder.finish()
+
+    assert builder.events == len(events)
+    assert_matches_reference(table, events)
+    assert not table['tls_sni_present'].all() and table['tls_sni_present'].any()
+
+
+def test_flow_columns_come_from_flow_events(events):
+    table = flow_table_from_events(events)
+    # Suricata puede escribir más de un evento 'flow' por flujo; la tabla conserva el último
+    flows = events[events['event_type'] == 'flow'].drop_duplicates('flow_id', keep='last')
+    flows = flows.sort_values('flow_id', kind='stable').reset_index(drop=True)
+    columns = [column for column in table.columns
+               if column in flows.columns and column not in ('flow.start', 'flow.end')]
+    assert not any(column.startswith(('http.', 'dns.', 'tls.')) for column in table.columns)
+    pd.testing.assert_frame_equal(table[columns], flows[columns], check_dtype=False, check_categorical=False)
+
+
+def test_streamed_file_matches_loaded_events(eve_path, events):
+    pd.testing.assert_frame_equal(build_flow_table(eve_path, batch_size=50), flow_table_from_events(events),
+                                  check_categorical=False)
+
+
+def test_duplicate_flow_events_keep_last_and_orphans_are_dropped(events):
+    flows = events[events['event_type'] == 'flow']
+    duplicate = flows.iloc[[0]].copy()
+    duplicate['flow.bytes_toserver'] = 123456789
+    orphan = events[events['event_type'] == 'http'].iloc[[0]].copy()
+    orphan['flow_id'] = events['flow_id'].max() + 1
+    table = flow_table_from_events(pd.concat([events, duplicate, orphan], ignore_index=True))
+
+    assert len(table) == flows['flow_id'].nunique()
+    assert orphan['flow_id'].iloc[0] not in set(table['flow_id'])
+    assert table.loc[table['flow_id'] == duplicate['flow_id'].iloc[0], 'flow.bytes_toserver'].iloc[0] == 123456789
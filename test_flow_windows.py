@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from eve_reader import load_eve_events
+from flow_windows import WindowedFlowAggregator, assign_windows
+from processData import PIPELINE_INPUT_COLUMNS, preprocesar_datos
+from schema import to_epoch_us
+from synthetic_eve import write_eve_json
+
+SORT_COLUMNS = ['window_start', 'flow_id', 'timestamp']
+
+
+@pytest.fixture(scope='module')
+def events(tmp_path_factory):
+    path = tmp_path_factory.mktemp('eve') / 'eve.json'
+    write_eve_json(str(path), n_flows=150, events_per_flow=(1, 6), seed=3, flows_per_second=10.0)
+    return load_eve_events(str(path), columns=PIPELINE_INPUT_COLUMNS)
+
+
+def event_times(df):
+    return to_epoch_us(df['timestamp']).to_numpy(dtype='int64')
+
+
+def reference(events, size_us, slide_us):
+    """'preprocesar_datos' sobre los eventos de cada ventana por separado."""
+    timestamps_us = event_times(events)
+    first = timestamps_us.min() - timestamps_us.min() % slide_us - (-(-size_us // slide_us) - 1) * slide_us
+    frames = []
+    for start in range(int(first), int(timestamps_us.max()) + 1, slide_us):
+        in_window = (timestamps_us >= start) & (timestamps_us < start + size_us)
+        if in_window.any():
+            features = preprocesar_datos(events[in_window].reset_index(drop=True))
+            features['window_start'] = start
+            features['window_end'] = start + size_us
+            frames.append(features)
+    return pd.concat(frames, ignore_index=True)
+
+
+def normalized(features):
+    return features.sort_values(SORT_COLUMNS, kind='stable').reset_index(drop=True)
+
+
+def run_batches(aggregator, events, batch_size):
+    outputs = []
+    for start in range(0, len(events), batch_size):
+        outputs.append(aggregator.update(events.iloc[start:start + batch_size]))
+    outputs.append(aggregator.flush())
+    return pd.concat([output for output in outputs if output is not None], ignore_index=True)
+
+
+@pytest.mark.parametrize('size_us, slide_us', [(5_000_000, 5_000_000), (5_000_000, 2_000_000), (3_000_000, 7_000_000)])
+def test_assign_windows_matches_brute_force(size_us, slide_us):
+    timestamps_us = np.random.default_rng(0).integers(1_700_000_000_000_000, 1_700_000_060_000_000, 500)
+    rows, starts = assign_windows(timestamps_us, size_us, slide_us)
+    expected = [(row, start) for row, timestamp in enumerate(timestamps_us.tolist())
+                for start in (timestamp - timestamp % slide_us - k * slide_us for k in range(size_us // slide_us + 2))
+                if start <= timestamp < start + size_us]
+    assert sorted(zip(rows.tolist(), starts.tolist())) == sorted(expected)
+
+
+@pytest.mark.parametrize('size, slide', [(5.0, None), (6.0, 2.0)])
+@pytest.mark.parametrize('batch_size', [40, 100000])
+def test_in_order_windows_match_per_window_pipeline(events, size, slide, batch_size):
+    aggregator = WindowedFlowAggregator(size, slide)
+    result = run_batches(aggregator, events, batch_size)
+    expected = reference(events, aggregator.size_us, aggregator.slide_us)
+    pd.testing.assert_frame_equal(normalized(result), normalized(expected)[result.columns], check_dtype=False,
+                                  check_categorical=False)
+    assert aggregator.late_events == 0 and len(aggregator) == 0
+    assert aggregator.emitted_windows == expected['window_start'].nunique()
+
+
+def test_windows_close_only_when_watermark_passes_their_end(events):
+    aggregator = WindowedFlowAggregator(5.0, allowed_lateness=2.0)
+    for start in range(0, len(events), 25):
+        features = aggregator.update(events.iloc[start:start + 25])
+        if features is not None:
+            # Nada se emite antes de que la marca de agua (evento más reciente - 2 s) alcance el final de la ventana
+            assert features['window_end'].max() <= aggregator.watermark_us
+        assert all(start + aggregator.size_us > aggregator.watermark_us for start in aggregator.windows)
+
+
+def test_late_events_within_lateness_are_kept(events):
+    # Lotes intercambiados de dos en dos: los eventos de cada par llegan con retraso respecto a los del siguiente
+    batches = [events.iloc[start:start + 30] for start in range(0, len(events), 30)]
+    swapped = pd.concat([batch for pair in zip(batches[1::2], batches[::2]) for batch in pair]
+                        + batches[len(batches) - len(batches) % 2:])
+    timestamps_us = event_times(swapped)
+    delay_us = int((np.maximum.accumulate(timestamps_us) - timestamps_us).max())
+
+    strict = WindowedFlowAggregator(5.0)
+    run_batches(strict, swapped, 30)
+    assert strict.late_events > 0
+
+    aggregator = WindowedFlowAggregator(5.0, allowed_lateness=delay_us / 1e6)
+    result = run_batches(aggregator, swapped, 30)
+    expected = reference(events, aggregator.size_us, aggregator.slide_us)
+    assert aggregator.late_events == 0
+    pd.testing.assert_frame_equal(normalized(result), normalized(expected)[result.columns], check_dtype=False,
+                                  check_categorical=False)
+
+
+def test_events_of_closed_windows_are_counted_as_late(events):
+    timestamps_us = event_times(events)
+    cut = int(np.median(timestamps_us))
+    recent, old = events[timestamps_us >= cut], events[timestamps_us < cut]
+
+    aggregator = WindowedFlowAggregator(4.0, slide=2.0)
+    emitted = [aggregator.update(recent)]
+    watermark = aggregator.watermark_us
+    emitted.append(aggregator.update(old))
+    emitted.append(aggregator.flush())
+    result = pd.concat([output for output in emitted if output is not None], ignore_index=True)
+
+    # Un evento antiguo solo se descarta si todas sus ventanas ya se habían cerrado; si no, entra en las abiertas
+    recent_rows, _ = assign_windows(event_times(recent), aggregator.size_us, aggregator.slide_us)
+    old_rows, old_starts = assign_windows(event_times(old), aggregator.size_us, aggregator.slide_us)
+    open_windows = old_starts + aggregator.size_us > watermark
+    on_time = np.zeros(len(old), dtype=bool)
+    on_time[old_rows[open_windows]] = True
+    assert aggregator.late_events == int((~on_time).sum()) > 0
+    assert len(result) == len(recent_rows) + int(open_windows.sum())
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from kernels import masked_group_sum, parse_hex_flags, safe_divide
+
+# Equivalencia de los kernels vectorizados con las implementaciones fila a fila que reemplazan
+
+N = 10000
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def test_parse_hex_flags_matches_row_apply(rng):
+    flags = pd.Series([format(value, 'x') for value in rng.integers(0, 256, N)], dtype=object)
+    flags[rng.random(N) < 0.1] = None
+    expected = pd.to_numeric(flags.apply(lambda x: int(x, 16) if pd.notnull(x) else np.nan), errors='coerce')
+    assert np.array_equal(parse_hex_flags(flags), expected.to_numpy(), equal_nan=True)
+
+
+def test_safe_divide_matches_row_apply(rng):
+    total_bytes = pd.Series(rng.integers(0, 10**6, N).astype('float64'))
+    total_bytes[rng.random(N) < 0.1] = np.nan
+    total_packets = pd.Series(rng.integers(0, 5, N).astype('float64'))
+    frame = pd.DataFrame({'total_bytes': total_bytes, 'total_packets': total_packets})
+    expected = frame.apply(lambda row: row['total_bytes'] / row['total_packets'] if row['total_packets'] > 0 else 0, axis=1)
+    assert np.array_equal(safe_divide(total_bytes, total_packets), expected.to_numpy(), equal_nan=True)
+
+
+def test_masked_group_sum_matches_groupby_agg(rng):
+    idle_threshold = 5
+    frame = pd.DataFrame({'flow_id': rng.integers(0, 500, N), 'time_diff': rng.exponential(4, N)})
+    frame.loc[rng.random(N) < 0.1, 'time_diff'] = np.nan
+    expected = frame.groupby('flow_id')['time_diff'].agg(lambda x: x[x > idle_threshold].sum())
+    result = masked_group_sum(frame['time_diff'], frame['time_diff'] > idle_threshold, frame['flow_id'])
+    assert np.array_equal(result.index, expected.index)
+    assert np.allclose(result.to_numpy(), expected.to_numpy())
@@ -0,0 +1,229 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+# Cambia si se modifica la disposición de los archivos; un caché de otra versión se reconstruye
+TRAINING_CACHE_FORMAT_VERSION = 1
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def _source_identity(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class _IncrementalFactorizer:
+    """'pd.factorize' por fragmentos: los códigos siguen el orden de primera aparición en todo el archivo."""
+
+    def __init__(self):
+        self.uniques = pd.Index([], dtype=object)
+
+    def update(self, values):
+        values = pd.Series(values, dtype=object)
+        new = pd.unique(values[values.notna() & ~values.isin(self.uniques)])
+        if len(new):
+            self.uniques = self.uniques.append(pd.Index(new, dtype=object))
+        return self.uniques.get_indexer(values).astype('int32')
+
+
+def build_training_cache(csv_path, cache_dir, label='Label', exclude=(), chunksize=100000):
+    """
+    Convierte un CSV de entrenamiento (como DarknetFinal.csv) en un caché binario para mapear en memoria.
+
+    Se lee el CSV dos veces por fragmentos: la primera para contar filas y decidir el tipo de cada
+    columna (numérica si lo es en todos los fragmentos), la segunda para escribir:
+    - features.npy: columnas numéricas en float32, por columnas (Fortran), con los infinitos como NaN.
+    - categorical.npy: códigos int32 de las columnas de texto (-1 para nulos).
+    - labels.npy: códigos int32 de 'label', idénticos a los de 'pd.factorize' sobre toda la columna.
+    - manifest.json: nombres de columnas, categorías, clases y la identidad del CSV de origen.
+
+    Los árboles de scikit-learn entrenan en float32, así que guardar en float32 no cambia sus umbrales.
+
+    Parámetros:
+    - csv_path (str): Ruta del CSV.
+    - cache_dir (str): Directorio del caché; se sobrescribe si ya existe.
+    - label (str): Columna de la etiqueta.
+    - exclude (iterable): Columnas que no se guardan (identificadores, etiquetas alternativas...).
+    - chunksize (int): Filas por fragmento de lectura.
+
+    Retorna:
+    - El 'TrainingCache' creado.
+    """
+    exclude = set(exclude) - {label}
+    started = time.time()
+
+    rows = 0
+    columns = None
+    numeric = {}
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, low_memory=False):
+        if columns is None:
+            columns = [column for column in chunk.columns if column not in exclude]
+            if label not in columns:
+                raise ValueError(f"La columna '{label}' no se encuentra en {csv_path}.")
+            numeric = {column: True for column in columns if column != label}
+        for column in numeric:
+            numeric[column] = numeric[column] and pd.api.types.is_numeric_dtype(chunk[column])
+        rows += len(chunk)
+    if columns is None:
+        raise ValueError(f"El archivo {csv_path} está vacío.")
+
+    numeric_columns = [column for column, is_numeric in numeric.items() if is_numeric]
+    categorical_columns = [column for column, is_numeric in numeric.items() if not is_numeric]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    features = open_memmap(os.path.join(cache_dir, 'features.npy'), mode='w+', dtype='float32',
+                           shape=(rows, len(numeric_columns)), fortran_order=True)
+    categorical = open_memmap(os.path.join(cache_dir, 'categorical.npy'), mode='w+', dtype='int32',
+                              shape=(rows, len(categorical_columns)), fortran_order=True)
+    labels = open_memmap(os.path.join(cache_dir, 'labels.npy'), mode='w+', dtype='int32', shape=(rows,))
+    label_codes = _IncrementalFactorizer()
+    category_codes = [_IncrementalFactorizer() for _ in categorical_columns]
+    infinities = 0
+
+    start = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, low_memory=False,
+                             usecols=numeric_columns + categorical_columns + [label]):
+        end = start + len(chunk)
+        values = chunk[numeric_columns].to_numpy(dtype='float64')
+        infinite = np.isinf(values)
+        infinities += int(infinite.sum())
+        values[infinite] = np.nan
+        features[start:end] = values
+        for position, column in enumerate(categorical_columns):
+            categorical[start:end, position] = category_codes[position].update(chunk[column])
+        labels[start:end] = label_codes.update(chunk[label])
+        start = end
+    for array in (features, categorical, labels):
+        array.flush()
+    del features, categorical, labels
+
+    manifest = {
+        'format_version': TRAINING_CACHE_FORMAT_VERSION,
+        'source': _source_identity(csv_path),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'rows': rows,
+        'label': label,
+        'classes': label_codes.uniques.tolist(),
+        'numeric_columns': numeric_columns,
+        'categorical_columns': categorical_columns,
+        'categories': [codes.uniques.tolist() for codes in category_codes],
+    }
+    # El manifiesto se escribe al final: sin él el caché no se considera válido
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    logging.info("Caché de entrenamiento en %s: %d filas, %d numéricas, %d categóricas, %d infinitos a NaN (%.1f s).",
+                 cache_dir, rows, len(numeric_columns), len(categorical_columns), infinities, time.time() - started)
+    return TrainingCache(cache_dir)
+
+
+class TrainingCache:
+    """
+    Caché de entrenamiento creado por 'build_training_cache', leído con memoria mapeada: abrirlo no lee
+    los datos, y solo se traen a memoria las columnas que se usan.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, MANIFEST_NAME)) as file:
+            self.manifest = json.load(file)
+        if self.manifest.get('format_version') != TRAINING_CACHE_FORMAT_VERSION:
+            raise ValueError(f"Formato de caché de entrenamiento no soportado: {self.manifest.get('format_version')}")
+        self.numeric_columns = self.manifest['numeric_columns']
+        self.categorical_columns = self.manifest['categorical_columns']
+        self.classes = self.manifest['classes']
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def is_current(self, csv_path):
+        """True si el caché se creó a partir de 'csv_path' tal como está ahora (tamaño y fecha de modificación)."""
+        return os.path.exists(csv_path) and self.manifest['source'] == _source_identity(csv_path)
+
+    def _array(self, name):
+        return np.load(os.path.join(self.cache_dir, name), mmap_mode='r')
+
+    def labels(self):
+        """Códigos de la etiqueta (posiciones en 'classes')."""
+        return self._array('labels.npy')
+
+    def features(self, columns=None):
+        """
+        Matriz float32 (filas x columnas) de las columnas numéricas pedidas, o de todas.
+
+        Con todas las columnas es el propio arreglo mapeado (sin copia); con un subconjunto se copian solo
+        esas columnas, cada una contigua en disco.
+        """
+        features = self._array('features.npy')
+        if columns is None:
+            return features
+        positions = [self.numeric_columns.index(column) for column in columns]
+        return np.asfortranarray(features[:, positions])
+
+    def frame(self, columns=None):
+        """
+        DataFrame con las columnas numéricas pedidas (float32) y las categóricas (pd.Categorical), o todas.
+
+        Las columnas pedidas que no están en el caché producen un ValueError.
+        """
+        if columns is None:
+            numeric, categorical = self.numeric_columns, self.categorical_columns
+        else:
+            unknown = [column for column in columns
+                       if column not in self.numeric_columns and column not in self.categorical_columns]
+            if unknown:
+                raise ValueError(f"Columnas que no están en el caché de entrenamiento: {unknown}")
+            numeric = [column for column in columns if column in self.numeric_columns]
+            categorical = [column for column in columns if column in self.categorical_columns]
+
+        df = pd.DataFrame(self.features(numeric if columns is not None else None), columns=numeric, copy=False)
+        if categorical:
+            codes = self._array('categorical.npy')
+            for column in categorical:
+                position = self.categorical_columns.index(column)
+                df[column] = pd.Categorical.from_codes(np.asarray(codes[:, position]),
+                                                       categories=self.manifest['categories'][position])
+        return df if columns is None else df[list(columns)]
+
+
+def ensure_training_cache(csv_path, cache_dir, label='Label', exclude=(), chunksize=100000):
+    """
+    Abre el caché de 'csv_path' en 'cache_dir' o lo (re)construye si no existe, es de otro formato o el CSV
+    cambió desde que se creó.
+    """
+    if os.path.exists(os.path.join(cache_dir, MANIFEST_NAME)):
+        try:
+            cache = TrainingCache(cache_dir)
+            if cache.is_current(csv_path) and cache.manifest['label'] == label:
+                return cache
+            logging.info("El caché de entrenamiento de %s está desactualizado; se reconstruye.", csv_path)
+        except (ValueError, KeyError, json.JSONDecodeError) as error:
+            logging.warning("Caché de entrenamiento inválido en %s (%s); se reconstruye.", cache_dir, error)
+    return build_training_cache(csv_path, cache_dir, label=label, exclude=exclude, chunksize=chunksize)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Convierte un CSV de entrenamiento en un caché binario mapeable en memoria.")
+    parser.add_argument('csv', nargs='?', default='DarknetFinal.csv', help="CSV de entrenamiento.")
+    parser.add_argument('--cache', default=None, help="Directorio del caché; por defecto '<csv>.cache'.")
+    parser.add_argument('--etiqueta', default='Label', help="Columna de la etiqueta.")
+    parser.add_argument('--excluir', nargs='*', default=['Flow ID', 'Timestamp', 'Src IP', 'Dst IP', 'Label.1'],
+                        help="Columnas que no se guardan.")
+    parser.add_argument('--fragmento', type=int, default=100000, help="Filas por fragmento de lectura.")
+    args = parser.parse_args()
+
+    build_training_cache(args.csv, args.cache or os.path.splitext(args.csv)[0] + '.cache', label=args.etiqueta,
+                         exclude=args.excluir, chunksize=args.fragmento)